@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -21,13 +22,19 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
 
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-h%^nl^dr#ing3o99g6=v!^rwuhlu-a$ay#s6n%@_st8-x#mar9'
-
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DJANGO_DEBUG', 'true').lower() == 'true'
 
-ALLOWED_HOSTS = ["142.132.239.71", '.localhost', '127.0.0.1', '[::1]']
+# SECURITY WARNING: keep the secret key used in production secret!
+# The checked in key is only used for development, without DEBUG DJANGO_SECRET_KEY is required
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    if not DEBUG:
+        raise ImproperlyConfigured("DJANGO_SECRET_KEY has to be set when DJANGO_DEBUG is false")
+    SECRET_KEY = 'django-insecure-h%^nl^dr#ing3o99g6=v!^rwuhlu-a$ay#s6n%@_st8-x#mar9'
+
+# Comma separated, e.g. DJANGO_ALLOWED_HOSTS=app.example.com,localhost
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', "142.132.239.71,.localhost,127.0.0.1,[::1]").split(',')
 
 
 # Application definition
@@ -46,7 +53,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'recommender.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'recommender.posters.PosterMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -54,6 +63,10 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+if not DEBUG:
+    # runserver serves the static files itself while debugging
+    MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1,
+                      'whitenoise.middleware.WhiteNoiseMiddleware')
 
 ROOT_URLCONF = 'RecommenderSystemsFinalProject.urls'
 
@@ -100,7 +113,11 @@ DATABASES = {
         # "HOST": "143.205.194.122",
         "HOST": os.environ.get('DB_HOST'),
         # "HOST": "192.168.1.83",
-        "PORT": "5432",
+        "PORT": os.environ.get('DB_PORT', "5432"),
+        # Keep connections open between requests (per worker thread), 0 closes them after every request.
+        # Django does not support persistent connections under asgi, so they are off there by default
+        "CONN_MAX_AGE": int(os.environ.get('DB_CONN_MAX_AGE', 0 if os.environ.get('SERVER_MODE') == 'asgi' else 60)),
+        "CONN_HEALTH_CHECKS": True,
         'OPTIONS': {
         'options': '-c search_path=data,public'
         }
@@ -144,6 +161,103 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Collected by `manage.py collectstatic` and served by whitenoise when DEBUG is off
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Full size posters (<movie id>.jpg), the fallback for movies without a thumbnail
+RECOMMENDER_POSTER_SOURCE_DIR = Path(os.environ.get('RECOMMENDER_POSTER_SOURCE_DIR',
+                                                    BASE_DIR / 'recommender' / 'static' / 'posters'))
+
+# Offline data builds (neighbor index and the build version stamp)
+
+RECOMMENDER_DATA_DIR = Path(os.environ.get('RECOMMENDER_DATA_DIR', BASE_DIR / 'data'))
+
+# Thumbnails written by `manage.py build_posters` and the url PosterMiddleware serves them at
+RECOMMENDER_POSTER_DIR = Path(os.environ.get('RECOMMENDER_POSTER_DIR', RECOMMENDER_DATA_DIR / 'posters'))
+
+RECOMMENDER_POSTER_URL = '/posters/'
+
+RECOMMENDER_INDEX_ENABLED = os.environ.get('RECOMMENDER_INDEX_ENABLED', 'true').lower() == 'true'
+
+# Read recommendation lists from the movie_recommendation table (V4 migration) instead of decoding
+# movie_infos.recommendations, when the neighbor index can not answer
+RECOMMENDER_RECOMMENDATION_TABLE = os.environ.get('RECOMMENDER_RECOMMENDATION_TABLE', 'false').lower() == 'true'
+
+# Largest drop of an evaluation metric (e.g. diversity 0.61 -> 0.59) a new data build may have,
+# see `manage.py evaluate --gate` and `build_neighbor_index --evaluate`
+RECOMMENDER_EVALUATION_TOLERANCE = float(os.environ.get('RECOMMENDER_EVALUATION_TOLERANCE', 0.02))
+
+# Seconds between checks whether a new data build was published
+RECOMMENDER_BUILD_CHECK_INTERVAL = 5
+
+# Maximum number of movies returned by the title autocomplete
+
+RECOMMENDER_SEARCH_LIMIT = 20
+
+# Default weights of the blended recommendations (recommender.blend), the API accepts ?weights=cosine:2,tmdb:0
+RECOMMENDER_BLEND_WEIGHTS = {
+    'tmdb': 0.5,
+    'cosine': 1.0,
+    'cosine_reduced': 1.0,
+    'jaccard': 1.0,
+    'jaccard_tag': 1.0,
+}
+
+# Clusters of the description index scanned per query, more find more of the exact neighbors but take longer
+RECOMMENDER_ANN_NPROBE = int(os.environ.get('RECOMMENDER_ANN_NPROBE', 16))
+
+# True in settings_benchmark.py only, `manage.py benchmark --seed` refuses to overwrite other databases
+RECOMMENDER_BENCHMARK_SETTINGS = False
+
+# Maximum number of movies per call of the batch recommendation API
+RECOMMENDER_BATCH_LIMIT = 100
+
+# Maximum number of recommendations (k) per movie the APIs return, larger requests get a 400
+RECOMMENDER_MAX_K = 50
+
+# Viewed movies remembered per browser session, the seeds of the "because you watched" API (recommender.session)
+RECOMMENDER_SESSION_HISTORY = int(os.environ.get('RECOMMENDER_SESSION_HISTORY', 20))
+
+# Seconds clients and proxies may reuse movie API responses without revalidating (ETag / Last-Modified)
+RECOMMENDER_API_MAX_AGE = 60
+
+# Cache of rendered detail pages (recommender.cache), invalidated by publishing a new data build.
+# The size is per worker process.
+RECOMMENDER_PAGE_CACHE_BYTES = int(os.environ.get('RECOMMENDER_PAGE_CACHE_BYTES', 64 * 1024 * 1024))
+
+# Optional cache shared by all workers: "redis://host:6379/0" (needs the redis package) or a
+# directory for django's file based cache. Empty disables the shared tier.
+RECOMMENDER_CACHE_URL = os.environ.get('RECOMMENDER_CACHE_URL', '')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+if RECOMMENDER_CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES['recommender'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': RECOMMENDER_CACHE_URL,
+    }
+elif RECOMMENDER_CACHE_URL:
+    CACHES['recommender'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': RECOMMENDER_CACHE_URL,
+    }
+
+RECOMMENDER_SHARED_CACHE = 'recommender' if RECOMMENDER_CACHE_URL else None
+
+# Entries of old builds are dropped from the shared cache after this many seconds
+RECOMMENDER_SHARED_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+# Server-Timing headers and prometheus metrics at /metrics (recommender.metrics)
+RECOMMENDER_METRICS_ENABLED = os.environ.get('RECOMMENDER_METRICS_ENABLED', 'true').lower() == 'true'
+# Clients allowed to read /metrics: addresses in these networks (comma separated) or requests with
+# "Authorization: Bearer <RECOMMENDER_METRICS_TOKEN>"
+RECOMMENDER_METRICS_NETWORKS = [network for network in os.environ.get(
+    'RECOMMENDER_METRICS_NETWORKS', '127.0.0.1/32,::1/128').split(',') if network]
+RECOMMENDER_METRICS_TOKEN = os.environ.get('RECOMMENDER_METRICS_TOKEN', '')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,27 @@
+"""
+Lean settings of workers that only serve the JSON api (`/recommender/api/...` and `/metrics`).
+Only the recommender app is loaded: no admin, sessions, messages, templates, select2 or django
+rest framework, so a worker boots in a fraction of the time.
+
+    DJANGO_SETTINGS_MODULE=RecommenderSystemsFinalProject.settings_api gunicorn -c gunicorn.conf.py
+
+`python manage.py import_report --settings RecommenderSystemsFinalProject.settings_api` compares the startup.
+"""
+from RecommenderSystemsFinalProject.settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'recommender.apps.RecommenderConfig',
+]
+
+MIDDLEWARE = [
+    'recommender.metrics.MetricsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'RecommenderSystemsFinalProject.urls_api'
+
+TEMPLATES = []
+
+# No static files or posters are served by API workers
+STATIC_ROOT = None
@@ -0,0 +1,27 @@
+"""
+Settings of `manage.py benchmark`: a local SQLite database and data directory, so seeding never
+touches the configured postgres. BENCHMARK_DATABASE=postgres keeps the DB_* postgres settings
+(use a local throwaway database).
+
+    python manage.py benchmark --settings RecommenderSystemsFinalProject.settings_benchmark --seed
+"""
+from RecommenderSystemsFinalProject.settings import *  # noqa: F401,F403
+
+# Lets `manage.py benchmark --seed` replace the movies
+RECOMMENDER_BENCHMARK_SETTINGS = True
+
+RECOMMENDER_DATA_DIR = Path(os.environ.get('RECOMMENDER_DATA_DIR', BASE_DIR / 'data' / 'benchmark'))
+
+if os.environ.get('BENCHMARK_DATABASE', 'sqlite') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': RECOMMENDER_DATA_DIR / 'benchmark.sqlite3',
+        }
+    }
+
+# The test client sends requests to "testserver"
+ALLOWED_HOSTS = ALLOWED_HOSTS + ['testserver']
+DEBUG = False
+# Static files are not part of the benchmark
+STATIC_ROOT = None
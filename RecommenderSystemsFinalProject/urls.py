@@ -17,7 +17,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from recommender.metrics import metrics_view
+
 urlpatterns = [
     path("recommender/", include("recommender.urls")),
+    path("metrics", metrics_view, name="metrics"),
     path('admin/', admin.site.urls),
 ]
@@ -0,0 +1,11 @@
+"""
+URL configuration of the API workers (settings_api.py), the JSON endpoints of urls.py only.
+"""
+from django.urls import path, include
+
+from recommender.metrics import metrics_view
+
+urlpatterns = [
+    path("recommender/api/", include("recommender.api_urls")),
+    path("metrics", metrics_view, name="metrics"),
+]
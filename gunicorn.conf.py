@@ -0,0 +1,39 @@
+"""
+gunicorn settings of the production serving mode, everything can be overridden with environment variables.
+
+    gunicorn -c gunicorn.conf.py
+
+SERVER_MODE=wsgi (default) runs wsgi.py in threaded workers, SERVER_MODE=asgi runs asgi.py in
+uvicorn workers. Every worker thread keeps its own database connection (DB_CONN_MAX_AGE), so the
+database has to allow workers * threads connections per container.
+"""
+import multiprocessing
+import os
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'RecommenderSystemsFinalProject.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+elif SERVER_MODE == 'wsgi':
+    wsgi_app = 'RecommenderSystemsFinalProject.wsgi:application'
+    worker_class = 'gthread'
+else:
+    raise ValueError("SERVER_MODE has to be wsgi or asgi, not {}".format(SERVER_MODE))
+
+# Import django and the apps once in the master, workers are forked with everything loaded
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'false').lower() == 'true'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Restart workers now and then, spread out so they do not all restart at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
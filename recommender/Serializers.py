@@ -1,10 +1,12 @@
 
 from rest_framework import serializers
 
-from recommender.models import Movie
 
+class MovieSerializer(serializers.BaseSerializer):
+    """
+    Read only title and id of a movie, without the field machinery and URL reversing of a
+    HyperlinkedModelSerializer.
+    """
 
-class MovieSerializer(serializers.HyperlinkedModelSerializer):
-    class Meta:
-        model = Movie
-        fields = ['title', 'id']
+    def to_representation(self, instance):
+        return {'title': instance.title, 'id': instance.id}
@@ -0,0 +1,246 @@
+"""
+JSON endpoints. Kept apart from the pages so API workers (settings_api.py) never import the
+templates, forms and django rest framework.
+"""
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+
+from recommender import blend, data_build, session
+from recommender.models import Movie
+from recommender.neighbor_index import aget_index, get_index
+from recommender.recommendations import (ALGORITHMS, aresolve_recommendations, atable_recommendations,
+                                         recommendation_ids)
+from recommender.similarity.ann import get_description_index
+
+
+def parse_k(request, default):
+    """
+    The number of recommendations asked for (`k`), at most RECOMMENDER_MAX_K. Raises ValueError with
+    a message for the client.
+    """
+    try:
+        k = max(int(request.GET.get('k', default)), 0)
+    except ValueError:
+        raise ValueError('k has to be an integer')
+    if k > settings.RECOMMENDER_MAX_K:
+        raise ValueError('k can be at most {}'.format(settings.RECOMMENDER_MAX_K))
+    return k
+
+
+def neighbors(request, movie_id):
+    """
+    Top k recommendations of one algorithm, answered from the in-memory neighbor index only.
+    """
+    index = get_index()
+    if index is None:
+        return JsonResponse({'error': 'No neighbor index loaded'}, status=503)
+    algorithm = request.GET.get('algo', 'cosine')
+    if algorithm not in index.algorithms:
+        return JsonResponse({'error': 'Unknown algorithm: {}'.format(algorithm)}, status=400)
+    try:
+        k = parse_k(request, 5)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    if movie_id not in index:
+        return JsonResponse({'error': 'Unknown movie: {}'.format(movie_id)}, status=404)
+
+    return JsonResponse({
+        'movie': movie_id,
+        'algorithm': algorithm,
+        'version': index.version,
+        'recommendations': [
+            {'id': tile.id, 'title': tile.title, 'rating': tile.ratings['movielens']}
+            for tile in index.tiles(movie_id, algorithm, k)
+        ],
+    })
+
+
+def recommendation_json(movie):
+    return {'id': movie.id, 'title': movie.title, 'rating': (movie.ratings or {}).get('movielens')}
+
+
+def parse_recommendation_query(request):
+    """
+    Algorithms (`algo`, comma separated, all by default), `k` and blend `weights` of a
+    recommendation request. Raises ValueError with a message for the client.
+    """
+    algorithms = [algorithm for algorithm in request.GET.get('algo', '').split(',') if algorithm]
+    unknown = [algorithm for algorithm in algorithms if algorithm not in ALGORITHMS + (blend.BLENDED,)]
+    if unknown:
+        raise ValueError('Unknown algorithm: {}'.format(', '.join(unknown)))
+    k = parse_k(request, 5)
+    weights = blend.parse_weights(request.GET.get('weights'))
+    return tuple(algorithms) or ALGORITHMS + (blend.BLENDED,), k, weights
+
+
+async def movie_recommendations(movie_ids, algorithms, k, weights=None):
+    """
+    Recommendations of several movies, keyed by movie id. Movies in the neighbor index are answered
+    from memory, all others with two queries no matter how many movies are requested: one for the
+    source movies and one for every recommended movie of all of them.
+    """
+    index = await aget_index()
+    results = {}
+    remaining = []
+    for movie_id in movie_ids:
+        if index is not None and movie_id in index:
+            source = index.tile(index.row_of(movie_id))
+            ranked = {algorithm: index.tiles(movie_id, algorithm, k)
+                      for algorithm in algorithms if algorithm in index.algorithms}
+            if blend.BLENDED in algorithms:
+                ranked[blend.BLENDED] = blend.blend_index(index, movie_id, weights, k)
+            results[movie_id] = {
+                'movie': {'id': source.id, 'title': source.title},
+                'recommendations': {
+                    algorithm: [recommendation_json(tile) for tile in ranked[algorithm]]
+                    for algorithm in algorithms if algorithm in ranked
+                },
+            }
+        else:
+            remaining.append(movie_id)
+
+    if remaining:
+        use_table = settings.RECOMMENDER_RECOMMENDATION_TABLE
+        fields = ('id', 'title') if use_table else ('id', 'title', 'recommendations')
+        sources = [movie async for movie in Movie.objects.filter(id__in=remaining).only(*fields)]
+        # A blend needs the deeper lists of every algorithm
+        blended = blend.BLENDED in algorithms
+        stored = ALGORITHMS if blended else algorithms
+        limit = max(k, blend.BLEND_DEPTH) if blended else k
+        if use_table:
+            resolved = await atable_recommendations([movie.id for movie in sources], limit, stored)
+        else:
+            resolved = await aresolve_recommendations({
+                (movie.id, algorithm): ids
+                for movie in sources
+                for algorithm, ids in recommendation_ids(movie, limit=limit, algorithms=stored).items()
+            })
+        for movie in sources:
+            ranked = {algorithm: resolved.get((movie.id, algorithm), []) for algorithm in stored}
+            if blended:
+                ranked[blend.BLENDED] = blend.blend_movies(ranked, weights, k)
+            results[movie.id] = {
+                'movie': {'id': movie.id, 'title': movie.title},
+                'recommendations': {
+                    algorithm: [recommendation_json(recom) for recom in ranked[algorithm][:k]]
+                    for algorithm in algorithms
+                },
+            }
+    return results
+
+
+async def recommendations(request, movie_id):
+    """
+    Recommendations of all (or the `algo`) algorithms of one movie as JSON.
+    """
+    try:
+        algorithms, k, weights = parse_recommendation_query(request)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    results = await movie_recommendations([movie_id], algorithms, k, weights)
+    if movie_id not in results:
+        return JsonResponse({'error': 'Unknown movie: {}'.format(movie_id)}, status=404)
+    return JsonResponse(dict(results[movie_id], version=await data_build.acurrent_version()))
+
+
+async def batch_recommendations(request):
+    """
+    Recommendations of up to RECOMMENDER_BATCH_LIMIT movies (`ids`, comma separated) in one call.
+    Unknown ids are listed in `missing`.
+    """
+    try:
+        algorithms, k, weights = parse_recommendation_query(request)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    try:
+        movie_ids = list(dict.fromkeys(int(movie_id) for movie_id in request.GET.get('ids', '').split(',') if movie_id))
+    except ValueError:
+        return JsonResponse({'error': 'ids have to be integers'}, status=400)
+    if not movie_ids:
+        return JsonResponse({'error': 'No ids given'}, status=400)
+    if len(movie_ids) > settings.RECOMMENDER_BATCH_LIMIT:
+        return JsonResponse({'error': 'At most {} ids per request'.format(settings.RECOMMENDER_BATCH_LIMIT)}, status=400)
+
+    results = await movie_recommendations(movie_ids, algorithms, k, weights)
+    return JsonResponse({
+        'version': await data_build.acurrent_version(),
+        'results': [results[movie_id] for movie_id in movie_ids if movie_id in results],
+        'missing': [movie_id for movie_id in movie_ids if movie_id not in results],
+    })
+
+
+def session_recommendations(request):
+    """
+    "Because you watched" recommendations of several movies (`ids`, comma separated) together,
+    by default of the movies viewed in this browser session. Unknown ids are listed in `missing`.
+    """
+    index = get_index()
+    if index is None:
+        return JsonResponse({'error': 'No neighbor index loaded'}, status=503)
+    try:
+        k = parse_k(request, 10)
+        weights = blend.parse_weights(request.GET.get('weights'))
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    from_history = 'ids' not in request.GET
+    try:
+        if from_history:
+            movie_ids = session.read_history(request)
+        else:
+            movie_ids = list(dict.fromkeys(int(movie_id) for movie_id in request.GET['ids'].split(',') if movie_id))
+    except ValueError:
+        return JsonResponse({'error': 'ids have to be integers'}, status=400)
+    if len(movie_ids) > settings.RECOMMENDER_BATCH_LIMIT:
+        return JsonResponse({'error': 'At most {} ids per request'.format(settings.RECOMMENDER_BATCH_LIMIT)}, status=400)
+
+    response = JsonResponse({
+        'version': index.version,
+        'seeds': [movie_id for movie_id in movie_ids if movie_id in index],
+        'missing': [movie_id for movie_id in movie_ids if movie_id not in index],
+        'recommendations': [recommendation_json(tile) for tile in session.session_recommendations(
+            index, movie_ids, weights, k)],
+    })
+    if from_history:
+        patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def similar_plots(request):
+    """
+    Movies with a plot like a free text (`q`) or like the plot of a movie (`movie`), answered from
+    the description index. `nprobe` trades recall for latency.
+    """
+    index = get_description_index()
+    if index is None:
+        return JsonResponse({'error': 'No description index loaded'}, status=503)
+    try:
+        k = parse_k(request, 10)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    try:
+        nprobe = int(request.GET['nprobe']) if 'nprobe' in request.GET else None
+        movie_id = int(request.GET['movie']) if 'movie' in request.GET else None
+    except ValueError:
+        return JsonResponse({'error': 'nprobe and movie have to be integers'}, status=400)
+    if nprobe is not None and nprobe < 1:
+        return JsonResponse({'error': 'nprobe has to be positive'}, status=400)
+
+    if movie_id is not None:
+        try:
+            ids, scores = index.similar(movie_id, k, nprobe)
+        except KeyError:
+            return JsonResponse({'error': 'No description for movie: {}'.format(movie_id)}, status=404)
+    elif request.GET.get('q'):
+        ids, scores = index.search_text(request.GET['q'], k, nprobe)
+    else:
+        return JsonResponse({'error': 'Either q or movie is required'}, status=400)
+
+    movies = Movie.objects.only('id', 'title', 'ratings').in_bulk(ids.tolist())
+    return JsonResponse({
+        'version': index.version,
+        'results': [
+            dict(recommendation_json(movies[movie_id]), score=round(float(score), 4))
+            for movie_id, score in zip(ids.tolist(), scores.tolist()) if movie_id in movies
+        ],
+    })
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from . import api
+
+urlpatterns = [
+    path('<int:movie_id>/neighbors/', api.neighbors, name='neighbors'),
+    path('<int:movie_id>/recommendations/', api.recommendations, name='recommendations'),
+    path('recommendations/', api.batch_recommendations, name='batch_recommendations'),
+    path('session/', api.session_recommendations, name='session_recommendations'),
+    path('similar/', api.similar_plots, name='similar_plots'),
+]
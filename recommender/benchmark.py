@@ -0,0 +1,273 @@
+"""
+Reproducible benchmark of the data load and the hot request paths, run by `manage.py benchmark`.
+
+The database is seeded from the checked in movies.csv and similarity CSVs: every movie gets a
+synthetic MovieLens json (fixed random seed) that goes through the same build_row and MPAA
+filtering as fill_database.py. Requests are sent through django's test client, so the numbers
+cover middleware, views, templates and the database, but no network or server.
+"""
+import csv
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import django
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from recommender import cache, data_build
+from recommender.bulk_load import load_rows
+from recommender.dataGenerator import fill_database
+from recommender.models import Movie
+
+DATA_GENERATOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dataGenerator")
+MPAA_RATINGS = ("G", "PG", "PG-13", "R", "NC-17", "")
+YEAR_PATTERN = re.compile(r"\((\d{4})\)\s*$")
+
+# movie_infos as created by V2__Base_structure.sql, for databases without the flyway migrations
+SQLITE_MOVIE_TABLE = """
+CREATE TABLE IF NOT EXISTS movie_infos (
+    id integer primary key,
+    tmdb_id integer,
+    title text not null,
+    description text,
+    release_date date,
+    duration integer,
+    mpaa text,
+    poster text,
+    backdrop text,
+    recommendations text,
+    trailer_url text,
+    actors text,
+    genres text,
+    ratings text
+)
+"""
+
+
+def read_catalog(path=None):
+    path = path or os.path.join(DATA_GENERATOR_DIR, fill_database.movies_path)
+    with open(path, newline="") as file:
+        return [(int(row["movieId"]), row["title"], row["genres"]) for row in csv.DictReader(file)]
+
+
+def synthetic_movie(title, genres, rng):
+    """
+    Extracted MovieLens json as read by fill_database.build_row, with made up details.
+    """
+    year = YEAR_PATTERN.search(title)
+    return {
+        "movielens": {
+            "title": title,
+            "plotSummary": "A {} movie.".format(genres.replace("|", ", ").lower()),
+            "releaseDate": "{}-01-01".format(year.group(1)) if year else None,
+            "actors": [],
+            "mpaa": rng.choice(MPAA_RATINGS),
+            "avgRating": round(rng.uniform(0.5, 5), 2),
+            "runtime": rng.randint(70, 180),
+            "youtubeTrailerIds": [],
+        }
+    }
+
+
+def seconds_since(started):
+    return time.perf_counter() - started
+
+
+def build_rows(catalog, k=10, seed=0, log=print):
+    """
+    Runs the fill_database transformation over the synthetic catalog. Returns the rows and timings.
+    """
+    rng = random.Random(seed)
+    movies = [(movie_id, synthetic_movie(title, genres, rng)) for movie_id, title, genres in catalog]
+
+    started = time.perf_counter()
+    similarities = fill_database.open_similarities(csv_dir=DATA_GENERATOR_DIR)
+    mpaa_by_id = {movie_id: movie["movielens"]["mpaa"] for movie_id, movie in movies}
+    similarities = fill_database.filter_similarities(similarities, mpaa_by_id, k)
+    filter_seconds = seconds_since(started)
+    log("Filtered the similarities of {} movies in {:.2f}s".format(len(movies), filter_seconds))
+
+    started = time.perf_counter()
+    rows = [fill_database.build_row(movie_id, movie, similarities) for movie_id, movie in movies]
+    build_seconds = seconds_since(started)
+    log("Built {} rows in {:.2f}s".format(len(rows), build_seconds))
+    return rows, {
+        "movies": len(rows),
+        "filter_seconds": round(filter_seconds, 4),
+        "build_seconds": round(build_seconds, 4),
+        "build_rows_per_second": round(len(rows) / build_seconds, 1),
+    }
+
+
+def load_movies(rows, chunk_size=1000, log=print):
+    """
+    Replaces the movies of the default database with `rows` (in fill_database.MOVIE_COLUMNS order).
+    On postgres the rows are loaded into a copy of movie_infos that is swapped in.
+    """
+    started = time.perf_counter()
+    if connection.vendor == "postgresql":
+        connection.ensure_connection()
+        load_rows(connection.connection, "data.movie_infos", fill_database.MOVIE_COLUMNS, rows,
+                  mode="swap", chunk_size=chunk_size, progress=log)
+    else:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(SQLITE_MOVIE_TABLE)
+            cursor.execute("DELETE FROM movie_infos")
+            cursor.executemany(
+                "INSERT INTO movie_infos ({}) VALUES ({})".format(
+                    ", ".join(fill_database.MOVIE_COLUMNS), ", ".join(["%s"] * len(fill_database.MOVIE_COLUMNS))),
+                rows,
+            )
+    load_seconds = seconds_since(started)
+    log("Loaded {} rows in {:.2f}s".format(len(rows), load_seconds))
+    return {
+        "load_seconds": round(load_seconds, 4),
+        "load_rows_per_second": round(len(rows) / load_seconds, 1),
+    }
+
+
+def summarize(durations, wall_seconds, errors):
+    milliseconds = np.array(durations) * 1000
+    return {
+        "requests": len(durations),
+        "errors": errors,
+        "p50_ms": round(float(np.percentile(milliseconds, 50)), 3),
+        "p90_ms": round(float(np.percentile(milliseconds, 90)), 3),
+        "p99_ms": round(float(np.percentile(milliseconds, 99)), 3),
+        "mean_ms": round(float(milliseconds.mean()), 3),
+        "max_ms": round(float(milliseconds.max()), 3),
+        "throughput_rps": round(len(durations) / wall_seconds, 1),
+    }
+
+
+def clear_caches():
+    cache.pages.local.clear()
+
+
+class Scenario:
+    """
+    One request path: `requests(rng, count)` returns the (url, params) pairs to send.
+    Uncached scenarios drop the page caches before every request.
+    """
+
+    def __init__(self, name, requests, cached=True, index=True):
+        self.name = name
+        self.requests = requests
+        self.cached = cached
+        self.index = index
+
+    def run(self, count, concurrency=1, warmup=10, seed=0):
+        rng = random.Random(seed)
+        requests = self.requests(rng, warmup + count)
+        with override_settings(RECOMMENDER_INDEX_ENABLED=settings.RECOMMENDER_INDEX_ENABLED and self.index):
+            client = Client()
+            for url, params in requests[:warmup]:
+                client.get(url, params)
+
+            def send(request):
+                url, params = request
+                if not self.cached:
+                    clear_caches()
+                started = time.perf_counter()
+                response = Client().get(url, params) if concurrency > 1 else client.get(url, params)
+                return seconds_since(started), response.status_code >= 400
+
+            started = time.perf_counter()
+            if concurrency > 1:
+                with ThreadPoolExecutor(concurrency) as executor:
+                    results = list(executor.map(send, requests[warmup:]))
+            else:
+                results = [send(request) for request in requests[warmup:]]
+            wall_seconds = seconds_since(started)
+        return summarize([duration for duration, _ in results], wall_seconds,
+                         sum(failed for _, failed in results))
+
+
+def select2_field_id():
+    body = Client().get(reverse("movie_select")).content.decode()
+    match = re.search(r'data-field_id="([^"]+)"', body)
+    if match is None:
+        raise RuntimeError("The movie select page has no select2 field")
+    return match.group(1)
+
+
+def scenarios():
+    movie_ids = list(Movie.objects.values_list("id", flat=True))
+    titles = list(Movie.objects.values_list("title", flat=True))
+    if not movie_ids:
+        raise RuntimeError("No movies in the database, run the benchmark with --seed")
+
+    def results(rng, count):
+        return [(reverse("results", args=[rng.choice(movie_ids)]), {}) for _ in range(count)]
+
+    def popular_results(rng, count):
+        # Most traffic goes to a few popular movies
+        popular = rng.sample(movie_ids, min(50, len(movie_ids)))
+        return [(reverse("results", args=[rng.choice(popular)]), {}) for _ in range(count)]
+
+    def search_terms(rng, count):
+        # Autocomplete terms as typed: the first 2 to 6 characters of a title
+        terms = []
+        for _ in range(count):
+            title = rng.choice(titles)
+            terms.append(title[:rng.randint(2, 6)].strip() or title)
+        return terms
+
+    def movies(rng, count):
+        return [(reverse("movies"), {"title": term}) for term in search_terms(rng, count)]
+
+    def autocomplete(rng, count):
+        field_id = select2_field_id()
+        return [(reverse("django_select2:auto-json"), {"term": term, "field_id": field_id})
+                for term in search_terms(rng, count)]
+
+    def recommendations(rng, count):
+        return [(reverse("recommendations", args=[rng.choice(movie_ids)]), {"k": 5}) for _ in range(count)]
+
+    return [
+        Scenario("results", results, cached=False),
+        Scenario("results_without_index", results, cached=False, index=False),
+        Scenario("results_cached", popular_results),
+        Scenario("movies_search", movies),
+        Scenario("select2_autocomplete", autocomplete),
+        Scenario("recommendations_api", recommendations),
+    ]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=settings.BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata():
+    return {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "cpus": os.cpu_count(),
+        "data_build": data_build.current_version(),
+        "index_enabled": settings.RECOMMENDER_INDEX_ENABLED,
+    }
+
+
+def write_report(report, path):
+    path = str(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
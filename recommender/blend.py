@@ -0,0 +1,102 @@
+"""
+Request time ensemble of the stored recommendation lists.
+
+Weighted reciprocal rank fusion: a movie at rank r (starting at 1) of an algorithm's list gets
+weight / (RANK_CONSTANT + r), the contributions of all lists are summed up per movie. Movies
+several algorithms agree on move to the top and every movie appears once. A small boost for the
+movielens rating breaks near ties towards well rated movies. The lists are at most a few dozen
+ids, so a blend is a handful of numpy calls on tiny int arrays.
+"""
+import numpy as np
+from django.conf import settings
+
+from recommender.recommendations import ALGORITHMS
+
+BLENDED = "blended"
+# The stored lists are short (10 entries), a small constant keeps the rank within a list relevant
+RANK_CONSTANT = 10
+# Score added for a 5 star movielens rating, about a third of a single list's first place
+RATING_BOOST = 0.03
+MAX_RATING = 5.0
+# Entries per stored list taken into account
+BLEND_DEPTH = 10
+
+
+def default_weights():
+    return dict(settings.RECOMMENDER_BLEND_WEIGHTS)
+
+
+def parse_weights(text):
+    """
+    Parses "cosine:2,jaccard:0.5" into a weight per algorithm. Algorithms that are not mentioned
+    keep their default weight, a weight of 0 leaves an algorithm out. Raises ValueError.
+    """
+    weights = default_weights()
+    for part in (text or "").split(","):
+        if not part:
+            continue
+        algorithm, _, weight = part.partition(":")
+        if algorithm not in ALGORITHMS:
+            raise ValueError("Unknown algorithm: {}".format(algorithm))
+        try:
+            weight = float(weight)
+        except ValueError:
+            raise ValueError("Weight of {} has to be a number".format(algorithm))
+        if not weight >= 0:
+            raise ValueError("Weight of {} must not be negative".format(algorithm))
+        weights[algorithm] = weight
+    return weights
+
+
+def fuse(ranked, weights, ratings, k=None):
+    """
+    Fuses ranked id lists. `ranked` maps algorithms to int arrays of ids (best first, in any id
+    space, e.g. neighbor index rows), `ratings` returns the movielens ratings of an array of ids.
+    Returns the fused ids, best first.
+    """
+    lists = [(np.asarray(ids), weights.get(algorithm, 0.0)) for algorithm, ids in ranked.items()]
+    lists = [(ids, weight) for ids, weight in lists if weight > 0 and len(ids)]
+    if not lists:
+        return np.empty(0, dtype=np.int64)
+
+    ids = np.concatenate([ids for ids, _ in lists])
+    contributions = np.concatenate([weight / (RANK_CONSTANT + np.arange(1, len(ids) + 1)) for ids, weight in lists])
+    return accumulate(ids, contributions, ratings, k)
+
+
+def accumulate(ids, contributions, ratings, k=None):
+    """
+    Sums the contributions per id, adds the rating boost and returns the best `k` ids.
+    """
+    unique, inverse = np.unique(ids, return_inverse=True)
+    scores = np.bincount(inverse, weights=contributions, minlength=len(unique))
+    scores += RATING_BOOST * np.asarray(ratings(unique), dtype=np.float64) / MAX_RATING
+    # Equal scores are ordered by id, so a blend is reproducible
+    order = np.lexsort((unique, -scores))
+    return unique[order[:k]]
+
+
+def blend_index(index, movie_id, weights=None, k=5):
+    """
+    Blended recommendations of a movie in the neighbor index, as tiles.
+    """
+    ranked = {algorithm: index.neighbor_rows(movie_id, algorithm, BLEND_DEPTH) for algorithm in index.algorithms}
+    rows = fuse(ranked, weights or default_weights(), lambda rows: index.movielens_ratings[rows], k)
+    return [index.tile(row) for row in rows.tolist()]
+
+
+def blend_movies(resolved, weights=None, k=5):
+    """
+    Blends lists of movies as returned by resolve_recommendations.
+    """
+    by_id = {}
+    ranked = {}
+    for algorithm, movies in resolved.items():
+        for movie in movies:
+            by_id[movie.id] = movie
+        ranked[algorithm] = np.array([movie.id for movie in movies[:BLEND_DEPTH]], dtype=np.int64)
+
+    def ratings(ids):
+        return [float((by_id[movie_id].ratings or {}).get("movielens") or 0) for movie_id in ids.tolist()]
+
+    return [by_id[movie_id] for movie_id in fuse(ranked, weights or default_weights(), ratings, k).tolist()]
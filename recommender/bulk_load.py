@@ -0,0 +1,224 @@
+"""
+Bulk loading of rows into postgres with COPY or batched INSERTs.
+
+Works on a plain psycopg2 connection, so it can be used from the data generator scripts as well
+as from management commands (via `django.db.connection`).
+"""
+import io
+import time
+from itertools import islice
+
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+
+METHODS = ("copy", "values")
+MODES = ("upsert", "swap")
+# Column of the COPY staging table holding the position of a row in its chunk
+SEQUENCE_COLUMN = "_seq"
+
+
+class LoadStats:
+    def __init__(self):
+        self.rows = 0
+        self.started = time.perf_counter()
+
+    @property
+    def seconds(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        return "{} rows in {:.1f}s ({:.0f} rows/s)".format(self.rows, self.seconds, self.rows_per_second)
+
+
+def connect():
+    """
+    psycopg2 connection to the database configured in the django settings.
+    """
+    from RecommenderSystemsFinalProject.settings import DATABASES
+
+    return psycopg2.connect(user=DATABASES["default"]["USER"],
+                            password=DATABASES["default"]["PASSWORD"],
+                            host=DATABASES["default"]["HOST"],
+                            port="5432",
+                            database="movies_recommender")
+
+
+def chunked(rows, size):
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def table_identifier(table):
+    return sql.Identifier(*table.split("."))
+
+
+def _split_table(table):
+    if "." in table:
+        return table.split(".", 1)
+    return None, table
+
+
+def _upsert_suffix(columns, key):
+    updated = [column for column in columns if column not in key]
+    if not updated:
+        return sql.SQL("ON CONFLICT ({}) DO NOTHING").format(sql.SQL(", ").join(map(sql.Identifier, key)))
+    return sql.SQL("ON CONFLICT ({}) DO UPDATE SET {}").format(
+        sql.SQL(", ").join(map(sql.Identifier, key)),
+        sql.SQL(", ").join(
+            sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(column)) for column in updated
+        ),
+    )
+
+
+def _deduplicate(chunk, columns, key):
+    # A single INSERT .. ON CONFLICT can not touch the same row twice, the last row of a key wins
+    positions = [columns.index(column) for column in key]
+    rows = {}
+    for row in chunk:
+        rows[tuple(row[position] for position in positions)] = row
+    return list(rows.values())
+
+
+def _csv_field(value):
+    # Unquoted empty fields are NULL in COPY's csv format, quoted ones are (empty) strings
+    if value is None:
+        return ""
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def copy_rows(cursor, table, columns, rows):
+    """
+    Streams `rows` (sequences in `columns` order) into `table` with COPY FROM STDIN.
+    None is written as NULL, everything else with its str() representation.
+    """
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(",".join(map(_csv_field, row)))
+        buffer.write("\n")
+    buffer.seek(0)
+    statement = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+        table_identifier(table),
+        sql.SQL(", ").join(map(sql.Identifier, columns)),
+    )
+    cursor.copy_expert(statement.as_string(cursor), buffer)
+
+
+def _load_chunk(cursor, table, columns, key, chunk, method):
+    column_list = sql.SQL(", ").join(map(sql.Identifier, columns))
+    if method == "copy":
+        _, table_name = _split_table(table)
+        staging = sql.Identifier(table_name + "_staging")
+        cursor.execute(sql.SQL(
+            "CREATE TEMP TABLE IF NOT EXISTS {} (LIKE {} INCLUDING DEFAULTS, {} integer) ON COMMIT DELETE ROWS"
+        ).format(staging, table_identifier(table), sql.Identifier(SEQUENCE_COLUMN)))
+        # Every row carries its position in the chunk, so the last row of a key wins like with "values"
+        copy_rows(cursor, table_name + "_staging", columns + [SEQUENCE_COLUMN],
+                  (tuple(row) + (position,) for position, row in enumerate(chunk)))
+        key_list = sql.SQL(", ").join(map(sql.Identifier, key))
+        cursor.execute(sql.SQL(
+            "INSERT INTO {} ({}) SELECT DISTINCT ON ({}) {} FROM {} ORDER BY {}, {} DESC {}"
+        ).format(
+            table_identifier(table),
+            column_list,
+            key_list,
+            column_list,
+            staging,
+            key_list,
+            sql.Identifier(SEQUENCE_COLUMN),
+            _upsert_suffix(columns, key),
+        ))
+        # ON COMMIT only empties the staging table at the end of a transaction, which can hold several chunks
+        cursor.execute(sql.SQL("TRUNCATE {}").format(staging))
+    else:
+        statement = sql.SQL("INSERT INTO {} ({}) VALUES %s {}").format(
+            table_identifier(table), column_list, _upsert_suffix(columns, key)
+        )
+        execute_values(cursor, statement.as_string(cursor), _deduplicate(chunk, columns, key), page_size=len(chunk))
+
+
+def _swap_tables(cursor, table, load_table):
+    schema, table_name = _split_table(table)
+    _, load_table_name = _split_table(load_table)
+    old_table_name = table_name + "_old"
+    cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+        table_identifier(table), sql.Identifier(old_table_name)))
+    cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+        table_identifier(load_table), sql.Identifier(table_name)))
+    cursor.execute(sql.SQL("DROP TABLE {}").format(
+        sql.Identifier(schema, old_table_name) if schema else sql.Identifier(old_table_name)))
+    # Indexes keep the name they were created with, give them back the names of the live table
+    cursor.execute(
+        "SELECT schemaname, indexname FROM pg_indexes WHERE tablename = %s AND schemaname = COALESCE(%s, current_schema())",
+        (table_name, schema),
+    )
+    for index_schema, index_name in cursor.fetchall():
+        if index_name.startswith(load_table_name):
+            cursor.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(
+                sql.Identifier(index_schema, index_name),
+                sql.Identifier(table_name + index_name[len(load_table_name):]),
+            ))
+
+
+def load_rows(conn, table, columns, rows, key=("id",), method="copy", mode="upsert", chunk_size=1000,
+              progress=print, atomic=False):
+    """
+    Loads an iterable of rows into `table`, committing every `chunk_size` rows. With `atomic` the
+    rows are committed together at the end (after anything the caller did in the open transaction)
+    and a failed load is rolled back.
+
+    method: "copy" streams every chunk with COPY into a temporary staging table, "values" sends
+            batched multi row INSERTs.
+    mode:   "upsert" inserts new and updates existing rows (by `key`), so loading twice is safe.
+            "swap" loads into a fresh copy of the table and swaps it in at the end, readers see
+            either the old or the new data, never a mix.
+    """
+    if method not in METHODS:
+        raise ValueError("Unknown load method: {}".format(method))
+    if mode not in MODES:
+        raise ValueError("Unknown load mode: {}".format(mode))
+    columns = list(columns)
+    key = list(key)
+    stats = LoadStats()
+
+    # Django's connections are in autocommit mode, the chunks (and the staging table) need transactions
+    autocommit = conn.autocommit
+    if autocommit:
+        conn.autocommit = False
+    target = table
+    try:
+        with conn.cursor() as cursor:
+            if mode == "swap":
+                target = table + "_load"
+                cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(table_identifier(target)))
+                cursor.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING ALL)").format(
+                    table_identifier(target), table_identifier(table)))
+                if not atomic:
+                    conn.commit()
+
+            for chunk in chunked(rows, chunk_size):
+                _load_chunk(cursor, target, columns, key, chunk, method)
+                if not atomic:
+                    conn.commit()
+                stats.rows += len(chunk)
+                if progress is not None:
+                    progress("Loaded {}".format(stats))
+
+            if mode == "swap":
+                _swap_tables(cursor, table, target)
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if autocommit:
+            conn.autocommit = True
+    return stats
@@ -0,0 +1,132 @@
+"""
+Two tier cache for data that only changes with a new data build (rendered detail pages).
+
+The first tier is an LRU in every worker process, bounded by the size of the cached values. The
+optional second tier is a django cache shared between processes (redis or the file based cache,
+see RECOMMENDER_SHARED_CACHE). Keys contain the data build version, so publishing a new build
+invalidates everything at once without any TTL. Without a published build nothing is cached.
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from recommender import data_build
+
+
+def size_of(value):
+    """
+    Memory used by a cached value. The caches hold rendered pages (str or bytes), for anything
+    else pass the size to LRUCache.set.
+    """
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """
+    Thread safe least recently used cache holding at most `max_bytes` worth of values.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, _ = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size=None):
+        size = size_of(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class BuildCache:
+    """
+    Values of one kind (`namespace`) cached per data build, in the process LRU and, if
+    configured, in the shared django cache.
+    """
+
+    def __init__(self, namespace, max_bytes):
+        self.namespace = namespace
+        self.local = LRUCache(max_bytes)
+        self._version = None
+
+    def _shared(self):
+        alias = settings.RECOMMENDER_SHARED_CACHE
+        return caches[alias] if alias else None
+
+    def _key(self, version, key):
+        return "recommender:{}:{}:{}".format(self.namespace, version, key)
+
+    def _current_version(self):
+        version = data_build.current_version()
+        if version != self._version:
+            # Entries of the previous build can never be hit again
+            self.local.clear()
+            self._version = version
+        return version
+
+    def get(self, key):
+        version = self._current_version()
+        if version is None:
+            return None
+        full_key = self._key(version, key)
+        value = self.local.get(full_key)
+        if value is None:
+            shared = self._shared()
+            if shared is not None:
+                value = shared.get(full_key)
+                if value is not None:
+                    self.local.set(full_key, value)
+        return value
+
+    def set(self, key, value):
+        version = self._current_version()
+        if version is None:
+            return
+        full_key = self._key(version, key)
+        self.local.set(full_key, value)
+        shared = self._shared()
+        if shared is not None:
+            # The timeout only collects the entries of old builds, it never decides about freshness
+            shared.set(full_key, value, settings.RECOMMENDER_SHARED_CACHE_TIMEOUT)
+
+    def get_or_set(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+
+pages = BuildCache("page", settings.RECOMMENDER_PAGE_CACHE_BYTES)
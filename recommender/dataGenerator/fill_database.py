@@ -1,8 +1,11 @@
+import argparse
 import json
 import os
-import psycopg2
-import pandas as pd
-from RecommenderSystemsFinalProject.settings import DATABASES
+import numpy as np
+from recommender import mpaa
+from recommender.bulk_load import METHODS, MODES, chunked, connect, load_rows
+from recommender.parallel import Progress, default_workers, imap_bounded
+from recommender.similarity_store import NeighborMatrix, open_store
 
 movie_files_path = "./extracted_content_ml-latest"
 cosine_path = "./cosine_jaccard.csv"
@@ -12,141 +15,286 @@ jaccard_path = "./jaccard_similarity.csv"
 jaccard_tags_path = "./tags_jaccard_similarity_final_no_duplicates.csv"
 movies_path = "./movies.csv"
 
+MOVIE_COLUMNS = ("id", "tmdb_id", "title", "description", "release_date", "recommendations", "actors",
+                 "trailer_url", "duration", "mpaa", "ratings")
+RECOMMENDATION_COLUMNS = ("source_id", "algorithm", "rank", "target_id", "score")
+RECOMMENDATION_KEY = ("source_id", "algorithm", "rank")
+# Algorithms whose lists reference tmdb ids
+TMDB_ALGORITHMS = ("tmdb",)
 
-def filter_recommendations(movie, data):
-    translation = {"G": 1, "M": 2, "R": 3, "X": 4}
-    recommendations_new = []
-    for element in data:
-        element_file_name = (str(element)+".json")
-        if "movielens" in element_file_name and translation[movie["movielens"]["mpaa"]] <= translation[element_file_name["movielens"]["mpaa"]]:
-            recommendations_new.append(element)
-    
-    return recommendations_new
 
+def build_row(movielens_id, movie, similarities):
+    """
+    Transforms one extracted movie json into a movie_infos row (in MOVIE_COLUMNS order).
+    `similarities` holds the already filtered neighbor lists of every algorithm.
+    Returns None for movies without movielens data.
+    """
+    to_store = {
+        'id': movielens_id,
+        'tmdb_id': None,
+        'title': None,
+        'description': None,
+        'date': "1970-01-01",
+        'recommendations': {
+            'tmdb': []
+        },
+        'duration': 0,
+        'mpaa': '-',
+        'actors': [],
+        'trailer_url': None,
+        'ratings': {
+            "tmdb": 0,
+            "movielens": 0
+        }
+    }
+    if "tmdb" in movie:
+        to_store["title"] = movie["tmdb"]["original_title"]
+        to_store["tmdb_id"] = movie["tmdb"]["id"]
+        to_store["description"] = movie["tmdb"]["overview"]
+        to_store["date"] = movie["tmdb"]["release_date"]
+        to_store["recommendations"]["tmdb"] = movie["tmdb"]["recommendations"]
+        to_store["ratings"]["tmdb"] = movie["tmdb"]["vote_average"]
+        to_store["actors"] = movie["tmdb"]["credits"]["cast"]
+    if "movielens" not in movie:
+        print("not Adding movie: {}".format(movielens_id))
+        return None
 
-if __name__ == "__main__":
-    print("Generating database")
-    directory = os.fsencode(movie_files_path)
-    cosine_data = pd.read_csv(cosine_path, index_col=0, header=None)
-    cosine_reduced_data = pd.read_csv(cosine_reduced_path, index_col=0, header=None)
-    jaccard_data = pd.read_csv(jaccard_path, index_col=0, header=None)
-    jaccard_tags_data = pd.read_csv(jaccard_tags_path, index_col=0, header=None)
-
-    conn = psycopg2.connect(user=DATABASES["default"]["USER"],
-                     password=DATABASES["default"]["PASSWORD"],
-                     host=DATABASES["default"]["HOST"],
-                     port="5432",
-                     database="movies_recommender")
-    cur = conn.cursor()
-    for file in sorted(os.listdir(directory)):
+    to_store["title"] = movie["movielens"]["title"]
+    to_store["description"] = movie["movielens"]["plotSummary"]
+    to_store["date"] = movie["movielens"]["releaseDate"]
+    to_store["actors"] = movie["movielens"]["actors"]
+    to_store["mpaa"] = movie["movielens"]["mpaa"]
+    to_store["ratings"]["movielens"] = movie["movielens"]["avgRating"]
+    to_store["duration"] = movie["movielens"]["runtime"]
+    trailers = movie["movielens"]["youtubeTrailerIds"]
+    if trailers is not None and len(trailers) > 0:
+        to_store["trailer_url"] = trailers[0]
+    for algorithm, store in similarities.items():
+        try:
+            to_store["recommendations"][algorithm] = store.neighbors(movielens_id)
+        except KeyError:
+            print("No {} similarities for movie: {}".format(algorithm, movielens_id))
+            to_store["recommendations"][algorithm] = []
+
+    # Clean up data
+    if to_store["date"] == '' or to_store["date"] is None:
+        to_store["date"] = '1970-01-01'
+    if to_store["duration"] is None:
+        to_store["duration"] = 0
+
+    return (
+        to_store["id"],
+        to_store["tmdb_id"],
+        to_store["title"],
+        to_store["description"],
+        to_store["date"],
+        json.dumps(to_store["recommendations"]),
+        json.dumps(to_store["actors"]),
+        to_store["trailer_url"],
+        to_store["duration"],
+        to_store["mpaa"],
+        json.dumps(to_store["ratings"]),
+    )
+
+
+def movie_files(path):
+    for file in sorted(os.listdir(os.fsencode(path))):
         filename = os.fsdecode(file)
         if filename.endswith(".json"):
-            # print(os.path.join(directory, filename))
-            movie = {}
-            with open(movie_files_path + "/" + filename) as f:
-                movie = json.load(f)
-            movielens_id = filename.split(".")[0]
-            print("Analysing id: {}".format(movielens_id))
-            to_store = {
-                'id': movielens_id,
-                'tmdb_id': 'null',
-                'title': None,
-                'description': None,
-                'date': "1970-01-01",
-                'recommendations': {
-                    'tmdb': []
-                },
-                'duration': 0,
-                'mpaa': '-',
-                'actors': [],
-                'trailer_url': None,
-                'ratings': {
-                    "tmdb": 0,
-                    "movielens": 0
-                }
-            }
-            if "tmdb" in movie:
-                to_store["title"] = movie["tmdb"]["original_title"].replace("'", "''")
-                to_store["tmdb_id"] = movie["tmdb"]["id"]
-                to_store["description"] = movie["tmdb"]["overview"]
-                to_store["date"] = movie["tmdb"]["release_date"]
-                to_store["recommendations"]["tmdb"] = movie["tmdb"]["recommendations"]
-                to_store["ratings"]["tmdb"] = movie["tmdb"]["vote_average"]
-                to_store["actors"] = json.dumps(movie["tmdb"]["credits"]["cast"]).replace("'", "''")
-            if "movielens" in movie:
-                to_store["title"] = movie["movielens"]["title"].replace("'", "''")
-                to_store["description"] = movie["movielens"]["plotSummary"]
-                to_store["date"] = movie["movielens"]["releaseDate"]
-                to_store["recommendations"]["movielens"]: []
-                to_store["actors"] = json.dumps(movie["movielens"]["actors"]).replace("'", "''")
-                to_store["mpaa"] = movie["movielens"]["mpaa"]
-                to_store["ratings"]["movielens"] = movie["movielens"]["avgRating"]
-                to_store["duration"] = movie["movielens"]["runtime"]
-                trailers = movie["movielens"]["youtubeTrailerIds"]
-                if trailers is not None and len(trailers) > 0:
-                    to_store["trailer_url"] = trailers[0]
-                # Cosine
-                try:
-                    data = list(cosine_data.loc[int(movielens_id)])
-                    data = filter_recommendations(movie, data)
-                    to_store["recommendations"]["cosine"] = data
-                except KeyError:
-                    print("No cosine similarities for movie: {}".format(movielens_id))
-                    to_store["recommendations"]["cosine"] = []
-                try:
-                    data = list(cosine_reduced_data.loc[int(movielens_id)])
-                    data = filter_recommendations(movie, data)
-                    to_store["recommendations"]["cosine_reduced"] = data
-                except KeyError:
-                    print("No reduced cosine similarities for movie: {}".format(movielens_id))
-                    to_store["recommendations"]["cosine_reduced"] = []
-                # Jaccard
-                try:
-                    data = list(jaccard_data.loc[int(movielens_id)])
-                    data = filter_recommendations(movie, data)
-                    to_store["recommendations"]["jaccard"] = data
-                except KeyError:
-                    print("No jaccard similarities for movie: {}".format(movielens_id))
-                    to_store["recommendations"]["jaccard"] = []
-                try:
-                    data = list(jaccard_tags_data.loc[int(movielens_id)])
-                    data = filter_recommendations(movie, data)
-                    to_store["recommendations"]["jaccard_tag"] = data
-                except KeyError:
-                    print("No jaccard_tag similarities for movie: {}".format(movielens_id))
-                    to_store["recommendations"]["jaccard_tag"] = []
-            else:
-                print("not Adding movie: {}".format(id))
-                continue
-            # Clean up data, store to database
-            if to_store["title"] is not None:
-                to_store["title"] = to_store["title"].replace("'", "''")
-            if to_store["description"] is not None:
-                to_store["description"] = to_store["description"].replace("'", "''")
-            if to_store["date"] == '' or to_store["date"] is None:
-                to_store["date"] = '1970-01-01'
-            if to_store["duration"] is None:
-                to_store["duration"] = 0
-            to_store["ratings"] = json.dumps(to_store["ratings"]).replace("'", "''")
-            to_store["recommendations"] = json.dumps(to_store["recommendations"]).replace("'", "''")
-
-            sql_template = '''
-                            INSERT INTO data.movie_infos (id, tmdb_id,  title, description, release_date, recommendations, actors, trailer_url, duration, mpaa, ratings) 
-                            VALUES ({}, {}, '{}', '{}', '{}', '{}', '{}', '{}', {}, '{}', '{}')
-                            '''.format(to_store["id"],
-                                       to_store["tmdb_id"],
-                                       to_store["title"],
-                                       to_store["description"],
-                                       to_store["date"],
-                                       to_store["recommendations"],
-                                       to_store["actors"],
-                                       to_store["trailer_url"],
-                                       to_store["duration"],
-                                       to_store["mpaa"],
-                                       to_store["ratings"],
-                                       )
-
-            cur.execute(sql_template)
-        else:
-            continue
-        conn.commit()
\ No newline at end of file
+            yield os.path.join(path, filename)
+
+
+def read_movie(path):
+    with open(path) as f:
+        movie = json.load(f)
+    return int(os.path.basename(path).split(".")[0]), movie
+
+
+def movie_rows(path, similarities):
+    progress = Progress("Parsed", unit="files")
+    for file_path in movie_files(path):
+        movielens_id, movie = read_movie(file_path)
+        row = build_row(movielens_id, movie, similarities)
+        progress.add()
+        if row is not None:
+            yield row
+    progress.report()
+
+
+# Filtered neighbor lists of a worker process, handed over once per process by _init_worker
+_worker_similarities = None
+
+
+def _init_worker(similarities):
+    global _worker_similarities
+    _worker_similarities = similarities
+
+
+def _read_mpaa(file_paths):
+    ratings = []
+    for file_path in file_paths:
+        movielens_id, movie = read_movie(file_path)
+        if "movielens" in movie:
+            ratings.append((movielens_id, movie["movielens"]["mpaa"]))
+    return len(file_paths), ratings
+
+
+def collect_mpaa(path, workers, batch_size=50, max_pending=None):
+    """
+    First pass over the movie files, returns movielens id -> MPAA rating of every movie that will be stored.
+    """
+    progress = Progress("Read MPAA ratings of", unit="files")
+    mpaa_by_id = {}
+    batches = chunked(movie_files(path), batch_size)
+    if workers > 1:
+        results = imap_bounded(_read_mpaa, batches, workers=workers, max_pending=max_pending)
+    else:
+        results = map(_read_mpaa, batches)
+    for file_count, ratings in results:
+        progress.add(file_count)
+        mpaa_by_id.update(ratings)
+    progress.report()
+    return mpaa_by_id
+
+
+def filter_similarities(similarities, mpaa_by_id, k):
+    """
+    Applies the MPAA rule to the neighbor matrices of all algorithms at once and backfills every
+    list to `k` entries, first from further neighbors of the same algorithm, then from the
+    neighbors of the other algorithms.
+    Movies without a row in an algorithm's data stay without recommendations for it.
+    """
+    ids = np.array(sorted(mpaa_by_id), dtype=np.int32)
+    sources = {algorithm: store.as_arrays()[:2] for algorithm, store in similarities.items()}
+    filtered = mpaa.filter_algorithms(sources, mpaa.rank_table(mpaa_by_id), ids, k)
+    return {algorithm: NeighborMatrix(ids[present], neighbors[present])
+            for algorithm, (neighbors, present) in filtered.items()}
+
+
+def _build_rows(file_paths):
+    rows = []
+    for file_path in file_paths:
+        movielens_id, movie = read_movie(file_path)
+        row = build_row(movielens_id, movie, _worker_similarities)
+        if row is not None:
+            rows.append(row)
+    return len(file_paths), rows
+
+
+def parallel_movie_rows(path, similarities, workers, batch_size=50, max_pending=None):
+    """
+    Parses and transforms the movie files in a pool of `workers` processes and yields the rows to
+    the (single) writer. At most `max_pending` batches are in flight, so memory stays flat even if
+    the database is slower than the parsers.
+    """
+    progress = Progress("Parsed", unit="files")
+    batches = chunked(movie_files(path), batch_size)
+    for file_count, rows in imap_bounded(_build_rows, batches, workers=workers, max_pending=max_pending,
+                                         initializer=_init_worker, initargs=(similarities,)):
+        progress.add(file_count)
+        yield from rows
+    progress.report()
+
+
+def open_similarities(similarity_dir=None, csv_dir="."):
+    """
+    Opens the neighbor lists of every algorithm, either the checked in CSVs (in `csv_dir`) or the
+    stores written by `python -m recommender.similarity.build` into `similarity_dir`.
+    """
+    if similarity_dir is not None:
+        return {
+            algorithm: open_store(os.path.join(similarity_dir, "{}.sim".format(algorithm)))
+            for algorithm in ("cosine", "cosine_reduced", "jaccard", "jaccard_tag")
+            if os.path.exists(os.path.join(similarity_dir, "{}.sim".format(algorithm)))
+        }
+    # CSVs are converted to memory mapped .sim stores next to them on first use
+    return {
+        "cosine": open_store(os.path.join(csv_dir, cosine_path)),
+        "cosine_reduced": open_store(os.path.join(csv_dir, cosine_reduced_path)),
+        "jaccard": open_store(os.path.join(csv_dir, jaccard_path)),
+        "jaccard_tag": open_store(os.path.join(csv_dir, jaccard_tags_path)),
+    }
+
+
+def collect_lists(rows, lists):
+    """
+    Passes the movie rows through and keeps (id, tmdb_id, recommendations json) of every row in `lists`.
+    """
+    for row in rows:
+        lists.append((row[0], row[1], row[5]))
+        yield row
+
+
+def recommendation_rows(lists):
+    """
+    movie_recommendation rows (RECOMMENDATION_COLUMNS) of the lists kept by collect_lists.
+    tmdb ids are translated to movielens ids, entries without a loaded movie are left out and
+    ranks start at 1 without gaps, like the V4 migration does.
+    """
+    loaded_ids = {movie_id for movie_id, _, _ in lists}
+    by_tmdb_id = {}
+    for movie_id, tmdb_id, _ in sorted(lists, key=lambda entry: entry[0]):
+        if tmdb_id is not None:
+            by_tmdb_id.setdefault(tmdb_id, movie_id)
+    for movie_id, _, recommendations in lists:
+        for algorithm, targets in json.loads(recommendations).items():
+            if algorithm in TMDB_ALGORITHMS:
+                targets = [by_tmdb_id.get(target) for target in targets]
+            rank = 0
+            for target in targets:
+                if target in loaded_ids:
+                    rank += 1
+                    yield movie_id, algorithm, rank, target, None
+
+
+def load_recommendations(conn, lists, method="copy", mode="upsert", chunk_size=1000):
+    """
+    Replaces the movie_recommendation rows of the loaded movies. Readers see either the old or the
+    new lists, a failed load leaves the old ones in place.
+    """
+    if mode == "upsert":
+        # Lists can get shorter, entries beyond their new end would survive an upsert. The delete
+        # is committed together with the new rows.
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM data.movie_recommendation WHERE source_id = ANY(%s)",
+                           ([movie_id for movie_id, _, _ in lists],))
+    return load_rows(conn, "data.movie_recommendation", RECOMMENDATION_COLUMNS, recommendation_rows(lists),
+                     key=RECOMMENDATION_KEY, method=method, mode=mode, chunk_size=chunk_size,
+                     atomic=mode == "upsert")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Fill movie_infos from the extracted MovieLens data")
+    parser.add_argument("--method", choices=METHODS, default="copy",
+                        help="copy: COPY FROM STDIN into a staging table, values: batched INSERTs")
+    parser.add_argument("--mode", choices=MODES, default="upsert",
+                        help="upsert: insert or update by id, swap: load into a new table and swap it in")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per transaction")
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="Processes parsing the json files, 1 parses in the writing process")
+    parser.add_argument("--batch-size", type=int, default=50, help="Json files handed to a worker at once")
+    parser.add_argument("--max-pending", type=int, help="Batches in flight at most (default: 2 per worker)")
+    parser.add_argument("--similarity-dir", help="Use the stores of recommender.similarity.build instead of the CSVs")
+    parser.add_argument("-k", type=int, default=10, help="Recommendations stored per algorithm after filtering")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    print("Generating database")
+    mpaa_by_id = collect_mpaa(movie_files_path, arguments.workers, arguments.batch_size, arguments.max_pending)
+    similarities = filter_similarities(open_similarities(arguments.similarity_dir), mpaa_by_id, arguments.k)
+    if arguments.workers > 1:
+        rows = parallel_movie_rows(movie_files_path, similarities, arguments.workers, arguments.batch_size,
+                                   arguments.max_pending)
+    else:
+        rows = movie_rows(movie_files_path, similarities)
+    lists = []
+    conn = connect()
+    stats = load_rows(conn, "data.movie_infos", MOVIE_COLUMNS, collect_lists(rows, lists),
+                      method=arguments.method, mode=arguments.mode, chunk_size=arguments.chunk_size)
+    print("Done: {}".format(stats))
+    stats = load_recommendations(conn, lists, method=arguments.method, mode=arguments.mode,
+                                 chunk_size=arguments.chunk_size)
+    conn.close()
+    print("Loaded movie_recommendation: {}".format(stats))
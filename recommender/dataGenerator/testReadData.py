@@ -1,24 +1,26 @@
-import pandas as pd
+from recommender.similarity.validate import print_report, validate
+from recommender.similarity_store import open_store
 cosine_path = "./cosine_simm_2.csv"
+movies_path = "./movies.csv"
 
 
 def read_data():
-    data = pd.read_csv(cosine_path, index_col=0, header=None)
+    data = open_store(cosine_path)
     print("First row")
     try:
-        print(list(data.loc[100]))
-    except IndexError:
+        print(data.neighbors(100))
+    except KeyError:
         print("Movie not found")
 
 
-def remove_duplicate_lines(infilename, outfilename):
-    lines_seen = set()  # holds lines already seen
-    outfile = open(outfilename, "w")
-    for line in open(infilename, "r"):
-        if line not in lines_seen:  # not a duplicate
-            outfile.write(line)
-            lines_seen.add(line)
-    outfile.close()
+def remove_duplicate_lines(infilename, outfilename, movies_path=movies_path):
+    """
+    Writes the clean, sorted version of a neighbor CSV with one row per movie, in constant memory.
+    Also drops headers, self references and ids that are not in movies.csv, see validate.py.
+    """
+    report = validate(infilename, outfilename, movies_path=movies_path)
+    print_report(report)
+    return report
 
 
 if __name__ == "__main__":
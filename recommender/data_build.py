@@ -0,0 +1,180 @@
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+VERSION_FILE_NAME = "BUILD_VERSION"
+# Versions are UTC timestamps, so they sort and tell when a build was published
+VERSION_FORMAT = "%Y%m%d%H%M%S%f"
+# Every build writes its own files, <stem>.<version><suffix> (neighbor_index.<version>.npz)
+BUILD_FILE_PATTERN = re.compile(r"^(?P<stem>.+)\.(?P<version>\d{14,})(?P<suffix>\.[^.]+)$")
+
+_lock = threading.Lock()
+_cached_version = None
+_checked_at = 0.0
+_version_stat = None
+
+
+def data_dir():
+    return Path(settings.RECOMMENDER_DATA_DIR)
+
+
+def new_version():
+    return datetime.now(timezone.utc).strftime(VERSION_FORMAT)
+
+
+def build_file(name, version, directory=None):
+    """
+    Path of the file `name` (e.g. "neighbor_index.npz") of the data build `version`. A build's files
+    are written next to the ones of the published build and only served once it is published.
+    """
+    directory = Path(directory) if directory is not None else data_dir()
+    stem, suffix = os.path.splitext(name)
+    return directory / "{}.{}{}".format(stem, version, suffix)
+
+
+def build_files(directory=None):
+    """
+    (path, name, version) of the files of all builds in `directory`.
+    """
+    directory = Path(directory) if directory is not None else data_dir()
+    if not directory.is_dir():
+        return []
+    found = []
+    for path in directory.iterdir():
+        match = BUILD_FILE_PATTERN.match(path.name)
+        if match and path.is_file():
+            found.append((path, match.group("stem") + match.group("suffix"), match.group("version")))
+    return found
+
+
+def read_version(directory=None):
+    """
+    The published version in `directory`, read from disk without the caching of current_version.
+    """
+    directory = Path(directory) if directory is not None else data_dir()
+    try:
+        with open(directory / VERSION_FILE_NAME) as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _link_or_copy(source, target):
+    temporary_path = target.with_name(target.name + ".tmp")
+    try:
+        os.link(source, temporary_path)
+    except FileExistsError:
+        os.remove(temporary_path)
+        os.link(source, temporary_path)
+    except OSError:
+        shutil.copyfile(source, temporary_path)
+    os.replace(temporary_path, target)
+
+
+def publish(directory=None, version=None, carry_over=True):
+    """
+    Marks the data build in `directory` as the current one. Everything keyed on the build version
+    (the in-memory index, caches, ETags) is invalidated at once.
+
+    With `carry_over` the files the new build did not write (e.g. the description index when only
+    the neighbor index was rebuilt) are taken over from the previous build. Files of builds older
+    than the previous one are deleted, workers that did not notice the new build yet keep theirs.
+    Can be used without a configured django (e.g. from the data generator scripts).
+    """
+    directory = Path(directory) if directory is not None else data_dir()
+    version = version or new_version()
+    directory.mkdir(parents=True, exist_ok=True)
+    previous = read_version(directory)
+    if carry_over and previous is not None and previous != version:
+        for path, name, file_version in build_files(directory):
+            target = build_file(name, version, directory)
+            if file_version == previous and not target.exists():
+                _link_or_copy(path, target)
+
+    temporary_path = directory / (VERSION_FILE_NAME + ".tmp")
+    with open(temporary_path, "w") as file:
+        file.write(version)
+    os.replace(temporary_path, directory / VERSION_FILE_NAME)
+
+    # Versions of the same format sort by time, newer files may belong to a build that is still running
+    oldest_kept = min(version, previous) if previous is not None else version
+    for path, _, file_version in build_files(directory):
+        if file_version < oldest_kept:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    return version
+
+
+def current_version():
+    """
+    Returns the version of the currently published data build, or None if nothing was published.
+    The stamp file is checked at most every RECOMMENDER_BUILD_CHECK_INTERVAL seconds.
+    """
+    global _cached_version, _checked_at, _version_stat
+    now = time.monotonic()
+    if now - _checked_at < settings.RECOMMENDER_BUILD_CHECK_INTERVAL:
+        return _cached_version
+    with _lock:
+        if now - _checked_at < settings.RECOMMENDER_BUILD_CHECK_INTERVAL:
+            return _cached_version
+        path = data_dir() / VERSION_FILE_NAME
+        try:
+            stat = os.stat(path)
+            stat_key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+            if stat_key != _version_stat:
+                with open(path) as file:
+                    _cached_version = file.read().strip() or None
+                _version_stat = stat_key
+        except FileNotFoundError:
+            _cached_version = None
+            _version_stat = None
+        _checked_at = now
+    return _cached_version
+
+
+async def acurrent_version():
+    """
+    current_version for async views. The stamp file is checked in a thread, so the event loop
+    never waits for the disk; in between checks the cached version is returned right away.
+    """
+    if time.monotonic() - _checked_at < settings.RECOMMENDER_BUILD_CHECK_INTERVAL:
+        return _cached_version
+    return await sync_to_async(current_version, thread_sensitive=False)()
+
+
+def published_at(version=None):
+    """
+    Publication time of a data build, None if unknown.
+    """
+    version = version or current_version()
+    if version is None:
+        return None
+    try:
+        return datetime.strptime(version, VERSION_FORMAT).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def etag(request, *args, **kwargs):
+    """
+    ETag of a response that only depends on the request URL and the published data build,
+    for django's `condition` decorator.
+    """
+    version = current_version()
+    if version is None:
+        return None
+    return hashlib.md5("{}:{}".format(version, request.get_full_path()).encode("utf-8")).hexdigest()
+
+
+def last_modified(request, *args, **kwargs):
+    return published_at()
@@ -0,0 +1,250 @@
+"""
+Offline evaluation of the stored recommendation lists of a neighbor index, over the whole catalog.
+
+Per algorithm:
+
+    list_coverage          share of the movies with at least one recommendation
+    catalog_coverage       share of the movies recommended at least once
+    exposure_gini          how unequally the recommendations are spread over the recommended movies
+                           (0: all equally often, 1: always the same movie)
+    diversity              intra-list diversity, mean genre jaccard distance of all pairs in a list
+    popularity_percentile  mean popularity percentile (number of ratings) of the recommended movies
+    long_tail_share        share of recommendations outside the POPULAR_SHARE most rated movies
+
+plus the mean jaccard overlap of the lists of every pair of algorithms. The popularity metrics need
+MovieLens' ratings.csv and are None without it.
+
+A chunk of lists is scored with a few array operations (a batched product of the genre vectors
+gives the k x k genre overlaps of every list) and chunks are evaluated in parallel worker processes.
+"""
+import json
+import os
+from itertools import combinations
+
+import numpy as np
+
+from recommender import data_build
+from recommender.parallel import imap_bounded
+from recommender.similarity import features
+
+MOVIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dataGenerator", "movies.csv")
+REPORT_FILE_NAME = "evaluation.json"
+# The most rated fifth of the catalog is the popular head, everything else the long tail
+POPULAR_SHARE = 0.2
+# metric -> True if higher is better, used by the gate
+METRICS = {
+    "list_coverage": True,
+    "catalog_coverage": True,
+    "exposure_gini": False,
+    "diversity": True,
+    "popularity_percentile": False,
+    "long_tail_share": True,
+}
+
+# Arrays of a worker process, set by _init_worker
+_worker_data = None
+
+
+def genre_vectors(ids, movies_path=MOVIES_PATH):
+    """
+    Dense binary genre vector of every movie of the (sorted) `ids`, plus a last all zero row that
+    the -1 padding of the neighbor matrices points to.
+    """
+    movie_ids, _, genres = features.read_movies(movies_path)
+    matrix, _ = features.genre_matrix(genres)
+    known = np.asarray(matrix.todense(), dtype=np.float32)
+    rows = features.rows_of(np.asarray(movie_ids), np.asarray(ids))
+    vectors = np.zeros((len(ids) + 1, known.shape[1]), dtype=np.float32)
+    vectors[:-1][rows >= 0] = known[rows[rows >= 0]]
+    return vectors
+
+
+def rating_counts(ids, ratings_path, chunk_size=2000000):
+    """
+    Number of ratings of every movie of the (sorted) `ids` in MovieLens' ratings.csv.
+    """
+    import pandas as pd
+
+    counts = np.zeros(len(ids), dtype=np.int64)
+    for chunk in pd.read_csv(ratings_path, usecols=["movieId"], chunksize=chunk_size, dtype={"movieId": np.int32}):
+        rows = features.rows_of(np.asarray(ids), chunk["movieId"].to_numpy())
+        counts += np.bincount(rows[rows >= 0], minlength=len(ids))
+    return counts
+
+
+def popularity_percentiles(counts):
+    """
+    Share of the catalog rated less often than each movie, 0 for the least rated movies.
+    """
+    return (np.searchsorted(np.sort(counts), counts, side="left") / max(len(counts), 1)).astype(np.float32)
+
+
+def gini(values):
+    values = np.sort(np.asarray(values, dtype=np.float64))
+    total = values.sum()
+    if len(values) == 0 or total == 0:
+        return 0.0
+    ranks = np.arange(1, len(values) + 1)
+    return float(2 * np.sum(ranks * values) / (len(values) * total) - (len(values) + 1) / len(values))
+
+
+def list_diversity(vectors):
+    """
+    Sum and number of the intra-list diversities of a chunk of lists of genre vectors [lists, k, genres].
+    Pairs with a movie without genres (or padding) are left out.
+    """
+    intersections = vectors @ vectors.transpose(0, 2, 1)
+    sizes = vectors.sum(axis=2)
+    unions = sizes[:, :, None] + sizes[:, None, :] - intersections
+    k = vectors.shape[1]
+    upper = np.triu(np.ones((k, k), dtype=bool), 1)
+    pairs = (sizes[:, :, None] > 0) & (sizes[:, None, :] > 0) & upper
+    distances = np.where(pairs, 1 - intersections / np.maximum(unions, 1), 0.0)
+    pair_counts = pairs.sum(axis=(1, 2))
+    scored = pair_counts > 0
+    return float((distances.sum(axis=(1, 2))[scored] / pair_counts[scored]).sum()), int(scored.sum())
+
+
+def list_overlap(left, right):
+    """
+    Sum and number of the jaccard overlaps of two chunks of neighbor row lists, rows where both are empty
+    are left out.
+    """
+    left_valid = left >= 0
+    right_valid = right >= 0
+    shared = ((left[:, :, None] == right[:, None, :]) & left_valid[:, :, None]).any(axis=2).sum(axis=1)
+    unions = left_valid.sum(axis=1) + right_valid.sum(axis=1) - shared
+    both = (left_valid.any(axis=1)) & (right_valid.any(axis=1))
+    return float((shared[both] / unions[both]).sum()), int(both.sum())
+
+
+def _init_worker(data):
+    global _worker_data
+    _worker_data = data
+
+
+def _chunk(arguments):
+    start, stop = arguments
+    neighbors, vectors, percentiles, popular = _worker_data
+    rows = len(vectors) - 1
+    partial = {"algorithms": {}, "overlap": {}}
+    for algorithm, matrix in neighbors.items():
+        block = matrix[start:stop]
+        valid = block >= 0
+        recommended = block[valid]
+        # The padding (-1) selects the all zero last row
+        diversity_sum, diversity_count = list_diversity(vectors[block])
+        partial["algorithms"][algorithm] = {
+            "lists": int(valid.any(axis=1).sum()),
+            "recommendations": int(valid.sum()),
+            "exposure": np.bincount(recommended, minlength=rows),
+            "diversity_sum": diversity_sum,
+            "diversity_count": diversity_count,
+            "percentile_sum": float(percentiles[recommended].sum()) if percentiles is not None else None,
+            "tail": int((~popular[recommended]).sum()) if popular is not None else None,
+        }
+    for left, right in combinations(sorted(neighbors), 2):
+        partial["overlap"][(left, right)] = list_overlap(neighbors[left][start:stop], neighbors[right][start:stop])
+    return partial
+
+
+def _merge(total, partial):
+    if total is None:
+        return partial
+    for algorithm, values in partial["algorithms"].items():
+        merged = total["algorithms"][algorithm]
+        for name, value in values.items():
+            merged[name] = None if value is None else merged[name] + value
+    for pair, (overlap_sum, count) in partial["overlap"].items():
+        previous_sum, previous_count = total["overlap"][pair]
+        total["overlap"][pair] = (previous_sum + overlap_sum, previous_count + count)
+    return total
+
+
+def evaluate(index, movies_path=MOVIES_PATH, ratings_path=None, k=10, chunk_size=4096, workers=1):
+    """
+    Evaluates the top `k` recommendations of every algorithm of a neighbor index, returns the report.
+    """
+    rows = len(index)
+    neighbors = {algorithm: matrix[:, :k] for algorithm, matrix in index.neighbors.items()}
+    vectors = genre_vectors(index.ids, movies_path)
+    percentiles = None
+    popular = None
+    if ratings_path:
+        counts = rating_counts(index.ids, ratings_path)
+        percentiles = popularity_percentiles(counts)
+        popular = percentiles >= 1 - POPULAR_SHARE
+
+    chunks = [(start, min(start + chunk_size, rows)) for start in range(0, rows, chunk_size)]
+    data = (neighbors, vectors, percentiles, popular)
+    if workers > 1:
+        results = imap_bounded(_chunk, chunks, workers=workers, initializer=_init_worker, initargs=(data,))
+    else:
+        _init_worker(data)
+        results = map(_chunk, chunks)
+    total = None
+    for partial in results:
+        total = _merge(total, partial)
+
+    report = {"version": index.version, "movies": rows, "k": k, "algorithms": {}, "overlap": {}}
+    if total is None:
+        return report
+    for algorithm, values in sorted(total["algorithms"].items()):
+        recommendations = max(values["recommendations"], 1)
+        exposure = values["exposure"]
+        report["algorithms"][algorithm] = {
+            "list_coverage": round(values["lists"] / max(rows, 1), 4),
+            "catalog_coverage": round(int((exposure > 0).sum()) / max(rows, 1), 4),
+            "mean_length": round(values["recommendations"] / max(values["lists"], 1), 2),
+            "exposure_gini": round(gini(exposure[exposure > 0]), 4),
+            "diversity": round(values["diversity_sum"] / max(values["diversity_count"], 1), 4),
+            "popularity_percentile": (round(values["percentile_sum"] / recommendations, 4)
+                                      if values["percentile_sum"] is not None else None),
+            "long_tail_share": round(values["tail"] / recommendations, 4) if values["tail"] is not None else None,
+        }
+    for (left, right), (overlap_sum, count) in sorted(total["overlap"].items()):
+        report["overlap"]["{}/{}".format(left, right)] = round(overlap_sum / max(count, 1), 4)
+    return report
+
+
+def regressions(report, baseline, tolerance):
+    """
+    Metrics that got worse than in `baseline` by more than `tolerance`, as readable messages.
+    Algorithms or metrics missing from either report are not compared.
+    """
+    found = []
+    for algorithm, metrics in report["algorithms"].items():
+        previous = baseline.get("algorithms", {}).get(algorithm)
+        if previous is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            value = metrics.get(metric)
+            before = previous.get(metric)
+            if value is None or before is None:
+                continue
+            change = value - before if higher_is_better else before - value
+            if change < -tolerance:
+                found.append("{} {}: {} -> {}".format(algorithm, metric, before, value))
+    return found
+
+
+def report_path(version):
+    """
+    Path of the report of the data build `version`, the baseline of the next build.
+    """
+    return data_build.build_file(REPORT_FILE_NAME, version)
+
+
+def read_report(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def write_report(report, path):
+    temporary_path = "{}.tmp".format(path)
+    with open(temporary_path, "w") as file:
+        json.dump(report, file, indent=2)
+    os.replace(temporary_path, path)
@@ -2,7 +2,7 @@ from django import forms
 from django.template import loader
 from django_select2 import forms as s2forms
 
-from . import models
+from . import models, search
 
 
 class MoviesWidget(s2forms.ModelSelect2Widget):
@@ -11,6 +11,9 @@ class MoviesWidget(s2forms.ModelSelect2Widget):
     ]
     model = models.Movie
 
+    def filter_queryset(self, request, term, queryset=None, **dependent_fields):
+        return search.search_movies(term, queryset=queryset)
+
 
 # class MovieSelectForm(forms.ModelForm):
 class MovieSelectForm(forms.ModelForm):
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from recommender import benchmark
+
+
+class Command(BaseCommand):
+    help = "Measures the data load and the latency and throughput of the hot request paths, writes a json report"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", action="store_true",
+                            help="Replace all movies with the synthetic catalog first, only with the benchmark settings")
+        parser.add_argument("--allow-configured-database", action="store_true",
+                            help="Let --seed replace the movies of the database of other settings (never production!)")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+        parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per scenario")
+        parser.add_argument("--concurrency", type=int, default=1, help="Threads sending requests")
+        parser.add_argument("--scenario", action="append", help="Only run these scenarios")
+        parser.add_argument("--random-seed", type=int, default=0)
+        parser.add_argument("--output", help="Report path, default: benchmark.json in RECOMMENDER_DATA_DIR")
+
+    def handle(self, *args, **options):
+        log = self.stdout.write
+        report = {"meta": None, "load": None, "scenarios": {}}
+        if options["seed"]:
+            if not settings.RECOMMENDER_BENCHMARK_SETTINGS and not options["allow_configured_database"]:
+                raise CommandError(
+                    "--seed replaces every movie of the configured {} database, run it with "
+                    "--settings RecommenderSystemsFinalProject.settings_benchmark or pass "
+                    "--allow-configured-database".format(connection.vendor))
+            rows, load = benchmark.build_rows(benchmark.read_catalog(), seed=options["random_seed"], log=log)
+            load.update(benchmark.load_movies(rows, log=log))
+            report["load"] = load
+            call_command("build_neighbor_index", stdout=self.stdout)
+
+        scenarios = benchmark.scenarios()
+        if options["scenario"]:
+            unknown = set(options["scenario"]) - {scenario.name for scenario in scenarios}
+            if unknown:
+                raise CommandError("Unknown scenario: {}".format(", ".join(sorted(unknown))))
+            scenarios = [scenario for scenario in scenarios if scenario.name in options["scenario"]]
+
+        report["meta"] = benchmark.metadata()
+        report["meta"].update(requests=options["requests"], concurrency=options["concurrency"],
+                              random_seed=options["random_seed"])
+        for scenario in scenarios:
+            result = scenario.run(options["requests"], options["concurrency"], options["warmup"],
+                                  options["random_seed"])
+            report["scenarios"][scenario.name] = result
+            log("{:<24} p50 {:>8.2f}ms  p99 {:>8.2f}ms  {:>8.1f} req/s  {} errors".format(
+                scenario.name, result["p50_ms"], result["p99_ms"], result["throughput_rps"], result["errors"]))
+
+        output = options["output"] or settings.RECOMMENDER_DATA_DIR / "benchmark.json"
+        benchmark.write_report(report, output)
+        log("Wrote {}".format(output))
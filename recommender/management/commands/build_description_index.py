@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recommender import data_build
+from recommender.models import Movie
+from recommender.similarity.ann import DEFAULT_DIMENSIONS, DescriptionIndex, index_path
+
+
+class Command(BaseCommand):
+    help = "Builds the approximate nearest neighbor index over the movie descriptions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dimensions", type=int, default=DEFAULT_DIMENSIONS, help="SVD dimensions of the embeddings")
+        parser.add_argument("--lists", type=int, help="Number of clusters, 4 * sqrt(movies) by default")
+        parser.add_argument("--iterations", type=int, default=20, help="k-means iterations")
+        parser.add_argument("--min-df", type=int, default=2)
+        parser.add_argument("--max-df", type=float, default=0.5)
+        parser.add_argument("--recall-sample", type=int, default=200,
+                            help="Movies used to report the recall of some nprobe values, 0 to skip")
+        parser.add_argument("--no-publish", action="store_true",
+                            help="Only write the index file of the new build, do not publish it")
+
+    def handle(self, *args, **options):
+        version = data_build.new_version()
+        movies = list(Movie.objects.order_by("id").values_list("id", "description").iterator(chunk_size=5000))
+        started = time.perf_counter()
+        index = DescriptionIndex.build(
+            [movie_id for movie_id, _ in movies], [description or "" for _, description in movies],
+            dimensions=options["dimensions"], lists=options["lists"], iterations=options["iterations"],
+            min_df=options["min_df"], max_df=options["max_df"], version=version,
+        )
+        self.stdout.write("Indexed {} of {} movies in {} lists ({:.1f}s)".format(
+            len(index), len(movies), index.lists, time.perf_counter() - started))
+
+        if options["recall_sample"]:
+            for nprobe in (1, 4, 16, 64):
+                if nprobe > index.lists:
+                    break
+                recall = index.recall(k=10, nprobe=nprobe, sample=options["recall_sample"])
+                self.stdout.write("nprobe {:>3}: recall@10 {:.3f}".format(nprobe, recall))
+
+        # Files of the new build are never served before it is published
+        path = index_path(version)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        index.save(path)
+        self.stdout.write("Wrote {}".format(path))
+        if not options["no_publish"]:
+            data_build.publish(version=version)
+            self.stdout.write("Published data build {}".format(version))
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recommender import data_build, evaluation
+from recommender.models import Movie
+from recommender.neighbor_index import NeighborIndex, index_path
+from recommender.parallel import default_workers
+
+
+class Command(BaseCommand):
+    help = "Builds the in-memory neighbor index from movie_infos and publishes it as a new data build"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--no-publish", action="store_true",
+                            help="Only write the index file of the new build, do not publish it")
+        parser.add_argument("--evaluate", action="store_true",
+                            help="Evaluate the new index and keep the current build if a metric got worse "
+                                 "than in the report of the published build")
+        parser.add_argument("--ratings", help="MovieLens ratings.csv for the popularity metrics of --evaluate")
+        parser.add_argument("--tolerance", type=float, default=settings.RECOMMENDER_EVALUATION_TOLERANCE)
+
+    def handle(self, *args, **options):
+        version = data_build.new_version()
+        movies = Movie.objects.only(
+            "id", "tmdb_id", "title", "description", "trailer_url", "ratings", "mpaa", "recommendations"
+        ).iterator(chunk_size=2000)
+        index = NeighborIndex.from_movies(movies, version=version)
+
+        report = None
+        if options["evaluate"]:
+            report = evaluation.evaluate(index, ratings_path=options["ratings"], workers=default_workers())
+            current = data_build.current_version()
+            baseline = evaluation.read_report(evaluation.report_path(current)) if current else None
+            found = evaluation.regressions(report, baseline, options["tolerance"]) if baseline else []
+            for regression in found:
+                self.stdout.write("Regression {}".format(regression))
+            if found:
+                raise CommandError("Not publishing, {} metrics got worse than in the current build".format(len(found)))
+            self.stdout.write("Evaluation passed")
+
+        # Files of the new build are never served before it is published
+        path = index_path(version)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        index.save(path)
+        self.stdout.write("Wrote {} movies to {}".format(len(index), path))
+        if report is not None:
+            # The baseline of the next build
+            evaluation.write_report(report, evaluation.report_path(version))
+        if not options["no_publish"]:
+            data_build.publish(version=version)
+            self.stdout.write("Published data build {}".format(version))
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recommender.posters import poster_dir
+from recommender.thumbnails import build_thumbnails
+
+
+class Command(BaseCommand):
+    help = "Renders resized WebP and JPEG poster thumbnails with content hashed names and a manifest"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", default=settings.RECOMMENDER_POSTER_SOURCE_DIR,
+                            help="Directory of the full size posters named <movie id>.jpg")
+        parser.add_argument("--workers", type=int, help="Worker processes, one per CPU by default")
+        parser.add_argument("--force", action="store_true", help="Render unchanged posters again")
+        parser.add_argument("--prune", action="store_true",
+                            help="Delete thumbnails the new manifest does not reference. Pages cached by "
+                                 "browsers may still link to them")
+
+    def handle(self, *args, **options):
+        try:
+            rendered, skipped, failed = build_thumbnails(
+                options["source"], poster_dir(), workers=options["workers"], force=options["force"],
+                prune=options["prune"], log=self.stdout.write,
+            )
+        except FileNotFoundError as error:
+            raise CommandError("No posters found: {}".format(error))
+        self.stdout.write("Rendered {} posters, {} unchanged, {} failed, written to {}".format(
+            rendered, skipped, failed, poster_dir()))
@@ -0,0 +1,71 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recommender import data_build, evaluation
+from recommender.neighbor_index import NeighborIndex, index_path
+from recommender.parallel import default_workers
+
+
+def format_report(report):
+    """
+    The metrics of a report as a table, one line per algorithm.
+    """
+    columns = ["list_coverage", "catalog_coverage", "mean_length", "exposure_gini", "diversity",
+               "popularity_percentile", "long_tail_share"]
+    lines = ["{:<16}".format("algorithm") + "".join("{:>23}".format(column) for column in columns)]
+    for algorithm, metrics in report["algorithms"].items():
+        values = ["-" if metrics[column] is None else metrics[column] for column in columns]
+        lines.append("{:<16}".format(algorithm) + "".join("{:>23}".format(value) for value in values))
+    lines.append("overlap (jaccard of the lists)")
+    for pair, overlap in report["overlap"].items():
+        lines.append("  {:<32}{:>8}".format(pair, overlap))
+    return lines
+
+
+class Command(BaseCommand):
+    help = "Evaluates coverage, diversity, popularity bias and overlap of the recommendation algorithms"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--index", help="Neighbor index file, the published one by default")
+        parser.add_argument("--movies", default=evaluation.MOVIES_PATH, help="movies.csv with the genres")
+        parser.add_argument("--ratings", help="MovieLens ratings.csv, needed for the popularity metrics")
+        parser.add_argument("--k", type=int, default=10, help="Recommendations per list taken into account")
+        parser.add_argument("--workers", type=int, default=default_workers())
+        parser.add_argument("--output", help="Write the report as json")
+        parser.add_argument("--baseline", help="Report to compare with, the one of the published build by default")
+        parser.add_argument("--gate", action="store_true",
+                            help="Fail if a metric got worse than in the baseline by more than the tolerance")
+        parser.add_argument("--tolerance", type=float, default=settings.RECOMMENDER_EVALUATION_TOLERANCE)
+
+    def handle(self, *args, **options):
+        version = data_build.current_version()
+        if not options["index"] and version is None:
+            raise CommandError("No published data build, run build_neighbor_index first or pass --index")
+        path = options["index"] or index_path(version)
+        try:
+            index = NeighborIndex.load(path)
+        except FileNotFoundError:
+            raise CommandError("No neighbor index at {}, run build_neighbor_index first".format(path))
+
+        started = time.perf_counter()
+        report = evaluation.evaluate(index, movies_path=options["movies"], ratings_path=options["ratings"],
+                                     k=options["k"], workers=options["workers"])
+        self.stdout.write("Evaluated {} movies in {:.2f}s".format(len(index), time.perf_counter() - started))
+        for line in format_report(report):
+            self.stdout.write(line)
+        if options["output"]:
+            evaluation.write_report(report, options["output"])
+            self.stdout.write("Wrote {}".format(options["output"]))
+
+        baseline_path = options["baseline"] or (evaluation.report_path(version) if version else None)
+        baseline = evaluation.read_report(baseline_path) if baseline_path else None
+        if baseline is None:
+            self.stdout.write("No baseline report at {}".format(baseline_path))
+            return
+        found = evaluation.regressions(report, baseline, options["tolerance"])
+        for regression in found:
+            self.stdout.write("Regression {}".format(regression))
+        if found and options["gate"]:
+            raise CommandError("{} metrics got worse than in {}".format(len(found), baseline_path))
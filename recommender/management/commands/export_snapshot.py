@@ -0,0 +1,23 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from recommender import snapshot
+
+
+class Command(BaseCommand):
+    help = "Exports movie_infos, movie_recommendation and the data files of the published build as a snapshot zip"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Snapshot file to write, e.g. snapshot.zip")
+        parser.add_argument("--no-data-files", action="store_true",
+                            help="Leave out the neighbor and description index, replicas rebuild them")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        manifest = snapshot.export_snapshot(options["path"], data_files=not options["no_data_files"],
+                                            log=self.stdout.write)
+        self.stdout.write("Wrote {} ({:.1f} MB, build {}, files: {}) in {:.1f}s".format(
+            options["path"], os.path.getsize(options["path"]) / 1e6, manifest["version"],
+            ", ".join(manifest["files"]) or "none", time.perf_counter() - started))
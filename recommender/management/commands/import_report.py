@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recommender.startup import by_package, measure
+
+
+class Command(BaseCommand):
+    help = "Measures the cold start of a worker (settings, apps, first request) and what the imports cost"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="/recommender/api/1/recommendations/?k=5",
+                            help="Path of the first request")
+        parser.add_argument("--runs", type=int, default=3, help="Cold starts, the median is reported")
+        parser.add_argument("--limit", type=int, default=15, help="Modules and packages listed")
+
+    def handle(self, *args, **options):
+        try:
+            phases, imports = measure(options["url"], settings.SETTINGS_MODULE, runs=max(options["runs"], 1))
+        except RuntimeError as error:
+            raise CommandError(str(error))
+
+        self.stdout.write("Cold start with {} (median of {} runs)".format(settings.SETTINGS_MODULE, options["runs"]))
+        self.stdout.write("  django.setup()      {:8.1f} ms".format(phases["setup"] * 1000))
+        self.stdout.write("  wsgi application    {:8.1f} ms".format(phases["application"] * 1000))
+        self.stdout.write("  first request       {:8.1f} ms  ({} {})".format(
+            phases["first_request"] * 1000, options["url"], phases["status"]))
+        self.stdout.write("  total               {:8.1f} ms".format(phases["total"] * 1000))
+        self.stdout.write("{} modules imported in {:.1f} ms".format(
+            len(imports), sum(self_seconds for _, self_seconds, _, _ in imports) * 1000))
+
+        self.stdout.write("\nSlowest packages (own import time)")
+        for package, seconds in by_package(imports)[:options["limit"]]:
+            self.stdout.write("  {:8.1f} ms  {}".format(seconds * 1000, package))
+
+        self.stdout.write("\nSlowest direct imports (including everything they import)")
+        top_level = sorted((entry for entry in imports if entry[3] == 0), key=lambda entry: entry[2], reverse=True)
+        for name, _, cumulative, _ in top_level[:options["limit"]]:
+            self.stdout.write("  {:8.1f} ms  {}".format(cumulative * 1000, name))
@@ -0,0 +1,29 @@
+import time
+import zipfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recommender import snapshot
+
+
+class Command(BaseCommand):
+    help = "Replaces movie_infos and movie_recommendation with a snapshot and publishes its data build"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Snapshot written by export_snapshot")
+        parser.add_argument("--no-data-files", action="store_true",
+                            help="Only restore the tables, run build_neighbor_index afterwards")
+        parser.add_argument("--no-publish", action="store_true", help="Do not bump the build version")
+        parser.add_argument("--chunk-size", type=int, default=10000, help="Rows per COPY on postgres")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            version = snapshot.import_snapshot(options["path"], data_files=not options["no_data_files"],
+                                               publish=not options["no_publish"], chunk_size=options["chunk_size"],
+                                               log=self.stdout.write)
+        except (ValueError, zipfile.BadZipFile, FileNotFoundError) as error:
+            raise CommandError(str(error))
+        if version is not None:
+            self.stdout.write("Published data build {}".format(version))
+        self.stdout.write("Imported {} in {:.1f}s".format(options["path"], time.perf_counter() - started))
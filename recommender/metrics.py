@@ -0,0 +1,217 @@
+"""
+Per request instrumentation: total latency, number and time of the database queries and the
+phases a view reports with `timer` (e.g. resolving the recommendations, rendering).
+
+MetricsMiddleware adds a Server-Timing header to every response (shown in the network tab of
+the browser dev tools) and records per view histograms, exposed in the prometheus text format by
+`metrics_view` to RECOMMENDER_METRICS_NETWORKS or clients sending RECOMMENDER_METRICS_TOKEN.
+Metrics are kept per worker process. Disabled with RECOMMENDER_METRICS_ENABLED.
+
+Queries are counted by an execute wrapper installed on every database connection that reports to
+the timings of the current request context, so queries of async views run with sync_to_async in
+another thread are counted as well.
+"""
+import bisect
+import hmac
+import ipaddress
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_timings = ContextVar("recommender_request_timings", default=None)
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    labels = ['{}="{}"'.format(name, _label_value(value)) for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{{{}}}".format(",".join(labels)) if labels else ""
+
+
+class Histogram:
+    """
+    Prometheus style histogram with one series per combination of label values.
+    """
+
+    def __init__(self, name, documentation, buckets=SECONDS_BUCKETS, labels=("view",)):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        # label values -> [count per bucket (not cumulative) ..., +Inf], sum
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += value
+
+    def expose(self):
+        lines = ["# HELP {} {}".format(self.name, self.documentation), "# TYPE {} histogram".format(self.name)]
+        with self._lock:
+            series = sorted((values, (list(counts), total)) for values, (counts, total) in self._series.items())
+        for values, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append("{}_bucket{} {}".format(
+                    self.name, _labels(self.labels, values, 'le="{}"'.format(bound)), cumulative))
+            lines.append("{}_sum{} {}".format(self.name, _labels(self.labels, values), total))
+            lines.append("{}_count{} {}".format(self.name, _labels(self.labels, values), cumulative))
+        return lines
+
+
+request_duration = Histogram("recommender_request_duration_seconds", "Total time spent on a request",
+                             labels=("view", "status"))
+query_count = Histogram("recommender_request_queries", "Database queries per request", buckets=QUERY_BUCKETS)
+query_duration = Histogram("recommender_request_db_seconds", "Time spent in database queries per request")
+phase_duration = Histogram("recommender_request_phase_seconds", "Time spent in a phase of a view",
+                           labels=("view", "phase"))
+HISTOGRAMS = (request_duration, query_count, query_duration, phase_duration)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.phases = {}
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+
+    def server_timing(self, total_seconds):
+        entries = ['db;dur={:.2f};desc="{} queries"'.format(self.db_seconds * 1000, self.queries)]
+        entries.extend("{};dur={:.2f}".format(phase, seconds * 1000) for phase, seconds in self.phases.items())
+        entries.append("total;dur={:.2f}".format(total_seconds * 1000))
+        return ", ".join(entries)
+
+
+def _execute(execute, sql, params, many, context):
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings.execute(execute, sql, params, many, context)
+
+
+def _instrument(connection, **kwargs):
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+@contextmanager
+def timer(phase):
+    """
+    Adds the time spent in the block to `phase` of the current request, if it is instrumented.
+    """
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.phases[phase] = timings.phases.get(phase, 0.0) + time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.RECOMMENDER_METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(_instrument)
+        for connection in connections.all(initialized_only=True):
+            _instrument(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self.record(request, response, timings, started)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self.record(request, response, timings, started)
+
+    def record(self, request, response, timings, started):
+        total_seconds = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match is not None else "unmatched"
+        request_duration.observe(total_seconds, view, response.status_code)
+        query_count.observe(timings.queries, view)
+        query_duration.observe(timings.db_seconds, view)
+        for phase, seconds in timings.phases.items():
+            phase_duration.observe(seconds, view, phase)
+        response["Server-Timing"] = timings.server_timing(total_seconds)
+        return response
+
+
+def allowed(request):
+    """
+    Whether a client may read the metrics: a bearer token equal to RECOMMENDER_METRICS_TOKEN (if
+    set) or an address in RECOMMENDER_METRICS_NETWORKS.
+    """
+    token = settings.RECOMMENDER_METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    if token and hmac.compare_digest(authorization.encode("utf-8"), "Bearer {}".format(token).encode("utf-8")):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network) for network in settings.RECOMMENDER_METRICS_NETWORKS)
+
+
+def metrics_view(request):
+    """
+    The histograms of this worker process in the prometheus text format.
+    """
+    # Other clients get the same 404 as without metrics, nothing tells them the endpoint exists
+    if not settings.RECOMMENDER_METRICS_ENABLED or not allowed(request):
+        raise Http404()
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.expose())
+    return HttpResponse("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4; charset=utf-8")
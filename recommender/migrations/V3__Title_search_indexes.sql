@@ -0,0 +1,8 @@
+-- Indexes for the title autocomplete. Django compares UPPER(title) for case insensitive lookups,
+-- so the indexes are built on the same expression.
+
+-- title__icontains: UPPER(title) LIKE '%TERM%'
+CREATE INDEX IF NOT EXISTS movie_infos_title_trgm_idx ON data.movie_infos USING gin (upper(title) gin_trgm_ops);
+
+-- title__istartswith: UPPER(title) LIKE 'TERM%'
+CREATE INDEX IF NOT EXISTS movie_infos_title_prefix_idx ON data.movie_infos (upper(title) text_pattern_ops);
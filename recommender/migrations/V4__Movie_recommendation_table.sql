@@ -0,0 +1,31 @@
+-- The recommendation lists of movie_infos.recommendations as one row per entry, so they can be
+-- joined and indexed. tmdb lists are translated to movielens ids, entries without a movie are
+-- left out and ranks start at 1 without gaps.
+CREATE TABLE IF NOT EXISTS data.movie_recommendation (
+    source_id INT NOT NULL,
+    algorithm TEXT NOT NULL,
+    rank SMALLINT NOT NULL,
+    target_id INT NOT NULL,
+    score REAL,
+    PRIMARY KEY (source_id, algorithm, rank)
+);
+
+-- Reverse lookups: which movies recommend a movie
+CREATE INDEX IF NOT EXISTS movie_recommendation_target_idx ON data.movie_recommendation (target_id, algorithm);
+
+INSERT INTO data.movie_recommendation (source_id, algorithm, rank, target_id)
+SELECT source_id, algorithm, row_number() OVER (PARTITION BY source_id, algorithm ORDER BY position), target_id
+FROM (
+    SELECT movie.id AS source_id, lists.algorithm, entries.position,
+           CASE WHEN lists.algorithm = 'tmdb' THEN by_tmdb_id.id ELSE entries.target::int END AS target_id
+    FROM data.movie_infos movie
+    CROSS JOIN LATERAL jsonb_each(movie.recommendations) AS lists(algorithm, targets)
+    CROSS JOIN LATERAL jsonb_array_elements_text(
+        CASE WHEN jsonb_typeof(lists.targets) = 'array' THEN lists.targets ELSE '[]'::jsonb END
+    ) WITH ORDINALITY AS entries(target, position)
+    LEFT JOIN (
+        SELECT DISTINCT ON (tmdb_id) tmdb_id, id FROM data.movie_infos ORDER BY tmdb_id, id
+    ) by_tmdb_id ON lists.algorithm = 'tmdb' AND by_tmdb_id.tmdb_id = entries.target::int
+) entries
+WHERE target_id IN (SELECT id FROM data.movie_infos)
+ON CONFLICT DO NOTHING;
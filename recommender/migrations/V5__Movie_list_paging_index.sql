@@ -0,0 +1,3 @@
+-- Keyset pagination of the movie list API (MovieCursorPagination): ORDER BY title DESC, id DESC
+-- with a title < cursor filter, served by an index scan instead of sorting the whole table per page.
+CREATE INDEX IF NOT EXISTS movie_infos_title_id_idx ON data.movie_infos (title DESC, id DESC);
@@ -21,3 +21,20 @@ class Movie(models.Model):
 
     def __str__(self):
         return "{}".format(self.title)
+
+
+class MovieRecommendation(models.Model):
+    """
+    One entry of a ranked recommendation list, see V4__Movie_recommendation_table.sql.
+    The table's primary key is (source_id, algorithm, rank), which django can not model, so
+    `source_id` stands in for it: only read through querysets, never save or delete instances.
+    """
+    source_id = models.IntegerField(primary_key=True)
+    algorithm = models.TextField()
+    rank = models.SmallIntegerField()
+    target = models.ForeignKey(Movie, models.DO_NOTHING, db_column='target_id', related_name='recommended_by')
+    score = models.FloatField(null=True)
+
+    class Meta:
+        managed = False
+        db_table = 'movie_recommendation'
@@ -0,0 +1,111 @@
+"""
+Vectorized MPAA filtering of neighbor matrices.
+
+A recommendation is only kept if its MPAA rating is not lower than the rating of the movie it is
+recommended for. Movies without a known rating are never filtered, neither as source nor as
+recommendation. Ids without a movie are dropped.
+"""
+import numpy as np
+
+# Ordered from least to most restrictive, "M" and "GP" are the historic names of "PG"
+MPAA_RANKS = {"G": 1, "M": 2, "GP": 2, "PG": 2, "PG-13": 3, "R": 4, "NC-17": 5, "X": 5}
+UNRATED = 0
+MISSING = -1
+PADDING = -1
+
+
+def mpaa_rank(mpaa):
+    return MPAA_RANKS.get((mpaa or "").strip().upper(), UNRATED)
+
+
+def rank_table(mpaa_by_id):
+    """
+    int8 array indexed by movie id holding the MPAA rank of every movie, MISSING for unknown ids.
+    """
+    size = max(mpaa_by_id, default=-1) + 1
+    table = np.full(size, MISSING, dtype=np.int8)
+    if mpaa_by_id:
+        ids = np.fromiter(mpaa_by_id.keys(), dtype=np.int64, count=len(mpaa_by_id))
+        table[ids] = [mpaa_rank(mpaa) for mpaa in mpaa_by_id.values()]
+    return table
+
+
+def lookup_ranks(table, ids):
+    ids = np.asarray(ids)
+    inside = (ids >= 0) & (ids < len(table))
+    if len(table) == 0:
+        return np.full(ids.shape, MISSING, dtype=np.int8)
+    return np.where(inside, table[np.clip(ids, 0, len(table) - 1)], MISSING).astype(np.int8)
+
+
+def align(ids, neighbors, to_ids):
+    """
+    Reorders the rows of a neighbor matrix (rows belonging to the sorted `ids`) to `to_ids`.
+    Returns the aligned matrix and a mask of the rows that exist in the source.
+    """
+    ids = np.asarray(ids)
+    to_ids = np.asarray(to_ids)
+    positions = np.searchsorted(ids, to_ids)
+    positions = np.clip(positions, 0, max(len(ids) - 1, 0))
+    present = (ids[positions] == to_ids) if len(ids) else np.zeros(len(to_ids), dtype=bool)
+    aligned = np.full((len(to_ids), neighbors.shape[1]), PADDING, dtype=np.int32)
+    aligned[present] = neighbors[positions[present]]
+    return aligned, present
+
+
+def allowed(source_ranks, candidate_ranks):
+    """
+    The MPAA rule for (broadcastable) arrays of source and recommendation ranks.
+    """
+    return (candidate_ranks != MISSING) & (
+        (candidate_ranks >= source_ranks) | (candidate_ranks == UNRATED) | (source_ranks <= UNRATED))
+
+
+def filter_neighbors(source_ids, candidates, table, k):
+    """
+    Applies the MPAA rule to a whole candidate matrix at once.
+
+    `candidates` holds one row of ranked candidate ids per entry of `source_ids` (padded with -1),
+    typically the neighbors of one algorithm followed by backfill candidates. Rejected, repeated
+    and self references are removed, the remaining candidates keep their order and the first `k`
+    of every row are returned, padded with -1.
+    """
+    source_ids = np.asarray(source_ids)
+    candidates = np.asarray(candidates, dtype=np.int32)
+    rows, width = candidates.shape
+
+    source_ranks = lookup_ranks(table, source_ids)[:, None]
+    candidate_ranks = lookup_ranks(table, candidates)
+    keep = allowed(source_ranks, candidate_ranks) & (candidates != source_ids[:, None])
+
+    # A stable sort puts the first (best ranked) occurrence of an id in front of its repetitions
+    order = np.argsort(candidates, axis=1, kind="stable")
+    sorted_candidates = np.take_along_axis(candidates, order, axis=1)
+    repeated_sorted = np.zeros((rows, width), dtype=bool)
+    repeated_sorted[:, 1:] = sorted_candidates[:, 1:] == sorted_candidates[:, :-1]
+    repeated = np.empty_like(repeated_sorted)
+    np.put_along_axis(repeated, order, repeated_sorted, axis=1)
+    keep &= ~repeated
+
+    # Move the kept candidates to the front without changing their order
+    compacted = np.take_along_axis(candidates, np.argsort(~keep, axis=1, kind="stable"), axis=1)
+    compacted[np.arange(width)[None, :] >= keep.sum(axis=1)[:, None]] = PADDING
+    if width < k:
+        compacted = np.pad(compacted, ((0, 0), (0, k - width)), constant_values=PADDING)
+    return compacted[:, :k]
+
+
+def filter_algorithms(sources, table, source_ids, k):
+    """
+    Filters the neighbor lists of several algorithms for `source_ids`. `sources` maps algorithm
+    names to (sorted ids, neighbors). Every list is backfilled to `k` entries, first from further
+    neighbors of the same algorithm, then from the neighbors of the other algorithms.
+    Returns algorithm -> (filtered matrix aligned to source_ids, mask of the ids the algorithm has a row for).
+    """
+    aligned = {algorithm: align(ids, neighbors, source_ids) for algorithm, (ids, neighbors) in sources.items()}
+    filtered = {}
+    for algorithm, (neighbors, present) in aligned.items():
+        backfill = [other for name, (other, _) in aligned.items() if name != algorithm]
+        candidates = np.hstack([neighbors] + backfill)
+        filtered[algorithm] = (filter_neighbors(source_ids, candidates, table, k), present)
+    return filtered
@@ -0,0 +1,253 @@
+import os
+import threading
+from collections import namedtuple
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from recommender import data_build
+from recommender.mpaa import UNRATED, mpaa_rank
+from recommender.recommendations import ALGORITHMS, TMDB_ALGORITHMS
+
+INDEX_FILE_NAME = "neighbor_index.npz"
+FORMAT_VERSION = 1
+
+# Duck types the Movie fields used by recommendations_tile.html
+Tile = namedtuple('Tile', ['id', 'tmdb_id', 'title', 'description', 'trailer_url', 'ratings'])
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def _pack_strings(values):
+    encoded = [(value or "").encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+class PackedStrings:
+    """
+    Read only list of strings stored as one utf-8 buffer plus offsets.
+    """
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return self.data[self.offsets[row]:self.offsets[row + 1]].tobytes().decode("utf-8")
+
+
+class NeighborIndex:
+    """
+    Precomputed recommendations of all algorithms held in memory.
+
+    Every movie gets a row, rows are sorted by movielens id. Each algorithm is an int32 matrix of
+    neighbor rows (padded with -1), the tile metadata and the MPAA ranks are stored column wise next
+    to it.
+    """
+
+    def __init__(self, ids, tmdb_ids, neighbors, titles, descriptions, trailer_urls, movielens_ratings,
+                 tmdb_ratings, mpaa_ranks=None, version=None):
+        self.ids = ids
+        self.tmdb_ids = tmdb_ids
+        self.neighbors = neighbors
+        self.titles = titles
+        self.descriptions = descriptions
+        self.trailer_urls = trailer_urls
+        self.movielens_ratings = movielens_ratings
+        self.tmdb_ratings = tmdb_ratings
+        # Indexes written before the column existed treat every movie as unrated
+        self.mpaa_ranks = mpaa_ranks if mpaa_ranks is not None else np.full(len(ids), UNRATED, dtype=np.int8)
+        self.version = version
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, movie_id):
+        return self.row_of(movie_id) is not None
+
+    @property
+    def algorithms(self):
+        return tuple(self.neighbors.keys())
+
+    def row_of(self, movie_id):
+        row = int(np.searchsorted(self.ids, movie_id))
+        if row < len(self.ids) and self.ids[row] == movie_id:
+            return row
+        return None
+
+    def neighbor_rows(self, movie_id, algorithm, k=None):
+        row = self.row_of(movie_id)
+        if row is None or algorithm not in self.neighbors:
+            return np.empty(0, dtype=np.int32)
+        rows = self.neighbors[algorithm][row]
+        rows = rows[rows >= 0]
+        return rows if k is None else rows[:k]
+
+    def neighbor_ids(self, movie_id, algorithm, k=None):
+        return self.ids[self.neighbor_rows(movie_id, algorithm, k)].tolist()
+
+    def tile(self, row):
+        return Tile(
+            id=int(self.ids[row]),
+            tmdb_id=int(self.tmdb_ids[row]),
+            title=self.titles[row],
+            description=self.descriptions[row],
+            trailer_url=self.trailer_urls[row],
+            ratings={
+                "movielens": round(float(self.movielens_ratings[row]), 2),
+                "tmdb": round(float(self.tmdb_ratings[row]), 2),
+            },
+        )
+
+    def tiles(self, movie_id, algorithm, k=None):
+        return [self.tile(row) for row in self.neighbor_rows(movie_id, algorithm, k)]
+
+    def recommendations(self, movie_id, k=None, algorithms=None):
+        return {algorithm: self.tiles(movie_id, algorithm, k) for algorithm in (algorithms or self.algorithms)}
+
+    @classmethod
+    def from_movies(cls, movies, version=None):
+        """
+        Builds the index from an iterable of Movie objects (e.g. the whole movie_infos table).
+        """
+        records = []
+        for movie in movies:
+            ratings = movie.ratings or {}
+            records.append((
+                int(movie.id),
+                int(movie.tmdb_id) if movie.tmdb_id is not None else -1,
+                movie.title,
+                movie.description,
+                movie.trailer_url,
+                float(ratings.get("movielens") or 0),
+                float(ratings.get("tmdb") or 0),
+                movie.recommendations or {},
+                mpaa_rank(movie.mpaa),
+            ))
+        records.sort(key=lambda record: record[0])
+
+        ids = np.array([record[0] for record in records], dtype=np.int32)
+        tmdb_ids = np.array([record[1] for record in records], dtype=np.int32)
+        row_by_id = {movie_id: row for row, movie_id in enumerate(ids.tolist())}
+        row_by_tmdb_id = {}
+        for row, tmdb_id in enumerate(tmdb_ids.tolist()):
+            row_by_tmdb_id.setdefault(tmdb_id, row)
+
+        neighbors = {}
+        for algorithm in ALGORITHMS:
+            lookup = row_by_tmdb_id if algorithm in TMDB_ALGORITHMS else row_by_id
+            rows = [
+                [lookup[int(recommended)] for recommended in (record[7].get(algorithm) or [])
+                 if int(recommended) in lookup]
+                for record in records
+            ]
+            width = max((len(row) for row in rows), default=0)
+            matrix = np.full((len(rows), width), -1, dtype=np.int32)
+            for row, neighbor_rows in enumerate(rows):
+                matrix[row, :len(neighbor_rows)] = neighbor_rows
+            neighbors[algorithm] = matrix
+
+        return cls(
+            ids=ids,
+            tmdb_ids=tmdb_ids,
+            neighbors=neighbors,
+            titles=PackedStrings(*_pack_strings(record[2] for record in records)),
+            descriptions=PackedStrings(*_pack_strings(record[3] for record in records)),
+            trailer_urls=PackedStrings(*_pack_strings(record[4] for record in records)),
+            movielens_ratings=np.array([record[5] for record in records], dtype=np.float32),
+            tmdb_ratings=np.array([record[6] for record in records], dtype=np.float32),
+            mpaa_ranks=np.array([record[8] for record in records], dtype=np.int8),
+            version=version,
+        )
+
+    def save(self, path):
+        """
+        Writes the index next to `path` and moves it into place, so readers never see a partial file.
+        """
+        arrays = {
+            "format_version": np.array(FORMAT_VERSION),
+            "version": np.array(self.version or ""),
+            "algorithms": np.array(self.algorithms),
+            "ids": self.ids,
+            "tmdb_ids": self.tmdb_ids,
+            "movielens_ratings": self.movielens_ratings,
+            "tmdb_ratings": self.tmdb_ratings,
+            "mpaa_ranks": self.mpaa_ranks,
+        }
+        for name in ("titles", "descriptions", "trailer_urls"):
+            strings = getattr(self, name)
+            arrays[name + "_data"] = strings.data
+            arrays[name + "_offsets"] = strings.offsets
+        for algorithm, matrix in self.neighbors.items():
+            arrays["neighbors_" + algorithm] = matrix
+
+        temporary_path = "{}.tmp.npz".format(path)
+        np.savez(temporary_path, **arrays)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            if int(arrays["format_version"]) != FORMAT_VERSION:
+                raise ValueError("Unsupported neighbor index format in {}".format(path))
+            return cls(
+                ids=arrays["ids"],
+                tmdb_ids=arrays["tmdb_ids"],
+                neighbors={
+                    str(algorithm): arrays["neighbors_" + str(algorithm)] for algorithm in arrays["algorithms"]
+                },
+                titles=PackedStrings(arrays["titles_data"], arrays["titles_offsets"]),
+                descriptions=PackedStrings(arrays["descriptions_data"], arrays["descriptions_offsets"]),
+                trailer_urls=PackedStrings(arrays["trailer_urls_data"], arrays["trailer_urls_offsets"]),
+                movielens_ratings=arrays["movielens_ratings"],
+                tmdb_ratings=arrays["tmdb_ratings"],
+                mpaa_ranks=arrays["mpaa_ranks"] if "mpaa_ranks" in arrays.files else None,
+                version=str(arrays["version"]) or None,
+            )
+
+
+def index_path(version):
+    """
+    Path of the index file of the data build `version`.
+    """
+    return data_build.build_file(INDEX_FILE_NAME, version)
+
+
+def get_index():
+    """
+    Returns the neighbor index of the currently published data build, or None if there is none.
+    A newly published build is loaded on the next call and swapped in atomically, requests that
+    still hold the old index keep using it.
+    """
+    global _index, _index_version
+    if not settings.RECOMMENDER_INDEX_ENABLED:
+        return None
+    version = data_build.current_version()
+    if version != _index_version:
+        with _lock:
+            if version != _index_version:
+                path = index_path(version) if version is not None else None
+                _index = NeighborIndex.load(path) if path is not None and path.exists() else None
+                _index_version = version
+    return _index
+
+
+async def aget_index():
+    """
+    get_index for async views. Loading a newly published index (and reading the build stamp)
+    happens in a thread, requests on the event loop only pick up the reference to the index.
+    """
+    if not settings.RECOMMENDER_INDEX_ENABLED:
+        return None
+    version = await data_build.acurrent_version()
+    if version == _index_version:
+        return _index
+    return await sync_to_async(get_index, thread_sensitive=False)()
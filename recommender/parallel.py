@@ -0,0 +1,70 @@
+"""
+Helpers for the offline pipelines: a bounded process pool map and a throughput counter.
+"""
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def imap_bounded(function, items, workers=None, max_pending=None, initializer=None, initargs=()):
+    """
+    Yields function(item) for every item, computed in a pool of worker processes.
+
+    Items are only pulled from `items` while fewer than `max_pending` (default: 2 per worker) are
+    in flight, so a slow consumer keeps memory flat instead of queueing up results.
+    Results are yielded in completion order.
+    """
+    workers = workers or default_workers()
+    max_pending = max_pending or 2 * workers
+    iterator = iter(items)
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        pending = set()
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_pending:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(executor.submit(function, item))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+class Progress:
+    """
+    Counts processed items and prints the throughput at most every `every` seconds.
+    """
+
+    def __init__(self, label, unit="items", every=5.0, output=print):
+        self.label = label
+        self.unit = unit
+        self.every = every
+        self.output = output
+        self.count = 0
+        self.started = time.perf_counter()
+        self._reported = self.started
+
+    @property
+    def rate(self):
+        seconds = time.perf_counter() - self.started
+        return self.count / seconds if seconds > 0 else 0.0
+
+    def add(self, count=1):
+        self.count += count
+        now = time.perf_counter()
+        if now - self._reported >= self.every:
+            self._reported = now
+            self.report()
+
+    def report(self):
+        if self.output is not None:
+            self.output("{} {} {} ({:.0f} {}/s)".format(self.label, self.count, self.unit, self.rate, self.unit))
@@ -0,0 +1,191 @@
+"""
+Poster thumbnails built by `python manage.py build_posters`.
+
+Every poster is resized to the sizes the pages show (SIZES) and stored as WebP and JPEG under a
+name containing a hash of its content, e.g. `1-tile.3f2a9c0d1b4e.webp`. The manifest maps movie ids
+to these names. A changed poster gets a new name, so the files never change and PosterMiddleware
+serves them with far-future cache headers. Movies without a thumbnail fall back to the full size
+static poster.
+
+The manifest is written last and moved into place, its stamp (manifest_version) tells workers to
+reload it and to render pages again. Posters are not part of the data build, new thumbnails do not
+invalidate the indexes or the API ETags.
+"""
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.templatetags.static import static
+from whitenoise.base import WhiteNoise
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.string_utils import ensure_leading_trailing_slash
+
+MANIFEST_FILE_NAME = "manifest.json"
+FORMAT_VERSION = 1
+TILE = "tile"
+DETAIL = "detail"
+# Bounding boxes in pixels: recommendation tiles are at most 300px wide, the detail poster 390px high
+SIZES = {
+    TILE: (300, 450),
+    DETAIL: (260, 390),
+}
+HASHED_NAME = re.compile(r"^\d+-\w+\.[0-9a-f]{12}\.\w+$")
+
+_lock = threading.Lock()
+_manifest = None
+_manifest_version = None
+_stamp = None
+_checked_at = 0.0
+
+
+def poster_dir():
+    return Path(settings.RECOMMENDER_POSTER_DIR)
+
+
+def manifest_path(directory=None):
+    return Path(directory or poster_dir()) / MANIFEST_FILE_NAME
+
+
+def hashed_name(movie_id, size, extension, digest):
+    return "{}-{}.{}.{}".format(movie_id, size, digest[:12], extension)
+
+
+def is_hashed(path, url):
+    return HASHED_NAME.match(os.path.basename(url)) is not None
+
+
+def read_manifest(path):
+    """
+    Thumbnails per movie id, an empty manifest if there is none.
+    """
+    try:
+        with open(path) as file:
+            manifest = json.load(file)
+    except FileNotFoundError:
+        return {"format_version": FORMAT_VERSION, "posters": {}}
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError("Unsupported poster manifest format in {}".format(path))
+    return manifest
+
+
+def write_manifest(manifest, path):
+    temporary_path = "{}.tmp".format(path)
+    with open(temporary_path, "w") as file:
+        json.dump(manifest, file, sort_keys=True)
+    os.replace(temporary_path, path)
+
+
+def manifest_version():
+    """
+    Stamp of the manifest file, None if there is none. Checked at most every
+    RECOMMENDER_BUILD_CHECK_INTERVAL seconds, like the data build.
+    """
+    global _stamp, _checked_at
+    now = time.monotonic()
+    if now - _checked_at >= settings.RECOMMENDER_BUILD_CHECK_INTERVAL:
+        try:
+            stat = os.stat(manifest_path())
+            _stamp = "{}-{}-{}".format(stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except FileNotFoundError:
+            _stamp = None
+        _checked_at = now
+    return _stamp
+
+
+async def amanifest_version():
+    """
+    manifest_version for async requests, the file is only checked in a thread.
+    """
+    if time.monotonic() - _checked_at < settings.RECOMMENDER_BUILD_CHECK_INTERVAL:
+        return _stamp
+    return await sync_to_async(manifest_version, thread_sensitive=False)()
+
+
+def get_manifest():
+    """
+    Thumbnails of the posters, reloaded when build_posters wrote a new manifest.
+    """
+    global _manifest, _manifest_version
+    version = manifest_version()
+    if _manifest is None or version != _manifest_version:
+        with _lock:
+            if _manifest is None or version != _manifest_version:
+                _manifest = read_manifest(manifest_path())["posters"]
+                _manifest_version = version
+    return _manifest
+
+
+def poster(movie_id, size=TILE):
+    """
+    URLs (`webp` may be None) and dimensions of the poster of a movie in one of the SIZES.
+    """
+    entry = get_manifest().get(str(movie_id), {}).get(size)
+    if entry is None:
+        return {"src": static("posters/{}.jpg".format(movie_id)), "webp": None, "width": None, "height": None}
+    return {
+        "src": settings.RECOMMENDER_POSTER_URL + entry["jpg"],
+        "webp": settings.RECOMMENDER_POSTER_URL + entry["webp"],
+        "width": entry["width"],
+        "height": entry["height"],
+    }
+
+
+class PosterMiddleware:
+    """
+    Serves the thumbnails at RECOMMENDER_POSTER_URL, marked as immutable so browsers and proxies
+    never revalidate them. The files are scanned again whenever the manifest changed, by async
+    requests in a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.prefix = ensure_leading_trailing_slash(settings.RECOMMENDER_POSTER_URL)
+        self._files = {}
+        self._version = None
+        self._scanned = False
+        self._lock = threading.Lock()
+
+    def files(self):
+        version = manifest_version()
+        if not self._scanned or version != self._version:
+            with self._lock:
+                if not self._scanned or version != self._version:
+                    server = WhiteNoise(None, immutable_file_test=is_hashed)
+                    directory = poster_dir()
+                    if directory.is_dir():
+                        server.add_files(str(directory), prefix=self.prefix)
+                    # Only the thumbnails, not the manifest or temporary files. Swapped at once,
+                    # requests never see a half scanned directory
+                    self._files = {url: file for url, file in server.files.items() if is_hashed(None, url)}
+                    self._version = version
+                    self._scanned = True
+        return self._files
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path_info.startswith(self.prefix):
+            static_file = self.files().get(request.path_info)
+            if static_file is not None:
+                return WhiteNoiseMiddleware.serve(static_file, request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.path_info.startswith(self.prefix):
+            if self._scanned and await amanifest_version() == self._version:
+                files = self._files
+            else:
+                files = await sync_to_async(self.files, thread_sensitive=False)()
+            static_file = files.get(request.path_info)
+            if static_file is not None:
+                return WhiteNoiseMiddleware.serve(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,115 @@
+from django.db.models import Q
+
+from recommender.models import Movie, MovieRecommendation
+
+ALGORITHMS = ('tmdb', 'cosine', 'cosine_reduced', 'jaccard', 'jaccard_tag')
+# The tmdb lists reference tmdb ids, all other algorithms reference movielens ids
+TMDB_ALGORITHMS = ('tmdb',)
+# Columns used by recommendations_tile.html, everything else stays in the database
+TILE_FIELDS = ('id', 'tmdb_id', 'title', 'description', 'trailer_url', 'ratings')
+
+
+def recommendation_ids(movie, limit=5, algorithms=ALGORITHMS):
+    """
+    Returns the first `limit` recommended ids of every algorithm stored on the movie.
+    """
+    recommendations = movie.recommendations or {}
+    return {
+        algorithm: [int(recommended) for recommended in (recommendations.get(algorithm) or [])[:limit]]
+        for algorithm in algorithms
+    }
+
+
+def _algorithm(key):
+    return key[-1] if isinstance(key, tuple) else key
+
+
+def tile_queryset(ranked_ids):
+    """
+    Query for all movies referenced by `ranked_ids` (see resolve_recommendations), None if there are none.
+    """
+    movielens_ids = set()
+    tmdb_ids = set()
+    for key, ids in ranked_ids.items():
+        if _algorithm(key) in TMDB_ALGORITHMS:
+            tmdb_ids.update(ids)
+        else:
+            movielens_ids.update(ids)
+    if not movielens_ids and not tmdb_ids:
+        return None
+    return Movie.objects.filter(Q(id__in=movielens_ids) | Q(tmdb_id__in=tmdb_ids)).only(*TILE_FIELDS)
+
+
+def rank_movies(ranked_ids, movies):
+    by_id = {}
+    by_tmdb_id = {}
+    for movie in movies:
+        by_id[movie.id] = movie
+        by_tmdb_id.setdefault(movie.tmdb_id, movie)
+
+    resolved = {}
+    for key, ids in ranked_ids.items():
+        lookup = by_tmdb_id if _algorithm(key) in TMDB_ALGORITHMS else by_id
+        resolved[key] = [lookup[recommended] for recommended in ids if recommended in lookup]
+    return resolved
+
+
+def resolve_recommendations(ranked_ids):
+    """
+    Resolves the ranked id lists of several algorithms with a single query.
+
+    `ranked_ids` maps an algorithm name (or a (movie id, algorithm name) pair when resolving
+    several movies at once) to a list of ids. The result maps the same keys to lists of movies in
+    the original ranking order, ids without a movie in the database are skipped.
+    Only the tile columns are loaded.
+    """
+    queryset = tile_queryset(ranked_ids)
+    return rank_movies(ranked_ids, queryset if queryset is not None else [])
+
+
+async def aresolve_recommendations(ranked_ids):
+    """
+    resolve_recommendations for async views.
+    """
+    queryset = tile_queryset(ranked_ids)
+    return rank_movies(ranked_ids, [movie async for movie in queryset] if queryset is not None else [])
+
+
+def entry_queryset(source_ids, limit=5, algorithms=ALGORITHMS):
+    """
+    The first `limit` entries of every list of the given movies from movie_recommendation, joined
+    with the tile columns of the recommended movies: one query on the primary key index.
+    """
+    return MovieRecommendation.objects.filter(
+        source_id__in=source_ids, algorithm__in=algorithms, rank__lte=limit,
+    ).select_related('target').only(
+        'source_id', 'algorithm', 'rank', *['target__{}'.format(field) for field in TILE_FIELDS]
+    ).order_by('source_id', 'algorithm', 'rank')
+
+
+def group_entries(entries, algorithms):
+    """
+    Maps (source id, algorithm) to the ranked recommended movies, every algorithm is present for
+    every source that has at least one entry.
+    """
+    grouped = {}
+    for entry in entries:
+        if (entry.source_id, algorithms[0]) not in grouped:
+            grouped.update({(entry.source_id, algorithm): [] for algorithm in algorithms})
+        grouped[(entry.source_id, entry.algorithm)].append(entry.target)
+    return grouped
+
+
+def table_recommendations(movie_id, limit=5, algorithms=ALGORITHMS):
+    """
+    Like resolve_recommendations(recommendation_ids(movie)), read from movie_recommendation.
+    """
+    grouped = group_entries(entry_queryset([movie_id], limit, algorithms), algorithms)
+    return {algorithm: grouped.get((movie_id, algorithm), []) for algorithm in algorithms}
+
+
+async def atable_recommendations(source_ids, limit=5, algorithms=ALGORITHMS):
+    """
+    Recommendations of several movies from movie_recommendation, keyed by (movie id, algorithm).
+    """
+    return group_entries([entry async for entry in entry_queryset(source_ids, limit, algorithms)], algorithms)
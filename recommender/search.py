@@ -0,0 +1,135 @@
+"""
+Title search for the autocomplete endpoints.
+
+On postgres the `title` lookups are served by the trigram and prefix indexes of
+V3__Title_search_indexes.sql. Other databases (e.g. sqlite during development) use an in-memory
+trigram index that is rebuilt when a new data build is published. Like django-select2's own search,
+a title has to contain every word of the term, in any order ("godfather part" finds "Godfather:
+Part II, The"). Both rank titles starting with the first word first, then by popularity (movielens
+rating), and return at most RECOMMENDER_SEARCH_LIMIT movies.
+"""
+import bisect
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, FloatField, IntegerField, Q, Value, When
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast, Coalesce
+
+from recommender import data_build
+from recommender.models import Movie
+
+_lock = threading.Lock()
+_title_index = None
+_title_index_version = None
+
+
+def trigrams(text):
+    return {text[position:position + 3] for position in range(len(text) - 2)}
+
+
+class TitleIndex:
+    """
+    In-memory substring index over all titles: a trigram -> rows posting list plus a sorted list
+    of lower cased titles for terms shorter than a trigram.
+    """
+
+    def __init__(self, movies):
+        movies = list(movies)
+        self.ids = [movie_id for movie_id, _, _ in movies]
+        self.titles = [title.lower() for _, title, _ in movies]
+        self.popularity = [popularity for _, _, popularity in movies]
+        self.sorted_titles = sorted((title, row) for row, title in enumerate(self.titles))
+        postings = defaultdict(set)
+        for row, title in enumerate(self.titles):
+            for trigram in trigrams(title):
+                postings[trigram].add(row)
+        self.postings = {trigram: frozenset(rows) for trigram, rows in postings.items()}
+
+    @classmethod
+    def from_database(cls):
+        movies = Movie.objects.values_list("id", "title", "ratings").iterator(chunk_size=5000)
+        return cls((movie_id, title or "", float((ratings or {}).get("movielens") or 0))
+                   for movie_id, title, ratings in movies)
+
+    def _prefix_rows(self, term):
+        start = bisect.bisect_left(self.sorted_titles, (term,))
+        rows = []
+        for title, row in self.sorted_titles[start:]:
+            if not title.startswith(term):
+                break
+            rows.append(row)
+        return rows
+
+    def search(self, term, limit):
+        words = term.lower().split()
+        if not words:
+            return []
+        long_words = [word for word in words if len(word) >= 3]
+        if long_words:
+            posting_lists = sorted(
+                (self.postings.get(trigram, frozenset()) for word in long_words for trigram in trigrams(word)),
+                key=len,
+            )
+            candidates = set(posting_lists[0]).intersection(*posting_lists[1:])
+        else:
+            # Without a word as long as a trigram the first one has to start the title
+            candidates = self._prefix_rows(words[0])
+        candidates = [row for row in candidates if all(word in self.titles[row] for word in words)]
+        ranked = sorted(
+            candidates,
+            key=lambda row: (not self.titles[row].startswith(words[0]), -self.popularity[row], self.titles[row]),
+        )
+        return [self.ids[row] for row in ranked[:limit]]
+
+
+def get_title_index():
+    global _title_index, _title_index_version
+    version = data_build.current_version()
+    if _title_index is None or version != _title_index_version:
+        with _lock:
+            if _title_index is None or version != _title_index_version:
+                _title_index = TitleIndex.from_database()
+                _title_index_version = version
+    return _title_index
+
+
+def popularity():
+    return Coalesce(Cast(KeyTextTransform("movielens", "ratings"), FloatField()), Value(0.0))
+
+
+def search_movies(term, limit=None, queryset=None):
+    """
+    Movies whose title contains every word of `term`, titles starting with the first word first,
+    then by popularity.
+    """
+    limit = limit or settings.RECOMMENDER_SEARCH_LIMIT
+    # Autocomplete only shows titles, the description and json columns stay in the database
+    queryset = (queryset if queryset is not None else Movie.objects.all()).only("id", "title")
+    words = (term or "").split()
+    if not words:
+        return queryset.none()
+
+    if connection.vendor == "postgresql":
+        matches = Q()
+        contained = words
+        if all(len(word) < 3 for word in words):
+            # Words shorter than a trigram can only use the prefix index
+            matches &= Q(title__istartswith=words[0])
+            contained = words[1:]
+        for word in contained:
+            matches &= Q(title__icontains=word)
+        return queryset.filter(matches).annotate(
+            prefix_match=Case(When(title__istartswith=words[0], then=Value(1)), default=Value(0),
+                              output_field=IntegerField()),
+            popularity=popularity(),
+        ).order_by("-prefix_match", "-popularity", "title")[:limit]
+
+    ids = get_title_index().search(" ".join(words), limit)
+    if not ids:
+        return queryset.none()
+    ranking = Case(*[When(id=movie_id, then=Value(position)) for position, movie_id in enumerate(ids)],
+                   output_field=IntegerField())
+    return queryset.filter(id__in=ids).order_by(ranking)
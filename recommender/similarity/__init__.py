@@ -0,0 +1,7 @@
+"""
+Offline computation of the content and rating based similarities.
+
+`features` builds sparse movie feature matrices from the MovieLens files, `neighbors` computes the
+top k neighbors of every movie in blocks and `build` ties both together into `.sim` stores that
+fill_database.py can load directly.
+"""
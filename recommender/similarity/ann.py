@@ -0,0 +1,255 @@
+"""
+Approximate nearest neighbor search over the plot descriptions.
+
+Descriptions are embedded as tf-idf vectors, reduced with a truncated SVD (latent semantic
+analysis) and L2 normalized, so the dot product of two embeddings is their cosine similarity.
+An IVF coarse quantizer (spherical k-means) splits the catalog into `lists` clusters, a query
+only scores the movies of the `nprobe` clusters closest to it. More probes find more of the
+exact neighbors (recall) at the cost of latency, nprobe == lists is an exact search.
+
+Built by `python manage.py build_description_index`, loaded per data build like the neighbor index.
+Searching only needs numpy, scipy is imported by the build alone.
+"""
+import math
+import os
+import threading
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+
+from recommender import data_build
+from recommender.similarity.text import tokenize
+
+INDEX_FILE_NAME = "description_index.npz"
+FORMAT_VERSION = 1
+DEFAULT_DIMENSIONS = 128
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return (vectors / norms).astype(np.float32)
+
+
+def spherical_kmeans(vectors, clusters, iterations=20, seed=0, block_size=8192):
+    """
+    k-means on unit vectors with the cosine similarity. Returns the centroids and the cluster of every vector.
+    """
+    from scipy import sparse
+
+    rng = np.random.default_rng(seed)
+    rows = len(vectors)
+    centroids = vectors[rng.choice(rows, clusters, replace=False)].copy()
+    assignments = np.zeros(rows, dtype=np.int32)
+    for _ in range(iterations):
+        for start in range(0, rows, block_size):
+            assignments[start:start + block_size] = np.argmax(vectors[start:start + block_size] @ centroids.T, axis=1)
+        members = sparse.csr_matrix((np.ones(rows, dtype=np.float32), (assignments, np.arange(rows))),
+                                    shape=(clusters, rows))
+        sums = np.asarray(members @ vectors)
+        # Clusters that lost all members restart at a random movie
+        empty = np.asarray(members.sum(axis=1)).ravel() == 0
+        sums[empty] = vectors[rng.choice(rows, int(empty.sum()), replace=False)]
+        centroids = normalize(sums)
+    return centroids, assignments
+
+
+class DescriptionIndex:
+    """
+    IVF index over the description embeddings of all movies with a description.
+    Row i of `vectors` belongs to `ids[i]`, the rows of cluster c are
+    `list_rows[list_offsets[c]:list_offsets[c + 1]]`.
+    """
+
+    def __init__(self, ids, vectors, centroids, list_offsets, list_rows, terms, idf, components, version=None):
+        self.ids = ids
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.terms = terms
+        self.idf = idf
+        self.components = components
+        self.version = version
+        self.vocabulary = {str(term): column for column, term in enumerate(terms)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, ids, texts, dimensions=DEFAULT_DIMENSIONS, lists=None, iterations=20, min_df=2, max_df=0.5,
+              seed=0, version=None):
+        """
+        Embeds the descriptions and clusters them. Movies without any known term are left out.
+        `lists` defaults to 4 * sqrt(movies).
+        """
+        from scipy.sparse.linalg import svds
+
+        from recommender.similarity import features
+
+        ids = np.asarray(ids, dtype=np.int32)
+        order = np.argsort(ids, kind="stable")
+        ids = ids[order]
+        matrix, vocabulary, idf = features.tfidf_matrix([texts[row] for row in order], min_df=min_df, max_df=max_df)
+        matrix = matrix.tocsr()
+        has_terms = np.diff(matrix.indptr) > 0
+        matrix = matrix[has_terms]
+        ids = ids[has_terms]
+
+        dimensions = min(dimensions, min(matrix.shape) - 1)
+        # A fixed start vector makes the decomposition reproducible
+        start = np.random.default_rng(seed).random(min(matrix.shape))
+        _, _, components = svds(matrix, k=dimensions, v0=start)
+        components = components.astype(np.float32)
+        vectors = normalize(np.asarray(matrix @ components.T))
+
+        lists = min(lists or int(round(4 * math.sqrt(len(ids)))), len(ids))
+        centroids, assignments = spherical_kmeans(vectors, lists, iterations=iterations, seed=seed)
+        list_rows = np.argsort(assignments, kind="stable").astype(np.int32)
+        list_offsets = np.zeros(lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=lists), out=list_offsets[1:])
+
+        terms = np.array(sorted(vocabulary, key=vocabulary.get))
+        return cls(ids, vectors, centroids, list_offsets, list_rows, terms, idf, components, version=version)
+
+    def embed(self, text):
+        """
+        Embedding of a free text, None if it contains no known term.
+        Same weighting as features.tfidf_matrix, only the components of the query terms are touched.
+        """
+        counts = Counter(term for term in tokenize(text) if term in self.vocabulary)
+        if not counts:
+            return None
+        columns = np.array([self.vocabulary[term] for term in counts], dtype=np.int64)
+        weights = np.array([1 + math.log(count) for count in counts.values()], dtype=np.float32) * self.idf[columns]
+        return normalize(self.components[:, columns] @ weights)
+
+    def row_of(self, movie_id):
+        row = int(np.searchsorted(self.ids, movie_id))
+        if row < len(self.ids) and self.ids[row] == movie_id:
+            return row
+        return None
+
+    def _top(self, rows, scores, k, exclude):
+        if exclude is not None:
+            keep = rows != exclude
+            rows, scores = rows[keep], scores[keep]
+        if len(rows) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[best], scores[best]
+        order = np.argsort(-scores, kind="stable")
+        return self.ids[rows[order]], scores[order]
+
+    def search(self, vector, k=10, nprobe=None, exclude=None):
+        """
+        Approximate top k movies (ids, cosine similarities) of an embedding, scanning the `nprobe`
+        closest clusters. `exclude` is a row left out of the results.
+        """
+        nprobe = min(nprobe or settings.RECOMMENDER_ANN_NPROBE, self.lists)
+        if nprobe >= self.lists:
+            return self.exact(vector, k, exclude)
+        probes = np.argpartition(-(self.centroids @ vector), nprobe - 1)[:nprobe]
+        rows = np.concatenate([self.list_rows[self.list_offsets[probe]:self.list_offsets[probe + 1]]
+                               for probe in probes])
+        return self._top(rows, self.vectors[rows] @ vector, k, exclude)
+
+    def exact(self, vector, k=10, exclude=None):
+        return self._top(np.arange(len(self.ids)), self.vectors @ vector, k, exclude)
+
+    def search_text(self, text, k=10, nprobe=None):
+        vector = self.embed(text)
+        if vector is None:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        return self.search(vector, k, nprobe)
+
+    def similar(self, movie_id, k=10, nprobe=None):
+        """
+        Movies with a plot like the one of `movie_id`, raises KeyError for movies without a description.
+        """
+        row = self.row_of(movie_id)
+        if row is None:
+            raise KeyError(movie_id)
+        return self.search(self.vectors[row], k, nprobe, exclude=row)
+
+    def recall(self, k=10, nprobe=None, sample=200, seed=0):
+        """
+        Mean share of the exact top k neighbors found with `nprobe` probes, over a sample of movies.
+        Results scoring as high as the exact k-th neighbor count as found, many descriptions tie.
+        """
+        rows = np.random.default_rng(seed).choice(len(self.ids), min(sample, len(self.ids)), replace=False)
+        found = 0
+        expected = 0
+        for row in rows:
+            _, exact_scores = self.exact(self.vectors[row], k, exclude=row)
+            _, scores = self.search(self.vectors[row], k, nprobe, exclude=row)
+            if len(exact_scores):
+                found += int(np.sum(scores >= exact_scores[-1] - 1e-6))
+                expected += len(exact_scores)
+        return found / max(expected, 1)
+
+    def save(self, path):
+        arrays = {
+            "format_version": np.array(FORMAT_VERSION),
+            "version": np.array(self.version or ""),
+            "ids": self.ids,
+            "vectors": self.vectors,
+            "centroids": self.centroids,
+            "list_offsets": self.list_offsets,
+            "list_rows": self.list_rows,
+            "terms": self.terms,
+            "idf": self.idf,
+            "components": self.components,
+        }
+        temporary_path = "{}.tmp.npz".format(path)
+        np.savez(temporary_path, **arrays)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            if int(arrays["format_version"]) != FORMAT_VERSION:
+                raise ValueError("Unsupported description index format in {}".format(path))
+            return cls(
+                ids=arrays["ids"],
+                vectors=arrays["vectors"],
+                centroids=arrays["centroids"],
+                list_offsets=arrays["list_offsets"],
+                list_rows=arrays["list_rows"],
+                terms=arrays["terms"],
+                idf=arrays["idf"],
+                components=arrays["components"],
+                version=str(arrays["version"]) or None,
+            )
+
+
+def index_path(version):
+    """
+    Path of the index file of the data build `version`.
+    """
+    return data_build.build_file(INDEX_FILE_NAME, version)
+
+
+def get_description_index():
+    """
+    Returns the description index of the currently published data build, or None if there is none.
+    """
+    global _index, _index_version
+    if not settings.RECOMMENDER_INDEX_ENABLED:
+        return None
+    version = data_build.current_version()
+    if version != _index_version:
+        with _lock:
+            if version != _index_version:
+                path = index_path(version) if version is not None else None
+                _index = DescriptionIndex.load(path) if path is not None and path.exists() else None
+                _index_version = version
+    return _index
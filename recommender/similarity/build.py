@@ -0,0 +1,110 @@
+"""
+Builds the similarity stores of all algorithm variants from the MovieLens files:
+
+    cosine          ratings (adjusted cosine) blended with genres (jaccard)
+    cosine_reduced  ratings (adjusted cosine)
+    jaccard         genres
+    jaccard_tag     user tags
+    descriptions    tf-idf cosine of the plot summaries
+
+Variants whose input file is not given are skipped. The written `<variant>.sim` files can be
+passed to fill_database.py with --similarity-dir, `features.npz` keeps the feature matrices for
+incremental updates.
+
+    python -m recommender.similarity.build --movies movies.csv --ratings ratings.csv --tags tags.csv \
+        --descriptions extracted_content_ml-latest --out-dir similarities
+"""
+import argparse
+import os
+import time
+
+from recommender.parallel import default_workers
+from recommender.similarity import features
+from recommender.similarity.neighbors import Term, to_movie_ids, top_k_neighbors
+from recommender.similarity_store import write_arrays
+
+VARIANTS = ("cosine", "cosine_reduced", "jaccard", "jaccard_tag", "descriptions")
+FEATURES_FILE_NAME = "features.npz"
+
+
+def build_features(ids, genres, ratings_path=None, tags_path=None, descriptions_path=None, log=print):
+    """
+    The feature matrices that can be built from the given files.
+    """
+    genre_matrix, genre_vocabulary = features.genre_matrix(genres)
+    matrices = {"genres": genre_matrix}
+    vocabularies = {"genres": genre_vocabulary}
+    user_means = None
+    idf = None
+    if ratings_path:
+        log("Reading ratings from {}".format(ratings_path))
+        matrices["ratings"], user_means = features.rating_matrix(ids, ratings_path)
+    if tags_path:
+        log("Reading tags from {}".format(tags_path))
+        matrices["tags"], vocabularies["tags"] = features.tag_matrix(ids, tags_path)
+    if descriptions_path:
+        log("Reading descriptions from {}".format(descriptions_path))
+        matrices["descriptions"], vocabularies["descriptions"], idf = features.description_matrix(
+            ids, features.read_descriptions(descriptions_path))
+    return features.FeatureSet(ids, matrices, vocabularies, user_means, idf)
+
+
+def variant_terms(feature_set, genre_weight=0.5):
+    """
+    Feature terms of every variant the feature set has the matrices for.
+    """
+    matrices = feature_set.matrices
+    terms = {"jaccard": [Term("jaccard", matrices["genres"], 1.0)]}
+    if "ratings" in matrices:
+        terms["cosine_reduced"] = [Term("cosine", matrices["ratings"], 1.0)]
+        terms["cosine"] = [Term("cosine", matrices["ratings"], 1.0 - genre_weight),
+                           Term("jaccard", matrices["genres"], genre_weight)]
+    if "tags" in matrices:
+        terms["jaccard_tag"] = [Term("jaccard", matrices["tags"], 1.0)]
+    if "descriptions" in matrices:
+        terms["descriptions"] = [Term("cosine", matrices["descriptions"], 1.0)]
+    return {variant: terms[variant] for variant in VARIANTS if variant in terms}
+
+
+def build(movies_path, out_dir, ratings_path=None, tags_path=None, descriptions_path=None, k=10, block_size=256,
+          workers=1, genre_weight=0.5, variants=VARIANTS, log=print):
+    """
+    Computes and writes the store of every requested variant, returns variant -> written path.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    ids, _, genres = features.read_movies(movies_path)
+    feature_set = build_features(ids, genres, ratings_path, tags_path, descriptions_path, log=log)
+    # The base of recommender.similarity.incremental
+    feature_set.save(os.path.join(out_dir, FEATURES_FILE_NAME))
+    terms = variant_terms(feature_set, genre_weight)
+    written = {}
+    for variant, similarity_terms in terms.items():
+        if variant not in variants:
+            continue
+        started = time.perf_counter()
+        neighbor_rows, scores = top_k_neighbors(similarity_terms, k=k, block_size=block_size, workers=workers)
+        # Movies without any similar movie (e.g. no ratings) get no row, like in the notebook CSVs
+        has_neighbors = (neighbor_rows >= 0).any(axis=1)
+        path = os.path.join(out_dir, "{}.sim".format(variant))
+        write_arrays(path, ids[has_neighbors], to_movie_ids(ids, neighbor_rows)[has_neighbors], scores[has_neighbors])
+        log("Built {} for {} movies in {:.1f}s".format(variant, int(has_neighbors.sum()), time.perf_counter() - started))
+        written[variant] = path
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute the top k similar movies of every algorithm variant")
+    parser.add_argument("--movies", required=True, help="MovieLens movies.csv")
+    parser.add_argument("--ratings", help="MovieLens ratings.csv")
+    parser.add_argument("--tags", help="MovieLens tags.csv")
+    parser.add_argument("--descriptions", help="Directory with the extracted movie json files")
+    parser.add_argument("--out-dir", default="similarities")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--block-size", type=int, default=256, help="Movies scored against the catalog at once")
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--genre-weight", type=float, default=0.5, help="Weight of the genres in the cosine variant")
+    parser.add_argument("--variant", action="append", choices=VARIANTS, help="Only build these variants")
+    arguments = parser.parse_args()
+    build(arguments.movies, arguments.out_dir, arguments.ratings, arguments.tags, arguments.descriptions,
+          k=arguments.k, block_size=arguments.block_size, workers=arguments.workers,
+          genre_weight=arguments.genre_weight, variants=arguments.variant or VARIANTS)
@@ -0,0 +1,300 @@
+"""
+Sparse feature matrices, one row per movie. All builders take the sorted movie id array returned
+by `read_movies` and return a CSR matrix whose rows are aligned with it.
+"""
+import csv
+import json
+import math
+import os
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+from recommender.similarity.text import tokenize
+
+NO_GENRES = "(no genres listed)"
+
+
+def read_movies(path):
+    """
+    Reads movies.csv (movieId,title,genres), returns sorted ids, titles and genre lists.
+    """
+    movies = []
+    with open(path, newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            genres = [genre for genre in row["genres"].split("|") if genre and genre != NO_GENRES]
+            movies.append((int(row["movieId"]), row["title"], genres))
+    movies.sort()
+    ids = np.array([movie[0] for movie in movies], dtype=np.int32)
+    return ids, [movie[1] for movie in movies], [movie[2] for movie in movies]
+
+
+def rows_of(ids, movie_ids):
+    """
+    Row of every movie id in `ids`, -1 for ids that are not part of it.
+    """
+    movie_ids = np.asarray(movie_ids)
+    positions = np.clip(np.searchsorted(ids, movie_ids), 0, max(len(ids) - 1, 0))
+    return np.where(ids[positions] == movie_ids, positions, -1)
+
+
+def binary_matrix(labels_per_row, vocabulary=None):
+    """
+    CSR matrix with a 1 for every label of a row. Returns the matrix and the label vocabulary.
+    """
+    if vocabulary is None:
+        vocabulary = {label: column for column, label in
+                      enumerate(sorted({label for labels in labels_per_row for label in labels}))}
+    indptr = [0]
+    indices = []
+    for labels in labels_per_row:
+        columns = sorted({vocabulary[label] for label in labels if label in vocabulary})
+        indices.extend(columns)
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float32)
+    matrix = sparse.csr_matrix((data, np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+                               shape=(len(labels_per_row), len(vocabulary)))
+    return matrix, vocabulary
+
+
+def genre_matrix(genres):
+    return binary_matrix(genres)
+
+
+def tag_matrix(ids, tags_path, min_count=1, vocabulary=None):
+    """
+    Binary movie x tag matrix from MovieLens' tags.csv (userId,movieId,tag,timestamp).
+    A tag counts for a movie once it was given `min_count` times.
+    """
+    return binary_matrix(tag_labels(ids, tags_path, min_count), vocabulary)
+
+
+def tag_labels(ids, tags_path, min_count=1):
+    """
+    The tags of every movie of `ids`, see tag_matrix.
+    """
+    counts = Counter()
+    with open(tags_path, newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            tag = row["tag"].strip().lower()
+            if tag:
+                counts[(int(row["movieId"]), tag)] += 1
+    tags = [[] for _ in range(len(ids))]
+    movie_ids = np.array([movie_id for movie_id, _ in counts], dtype=np.int64)
+    rows = rows_of(ids, movie_ids) if len(movie_ids) else movie_ids
+    for row, ((_, tag), count) in zip(rows.tolist(), counts.items()):
+        if row >= 0 and count >= min_count:
+            tags[row].append(tag)
+    return tags
+
+
+def read_ratings(ids, ratings_path, chunk_size=2000000):
+    """
+    Movie rows, user ids and values of the ratings of the movies in `ids` in MovieLens' ratings.csv
+    (userId,movieId,rating,timestamp). The file is read in chunks, only the three used columns are
+    kept in memory.
+    """
+    import pandas as pd
+
+    user_columns = []
+    movie_rows = []
+    values = []
+    reader = pd.read_csv(ratings_path, usecols=["userId", "movieId", "rating"], chunksize=chunk_size,
+                         dtype={"userId": np.int32, "movieId": np.int32, "rating": np.float32})
+    for chunk in reader:
+        rows = rows_of(ids, chunk["movieId"].to_numpy())
+        known = rows >= 0
+        movie_rows.append(rows[known].astype(np.int32))
+        user_columns.append(chunk["userId"].to_numpy()[known])
+        values.append(chunk["rating"].to_numpy()[known])
+    movie_rows = np.concatenate(movie_rows) if movie_rows else np.empty(0, dtype=np.int32)
+    user_columns = np.concatenate(user_columns) if user_columns else np.empty(0, dtype=np.int32)
+    values = np.concatenate(values) if values else np.empty(0, dtype=np.float32)
+    return movie_rows, user_columns, values
+
+
+def mean_ratings(user_columns, values, user_means=None):
+    """
+    Mean rating of every user. Users in `user_means` (of an earlier build) keep their mean.
+    """
+    users = max(int(user_columns.max()) + 1 if len(user_columns) else 0,
+                len(user_means) if user_means is not None else 0)
+    totals = np.bincount(user_columns, weights=values, minlength=users)
+    counts = np.bincount(user_columns, minlength=users)
+    means = (totals / np.maximum(counts, 1)).astype(np.float32)
+    if user_means is not None:
+        means[:len(user_means)] = user_means
+    return means
+
+
+def rating_matrix(ids, ratings_path, center=True, chunk_size=2000000, user_means=None):
+    """
+    Movie x user matrix from MovieLens' ratings.csv.
+    With `center` every rating is reduced by the mean rating of its user (adjusted cosine), the
+    means of `user_means` are used for the users it has. Returns the matrix and the means.
+    """
+    movie_rows, user_columns, values = read_ratings(ids, ratings_path, chunk_size)
+    means = mean_ratings(user_columns, values, user_means)
+    if center and len(values):
+        values = values - means[user_columns]
+        # A rating exactly at the user's mean would vanish from the sparse matrix
+        values[values == 0] = 1e-6
+    matrix = sparse.csr_matrix((values, (movie_rows, user_columns)), shape=(len(ids), len(means)), dtype=np.float32)
+    return matrix, means
+
+
+def tfidf_matrix(texts, min_df=2, max_df=0.5, vocabulary=None, idf=None):
+    """
+    L2 normalized tf-idf matrix (sublinear tf) of a list of texts. Terms in fewer than `min_df`
+    or more than `max_df` (fraction) of the texts are ignored. Returns matrix, vocabulary and idf,
+    pass the latter two to vectorize further texts into the same space.
+    """
+    tokenized = [Counter(tokenize(text)) for text in texts]
+    if vocabulary is None:
+        document_frequency = Counter(term for tokens in tokenized for term in tokens)
+        limit = max_df * len(texts)
+        terms = sorted(term for term, frequency in document_frequency.items() if min_df <= frequency <= limit)
+        vocabulary = {term: column for column, term in enumerate(terms)}
+        idf = np.array([math.log((1 + len(texts)) / (1 + document_frequency[term])) + 1 for term in terms],
+                       dtype=np.float32)
+
+    indptr = [0]
+    indices = []
+    data = []
+    for tokens in tokenized:
+        columns = [(vocabulary[term], count) for term, count in tokens.items() if term in vocabulary]
+        columns.sort()
+        indices.extend(column for column, _ in columns)
+        data.extend(1 + math.log(count) for _, count in columns)
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix((np.array(data, dtype=np.float32), np.array(indices, dtype=np.int32),
+                                np.array(indptr, dtype=np.int64)), shape=(len(texts), len(vocabulary)))
+    matrix = normalize_rows(matrix @ sparse.diags(idf))
+    return matrix, vocabulary, idf
+
+
+def read_descriptions(directory, movie_ids=None):
+    """
+    Plot summaries of the extracted MovieLens json files (movielens plotSummary, tmdb overview as fallback),
+    of all files or only of `movie_ids`.
+    """
+    descriptions = {}
+    if movie_ids is None:
+        filenames = [filename for filename in os.listdir(directory) if filename.endswith(".json")]
+    else:
+        filenames = ["{}.json".format(movie_id) for movie_id in movie_ids
+                     if os.path.exists(os.path.join(directory, "{}.json".format(movie_id)))]
+    for filename in filenames:
+        with open(os.path.join(directory, filename)) as file:
+            movie = json.load(file)
+        text = (movie.get("movielens") or {}).get("plotSummary") or (movie.get("tmdb") or {}).get("overview")
+        if text:
+            descriptions[int(filename.split(".")[0])] = text
+    return descriptions
+
+
+def description_matrix(ids, descriptions, min_df=2, max_df=0.5, vocabulary=None, idf=None):
+    texts = [descriptions.get(movie_id, "") for movie_id in ids.tolist()]
+    return tfidf_matrix(texts, min_df=min_df, max_df=max_df, vocabulary=vocabulary, idf=idf)
+
+
+def normalize_rows(matrix):
+    matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags((1 / norms).astype(np.float32)) @ matrix
+
+
+def extend_vocabulary(vocabulary, labels_per_row):
+    """
+    Copy of a vocabulary with the labels it does not know yet appended as new columns.
+    """
+    vocabulary = dict(vocabulary)
+    for labels in labels_per_row:
+        for label in labels:
+            vocabulary.setdefault(label, len(vocabulary))
+    return vocabulary
+
+
+def _with_columns(matrix, columns):
+    matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+    if matrix.shape[1] < columns:
+        matrix.resize((matrix.shape[0], columns))
+    return matrix
+
+
+class FeatureSet:
+    """
+    The feature matrices of a build ("genres", "ratings", "tags", "descriptions", rows aligned
+    with `ids`) plus what is needed to compute rows of further movies in the same space: the
+    vocabularies, the user means of the centered ratings and the idf of the descriptions.
+    Written next to the stores by recommender.similarity.build, so an incremental update neither
+    rereads all inputs nor shifts the scores of the other movies.
+    """
+
+    def __init__(self, ids, matrices, vocabularies=None, user_means=None, idf=None):
+        self.ids = np.asarray(ids, dtype=np.int32)
+        self.matrices = dict(matrices)
+        self.vocabularies = dict(vocabularies or {})
+        self.user_means = user_means
+        self.idf = idf
+
+    def save(self, path):
+        arrays = {"ids": self.ids, "vocabularies": np.array(json.dumps(self.vocabularies))}
+        for name, matrix in self.matrices.items():
+            matrix = sparse.csr_matrix(matrix)
+            arrays[name + "_data"] = matrix.data
+            arrays[name + "_indices"] = matrix.indices
+            arrays[name + "_indptr"] = matrix.indptr
+            arrays[name + "_shape"] = np.array(matrix.shape, dtype=np.int64)
+        if self.user_means is not None:
+            arrays["user_means"] = self.user_means
+        if self.idf is not None:
+            arrays["idf"] = self.idf
+        temporary_path = "{}.tmp.npz".format(path)
+        np.savez(temporary_path, **arrays)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            names = [name[:-len("_shape")] for name in arrays.files if name.endswith("_shape")]
+            matrices = {
+                name: sparse.csr_matrix(
+                    (arrays[name + "_data"], arrays[name + "_indices"], arrays[name + "_indptr"]),
+                    shape=tuple(arrays[name + "_shape"]))
+                for name in names
+            }
+            return cls(
+                ids=arrays["ids"],
+                matrices=matrices,
+                vocabularies=json.loads(str(arrays["vocabularies"])),
+                user_means=arrays["user_means"] if "user_means" in arrays.files else None,
+                idf=arrays["idf"] if "idf" in arrays.files else None,
+            )
+
+    def add_movies(self, movie_ids):
+        """
+        Adds an empty row to every matrix for the movies that are not part of the set yet.
+        """
+        ids = np.union1d(self.ids, np.asarray(movie_ids, dtype=np.int32)).astype(np.int32)
+        if len(ids) == len(self.ids):
+            return
+        old_rows = rows_of(self.ids, ids)
+        for name, matrix in self.matrices.items():
+            # New movies select the appended all zero row
+            padded = sparse.vstack([matrix, sparse.csr_matrix((1, matrix.shape[1]), dtype=np.float32)]).tocsr()
+            self.matrices[name] = padded[np.where(old_rows >= 0, old_rows, matrix.shape[0])]
+        self.ids = ids
+
+    def set_rows(self, name, movie_ids, rows):
+        """
+        Replaces the rows of `movie_ids` (added with add_movies) in a matrix, `rows` may have more columns.
+        """
+        matrix = self.matrices[name]
+        columns = max(matrix.shape[1], rows.shape[1])
+        stacked = sparse.vstack([_with_columns(matrix, columns), _with_columns(rows, columns)]).tocsr()
+        order = np.arange(matrix.shape[0])
+        order[rows_of(self.ids, movie_ids)] = matrix.shape[0] + np.arange(len(movie_ids))
+        self.matrices[name] = stacked[order]
@@ -0,0 +1,266 @@
+"""
+Incremental similarity updates for added or changed movies.
+
+Instead of recomputing all pairs, the changed movie is scored against the catalog once (O(n)),
+gets its own top k and is spliced into the lists of the movies it now belongs to. Only the lists
+that held the movie before an edit are recomputed. The stores need scores and the feature
+matrices of the build (features.npz), so they have to be written by `recommender.similarity.build`.
+
+Only the feature rows of the changed movies are computed, with the vocabularies, user means and
+idf of the build, so the scores stay comparable to the stored ones. The ratings, tags and
+descriptions inputs only need to contain the changed movies (the full files work, but are read
+in full); rows of inputs that are not given are kept.
+
+    python -m recommender.similarity.incremental --movies movies.csv --similarity-dir similarities \
+        --ratings new_ratings.csv --movie-id 193609 --update-database
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+from recommender import mpaa
+from recommender.similarity import features
+from recommender.similarity.build import FEATURES_FILE_NAME, VARIANTS, variant_terms
+from recommender.similarity.neighbors import PADDING, PreparedTerm, to_movie_ids, top_k
+from recommender.similarity_store import SimilarityStore, write_arrays
+
+# Variants stored in movie_infos.recommendations
+STORED_ALGORITHMS = ("cosine", "cosine_reduced", "jaccard", "jaccard_tag")
+
+
+class NeighborTable:
+    """
+    Mutable copy of a similarity store (ids, neighbors and scores).
+    """
+
+    def __init__(self, ids, neighbors, scores):
+        self.ids = np.array(ids, dtype=np.int32)
+        self.neighbors = np.array(neighbors, dtype=np.int32)
+        self.scores = np.array(scores, dtype=np.float32)
+
+    @classmethod
+    def read(cls, path):
+        with SimilarityStore(path) as store:
+            if not store.has_scores:
+                raise ValueError("{} has no scores, build it with recommender.similarity.build".format(path))
+            ids, neighbors, scores = store.as_arrays()
+            table = cls(ids, neighbors, scores)
+            del ids, neighbors, scores
+        return table
+
+    def write(self, path):
+        write_arrays(path, self.ids, self.neighbors, self.scores)
+
+    @property
+    def k(self):
+        return self.neighbors.shape[1]
+
+    def set_row(self, movie_id, neighbors, scores):
+        row = int(np.searchsorted(self.ids, movie_id))
+        if row < len(self.ids) and self.ids[row] == movie_id:
+            self.neighbors[row] = neighbors
+            self.scores[row] = scores
+        else:
+            self.ids = np.insert(self.ids, row, movie_id)
+            self.neighbors = np.insert(self.neighbors, row, neighbors, axis=0)
+            self.scores = np.insert(self.scores, row, scores, axis=0)
+
+
+class Scorer:
+    """
+    Scores single movies against the whole catalog for the weighted terms of one variant.
+    """
+
+    def __init__(self, ids, terms):
+        self.ids = ids
+        self.terms = [PreparedTerm(term) for term in terms]
+
+    def scores(self, row):
+        scores = None
+        for term in self.terms:
+            block = term.weight * term.scores(row, row + 1)
+            scores = block if scores is None else scores + block
+        return scores
+
+    def top_k(self, movie_id, k):
+        row = int(features.rows_of(self.ids, [movie_id])[0])
+        if row < 0:
+            raise KeyError(movie_id)
+        scores = self.scores(row)
+        all_scores = scores[0].copy()
+        all_scores[row] = -np.inf
+        neighbor_rows, neighbor_scores = top_k(scores, k, offset=row)
+        neighbors = np.full(k, PADDING, dtype=np.int32)
+        padded_scores = np.zeros(k, dtype=np.float32)
+        neighbors[:neighbor_rows.shape[1]] = to_movie_ids(self.ids, neighbor_rows)[0]
+        padded_scores[:neighbor_scores.shape[1]] = neighbor_scores[0]
+        return neighbors, padded_scores, all_scores
+
+
+def update_movie(table, scorer, movie_id):
+    """
+    Brings `table` up to date for an added or changed movie. Returns the ids whose lists changed.
+    """
+    k = table.k
+    neighbors, scores, all_scores = scorer.top_k(movie_id, k)
+    table.set_row(movie_id, neighbors, scores)
+    changed = {int(movie_id)}
+
+    feature_rows = features.rows_of(scorer.ids, table.ids)
+    movie_scores = np.where(feature_rows >= 0, all_scores[np.maximum(feature_rows, 0)], -np.inf)
+    movie_scores[table.ids == movie_id] = -np.inf
+
+    # Edits: a list that held the movie may now hold it lower or not at all, and its k+1-th neighbor
+    # was never stored, so it is recomputed
+    stale = (table.neighbors == movie_id).any(axis=1)
+    for row in np.nonzero(stale)[0]:
+        try:
+            neighbors, scores, _ = scorer.top_k(int(table.ids[row]), k)
+        except KeyError:
+            # Without features the list can only lose the movie
+            keep = table.neighbors[row] != movie_id
+            neighbors = np.concatenate([table.neighbors[row][keep], np.full(k - keep.sum(), PADDING)])
+            scores = np.concatenate([table.scores[row][keep], np.zeros(k - keep.sum())])
+        table.neighbors[row] = neighbors
+        table.scores[row] = scores
+        changed.add(int(table.ids[row]))
+
+    full = table.neighbors[:, -1] != PADDING
+    threshold = np.where(full, table.scores[:, -1], 0)
+    for row in np.nonzero((movie_scores > threshold) & ~stale)[0]:
+        valid = table.neighbors[row] != PADDING
+        position = int(np.sum(table.scores[row][valid] >= movie_scores[row]))
+        table.neighbors[row] = np.insert(table.neighbors[row], position, movie_id)[:k]
+        table.scores[row] = np.insert(table.scores[row], position, movie_scores[row])[:k]
+        changed.add(int(table.ids[row]))
+    return changed
+
+
+def update_database(conn, tables, changed_ids, k=10):
+    """
+    Rewrites the stored recommendations (json and movie_recommendation) of the changed movies only,
+    MPAA filtered like fill_database.py does.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT id, mpaa FROM data.movie_infos")
+        mpaa_by_id = dict(cursor.fetchall())
+        source_ids = np.array(sorted(movie_id for movie_id in changed_ids if movie_id in mpaa_by_id), dtype=np.int32)
+        sources = {algorithm: (table.ids, table.neighbors) for algorithm, table in tables.items()
+                   if algorithm in STORED_ALGORITHMS}
+        filtered = mpaa.filter_algorithms(sources, mpaa.rank_table(mpaa_by_id), source_ids, k)
+        for algorithm, (neighbors, present) in filtered.items():
+            updates = [
+                (json.dumps([neighbor for neighbor in row.tolist() if neighbor != PADDING]), int(movie_id))
+                for movie_id, row, has_row in zip(source_ids, neighbors, present) if has_row
+            ]
+            cursor.executemany(
+                "UPDATE data.movie_infos SET recommendations = jsonb_set(COALESCE(recommendations, '{{}}'::jsonb), "
+                "'{{{}}}', %s::jsonb) WHERE id = %s".format(algorithm),
+                updates,
+            )
+            # Same lists in the normalized table of the V4 migration
+            cursor.execute(
+                "DELETE FROM data.movie_recommendation WHERE algorithm = %s AND source_id = ANY(%s)",
+                (algorithm, [movie_id for _, movie_id in updates]),
+            )
+            cursor.executemany(
+                "INSERT INTO data.movie_recommendation (source_id, algorithm, rank, target_id) VALUES (%s, %s, %s, %s)",
+                [
+                    (int(movie_id), algorithm, rank, neighbor)
+                    for movie_id, row, has_row in zip(source_ids, neighbors, present) if has_row
+                    for rank, neighbor in enumerate((neighbor for neighbor in row.tolist() if neighbor != PADDING), 1)
+                ],
+            )
+    conn.commit()
+    return len(source_ids)
+
+
+def update_features(feature_set, movies_path, movie_ids, ratings_path=None, tags_path=None, descriptions_path=None):
+    """
+    Computes the feature rows of `movie_ids` in the space of `feature_set` from the given inputs.
+    """
+    ids, _, genres = features.read_movies(movies_path)
+    movie_ids = np.array(sorted(set(movie_ids)), dtype=np.int32)
+    rows = features.rows_of(ids, movie_ids)
+    if (rows < 0).any():
+        raise ValueError("Not in {}: {}".format(movies_path, ", ".join(map(str, movie_ids[rows < 0].tolist()))))
+    feature_set.add_movies(movie_ids)
+
+    movie_genres = [genres[row] for row in rows.tolist()]
+    vocabulary = features.extend_vocabulary(feature_set.vocabularies["genres"], movie_genres)
+    feature_set.vocabularies["genres"] = vocabulary
+    feature_set.set_rows("genres", movie_ids, features.binary_matrix(movie_genres, vocabulary)[0])
+    if ratings_path and "ratings" in feature_set.matrices:
+        matrix, feature_set.user_means = features.rating_matrix(movie_ids, ratings_path,
+                                                                user_means=feature_set.user_means)
+        feature_set.set_rows("ratings", movie_ids, matrix)
+    if tags_path and "tags" in feature_set.matrices:
+        movie_tags = features.tag_labels(movie_ids, tags_path)
+        vocabulary = features.extend_vocabulary(feature_set.vocabularies["tags"], movie_tags)
+        feature_set.vocabularies["tags"] = vocabulary
+        feature_set.set_rows("tags", movie_ids, features.binary_matrix(movie_tags, vocabulary)[0])
+    if descriptions_path and "descriptions" in feature_set.matrices:
+        # Words the build did not know are ignored, the idf stays the one of the build
+        descriptions = features.read_descriptions(descriptions_path, movie_ids.tolist())
+        matrix, _, _ = features.description_matrix(movie_ids, descriptions,
+                                                   vocabulary=feature_set.vocabularies["descriptions"],
+                                                   idf=feature_set.idf)
+        feature_set.set_rows("descriptions", movie_ids, matrix)
+
+
+def update(movies_path, similarity_dir, movie_ids, ratings_path=None, tags_path=None, descriptions_path=None,
+           genre_weight=0.5, log=print):
+    """
+    Updates every variant store in `similarity_dir` for the given movies.
+    Returns the updated tables and the ids whose lists changed.
+    """
+    features_path = os.path.join(similarity_dir, FEATURES_FILE_NAME)
+    if not os.path.exists(features_path):
+        raise ValueError("{} is missing, build the stores with recommender.similarity.build".format(features_path))
+    feature_set = features.FeatureSet.load(features_path)
+    update_features(feature_set, movies_path, movie_ids, ratings_path, tags_path, descriptions_path)
+    terms = variant_terms(feature_set, genre_weight)
+    tables = {}
+    changed_ids = set()
+    for variant in VARIANTS:
+        path = os.path.join(similarity_dir, "{}.sim".format(variant))
+        if variant not in terms or not os.path.exists(path):
+            continue
+        table = NeighborTable.read(path)
+        scorer = Scorer(feature_set.ids, terms[variant])
+        changed = set()
+        for movie_id in movie_ids:
+            changed |= update_movie(table, scorer, movie_id)
+        table.write(path)
+        log("Updated {}: {} lists changed".format(variant, len(changed)))
+        tables[variant] = table
+        changed_ids |= changed
+    feature_set.save(features_path)
+    return tables, changed_ids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the similarity stores for added or changed movies")
+    parser.add_argument("--movies", required=True, help="MovieLens movies.csv, including the new movies")
+    parser.add_argument("--ratings", help="Ratings of the changed movies (ratings.csv format)")
+    parser.add_argument("--tags", help="Tags of the changed movies (tags.csv format)")
+    parser.add_argument("--descriptions", help="Directory with the extracted json files of the changed movies")
+    parser.add_argument("--similarity-dir", required=True, help="Stores written by recommender.similarity.build")
+    parser.add_argument("--movie-id", type=int, action="append", required=True)
+    parser.add_argument("--genre-weight", type=float, default=0.5)
+    parser.add_argument("--update-database", action="store_true",
+                        help="Also rewrite movie_infos.recommendations of the changed movies")
+    parser.add_argument("-k", type=int, default=10, help="Recommendations stored per algorithm after filtering")
+    arguments = parser.parse_args()
+
+    tables, changed_ids = update(arguments.movies, arguments.similarity_dir, arguments.movie_id, arguments.ratings,
+                                 arguments.tags, arguments.descriptions, arguments.genre_weight)
+    if arguments.update_database:
+        from recommender.bulk_load import connect
+
+        conn = connect()
+        updated = update_database(conn, tables, changed_ids, k=arguments.k)
+        conn.close()
+        print("Updated recommendations of {} movies, run build_neighbor_index to publish them".format(updated))
@@ -0,0 +1,123 @@
+"""
+Blocked top k neighbor search over sparse feature matrices.
+
+Scores are computed for `block_size` movies against all movies at a time, so peak memory is
+about block_size * movies * 4 bytes per term no matter how big the catalog gets. Every block is
+reduced to its top k with argpartition before the next one is computed.
+"""
+from collections import namedtuple
+
+import numpy as np
+from scipy import sparse
+
+from recommender.parallel import imap_bounded
+from recommender.similarity.features import normalize_rows
+
+PADDING = -1
+KINDS = ("cosine", "jaccard")
+# Feature matrices with at most this many columns (e.g. genres) are multiplied as dense arrays
+DENSE_FEATURES_LIMIT = 256
+
+# One weighted similarity measure over a feature matrix, several terms are summed up
+Term = namedtuple("Term", ["kind", "matrix", "weight"])
+
+# Prepared terms of a worker process, set by _init_worker
+_worker_terms = None
+
+
+class PreparedTerm:
+    def __init__(self, term):
+        if term.kind not in KINDS:
+            raise ValueError("Unknown similarity: {}".format(term.kind))
+        self.kind = term.kind
+        self.weight = term.weight
+        matrix = sparse.csr_matrix(term.matrix, dtype=np.float32)
+        if term.kind == "cosine":
+            matrix = normalize_rows(matrix).tocsr()
+        else:
+            matrix = (matrix != 0).astype(np.float32).tocsr()
+            self.sizes = np.asarray(matrix.sum(axis=1), dtype=np.float32).ravel()
+        self.matrix = matrix
+        if matrix.shape[1] <= DENSE_FEATURES_LIMIT:
+            self.transposed = matrix.T.toarray()
+        else:
+            self.transposed = matrix.T.tocsr()
+
+    def scores(self, start, stop):
+        overlap = self.matrix[start:stop] @ self.transposed
+        if sparse.issparse(overlap):
+            overlap = overlap.toarray()
+        overlap = np.asarray(overlap, dtype=np.float32)
+        if self.kind == "jaccard":
+            union = self.sizes[start:stop, None] + self.sizes[None, :] - overlap
+            overlap = np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0)
+        return overlap
+
+
+def _init_worker(terms):
+    global _worker_terms
+    _worker_terms = terms
+
+
+def top_k(scores, k, offset=0):
+    """
+    Top k columns (and their scores) of every row of a dense score block, best first.
+    Row i of the block is movie `offset + i`, it is never its own neighbor.
+    Columns without a positive score are returned as -1.
+    """
+    rows, columns = scores.shape
+    scores[np.arange(rows), offset + np.arange(rows)] = -np.inf
+    k = min(k, columns - 1) if columns > 1 else 0
+    if k <= 0:
+        return np.full((rows, 0), PADDING, dtype=np.int32), np.zeros((rows, 0), dtype=np.float32)
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")
+    neighbors = np.take_along_axis(candidates, order, axis=1).astype(np.int32)
+    neighbor_scores = np.take_along_axis(candidate_scores, order, axis=1).astype(np.float32)
+    empty = ~(neighbor_scores > 0)
+    neighbors[empty] = PADDING
+    neighbor_scores[empty] = 0
+    return neighbors, neighbor_scores
+
+
+def _block(arguments):
+    start, stop, k = arguments
+    scores = None
+    for term in _worker_terms:
+        block = term.scores(start, stop)
+        scores = term.weight * block if scores is None else scores + term.weight * block
+    return start, top_k(scores, k, offset=start)
+
+
+def top_k_neighbors(terms, k=10, block_size=256, workers=1):
+    """
+    Top k neighbors of every row for the weighted sum of the given terms.
+    All term matrices need the same rows (movies). Returns neighbor row indices [rows, k]
+    (padded with -1) and their scores.
+    """
+    prepared = [PreparedTerm(term) for term in terms]
+    rows = prepared[0].matrix.shape[0]
+    if any(term.matrix.shape[0] != rows for term in prepared):
+        raise ValueError("All feature matrices need one row per movie")
+    width = min(k, max(rows - 1, 0))
+    neighbors = np.full((rows, width), PADDING, dtype=np.int32)
+    scores = np.zeros((rows, width), dtype=np.float32)
+
+    blocks = [(start, min(start + block_size, rows), k) for start in range(0, rows, block_size)]
+    if workers > 1:
+        results = imap_bounded(_block, blocks, workers=workers, initializer=_init_worker, initargs=(prepared,))
+    else:
+        _init_worker(prepared)
+        results = map(_block, blocks)
+    for start, (block_neighbors, block_scores) in results:
+        neighbors[start:start + len(block_neighbors)] = block_neighbors
+        scores[start:start + len(block_scores)] = block_scores
+    return neighbors, scores
+
+
+def to_movie_ids(ids, neighbor_rows):
+    """
+    Translates a neighbor row matrix into movie ids, keeping the -1 padding.
+    """
+    return np.where(neighbor_rows >= 0, ids[np.maximum(neighbor_rows, 0)], PADDING).astype(np.int32)
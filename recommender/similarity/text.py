@@ -0,0 +1,18 @@
+"""
+Tokenization of the plot descriptions, shared by the offline feature matrices and the request time
+description search (kept free of scipy so API workers start fast).
+"""
+import re
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z']+")
+STOP_WORDS = frozenset("""
+a about after again against all also an and any are as at be because been before being between both but by
+can could did do does doing during each few for from further had has have having he her here hers him his how
+i if in into is it its itself just me more most my no nor not of off on once only or other our out over own
+same she should so some such than that the their them then there these they this those through to too under
+until up very was we were what when where which while who whom why will with would you your
+""".split())
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall((text or "").lower()) if token not in STOP_WORDS]
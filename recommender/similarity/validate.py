@@ -0,0 +1,224 @@
+"""
+Streaming validation and deduplication of neighbor CSVs (`id,neighbor_1,...,neighbor_k`).
+
+Memory stays constant no matter how large the file is: rows are sorted by id in runs of
+`run_size` rows that are written to temporary files and merged back (external sort), so duplicate
+ids end up next to each other. Known movie ids are held in a bitmap (one bit per id up to the
+largest id of movies.csv).
+
+The clean file is canonical: sorted by id, one row per id (the first one of the input), without
+self references, unknown or repeated neighbors and with at most k neighbors. The report counts
+every issue and lists the first lines it was found on:
+
+    invalid_key       the id is not a positive number (e.g. a header), the row is dropped
+    unknown_key       the id is not in movies.csv (e.g. cosine_sim_3.csv's "0,0,1,2,..." row), dropped
+    duplicate_key     another row with the same id and the same neighbors, dropped
+    conflicting_key   another row with the same id but other neighbors, dropped
+    invalid_value     a neighbor that is not a number, removed
+    self_reference    a movie recommended to itself, removed
+    unknown_id        a neighbor that is not in movies.csv, removed
+    repeated_id       a neighbor listed twice in a row, removed
+    long_row          more than k neighbors, truncated
+    short_row         fewer than k neighbors after cleaning, kept
+
+    python -m recommender.similarity.validate cosine_sim_3.csv cosine_sim_3_clean.csv --movies movies.csv
+"""
+import argparse
+import csv
+import heapq
+import json
+import os
+import tempfile
+from itertools import groupby
+
+ISSUES = ("invalid_key", "unknown_key", "duplicate_key", "conflicting_key", "invalid_value", "self_reference",
+          "unknown_id", "repeated_id", "long_row", "short_row")
+# Line numbers listed per issue in the report
+EXAMPLES = 10
+
+
+class IdSet:
+    """
+    Set of non negative ids as a bitmap, 1 bit per possible id.
+    """
+
+    def __init__(self, ids):
+        ids = list(ids)
+        self.bits = bytearray((max(ids, default=0) >> 3) + 1)
+        for movie_id in ids:
+            self.bits[movie_id >> 3] |= 1 << (movie_id & 7)
+
+    def __contains__(self, movie_id):
+        return 0 <= movie_id < len(self.bits) << 3 and bool(self.bits[movie_id >> 3] & (1 << (movie_id & 7)))
+
+    @classmethod
+    def from_movies(cls, path):
+        def ids():
+            with open(path, newline="", encoding="utf-8") as file:
+                for row in csv.DictReader(file):
+                    yield int(row["movieId"])
+        return cls(ids())
+
+
+class Report:
+    def __init__(self, input_path, k):
+        self.summary = {"input": str(input_path), "k": k, "rows_read": 0, "rows_written": 0}
+        self.issues = {issue: {"count": 0, "lines": []} for issue in ISSUES}
+
+    def add(self, issue, line, count=1):
+        entry = self.issues[issue]
+        entry["count"] += count
+        if len(entry["lines"]) < EXAMPLES and line not in entry["lines"]:
+            entry["lines"].append(line)
+
+    @property
+    def clean(self):
+        return not any(entry["count"] for entry in self.issues.values())
+
+    def as_dict(self):
+        return dict(self.summary, issues=self.issues)
+
+
+def clean_row(movie_id, values, line, known_ids, k, report):
+    """
+    Neighbors of a row without invalid, self referencing, unknown and repeated ids, at most k.
+    """
+    neighbors = []
+    seen = set()
+    for value in values:
+        try:
+            neighbor = int(value)
+        except ValueError:
+            report.add("invalid_value", line)
+            continue
+        if neighbor == movie_id:
+            report.add("self_reference", line)
+        elif known_ids is not None and neighbor not in known_ids:
+            report.add("unknown_id", line)
+        elif neighbor in seen:
+            report.add("repeated_id", line)
+        else:
+            seen.add(neighbor)
+            neighbors.append(neighbor)
+    if len(neighbors) > k:
+        report.add("long_row", line)
+        neighbors = neighbors[:k]
+    return neighbors
+
+
+def parsed_rows(path, known_ids, k, report):
+    """
+    Yields (movie id, line number, cleaned neighbors) of the rows that have a valid key.
+    """
+    with open(path, newline="") as file:
+        for line, row in enumerate(csv.reader(file), 1):
+            if not row:
+                continue
+            report.summary["rows_read"] += 1
+            try:
+                movie_id = int(row[0])
+            except ValueError:
+                movie_id = 0
+            if movie_id <= 0:
+                report.add("invalid_key", line)
+                continue
+            if known_ids is not None and movie_id not in known_ids:
+                report.add("unknown_key", line)
+                continue
+            yield movie_id, line, clean_row(movie_id, row[1:], line, known_ids, k, report)
+
+
+def write_run(rows, directory):
+    rows.sort(key=lambda row: (row[0], row[1]))
+    file = tempfile.NamedTemporaryFile("w", dir=directory, suffix=".run", delete=False, newline="")
+    with file:
+        writer = csv.writer(file)
+        for movie_id, line, neighbors in rows:
+            writer.writerow([movie_id, line] + neighbors)
+    return file.name
+
+
+def read_run(path):
+    with open(path, newline="") as file:
+        for row in csv.reader(file):
+            yield int(row[0]), int(row[1]), [int(value) for value in row[2:]]
+
+
+def sorted_rows(rows, directory, run_size):
+    """
+    Sorts (movie id, line, neighbors) rows by id and line with runs of at most `run_size` rows on disk.
+    """
+    runs = []
+    buffer = []
+    for row in rows:
+        buffer.append(row)
+        if len(buffer) >= run_size:
+            runs.append(write_run(buffer, directory))
+            buffer = []
+    if not runs:
+        # Everything fit into one run, no need for the disk
+        buffer.sort(key=lambda row: (row[0], row[1]))
+        yield from buffer
+        return
+    if buffer:
+        runs.append(write_run(buffer, directory))
+    yield from heapq.merge(*(read_run(path) for path in runs), key=lambda row: (row[0], row[1]))
+
+
+def validate(input_path, output_path=None, movies_path=None, k=10, run_size=200000, temporary_dir=None):
+    """
+    Validates a neighbor CSV and writes its clean canonical version to `output_path` (if given).
+    Returns the Report.
+    """
+    known_ids = IdSet.from_movies(movies_path) if movies_path else None
+    report = Report(input_path, k)
+    output = None
+    if output_path:
+        output = open("{}.tmp".format(output_path), "w", newline="")
+    try:
+        writer = csv.writer(output, lineterminator="\n") if output else None
+        with tempfile.TemporaryDirectory(dir=temporary_dir) as directory:
+            rows = sorted_rows(parsed_rows(input_path, known_ids, k, report), directory, run_size)
+            for movie_id, group in groupby(rows, key=lambda row: row[0]):
+                _, first_line, neighbors = next(group)
+                for _, line, duplicate in group:
+                    report.add("duplicate_key" if duplicate == neighbors else "conflicting_key", line)
+                if len(neighbors) < k:
+                    report.add("short_row", first_line)
+                if writer:
+                    writer.writerow([movie_id] + neighbors)
+                report.summary["rows_written"] += 1
+    finally:
+        if output:
+            output.close()
+    if output_path:
+        os.replace("{}.tmp".format(output_path), output_path)
+        report.summary["output"] = str(output_path)
+    return report
+
+
+def print_report(report, output=print):
+    summary = report.summary
+    output("{}: {} rows read, {} unique rows".format(summary["input"], summary["rows_read"], summary["rows_written"]))
+    for issue, entry in report.issues.items():
+        if entry["count"]:
+            output("  {:<16}{:>8}  (lines {})".format(issue, entry["count"], ", ".join(map(str, entry["lines"]))))
+    if report.clean:
+        output("  no issues")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate and deduplicate a neighbor CSV in constant memory")
+    parser.add_argument("csv_path")
+    parser.add_argument("out_path", nargs="?", help="Clean canonical CSV, only validated if left out")
+    parser.add_argument("--movies", help="movies.csv to detect unknown ids")
+    parser.add_argument("-k", type=int, default=10, help="Neighbors per movie")
+    parser.add_argument("--report", help="Write the report as json")
+    parser.add_argument("--run-size", type=int, default=200000, help="Rows sorted in memory at once")
+    arguments = parser.parse_args()
+    result = validate(arguments.csv_path, arguments.out_path, arguments.movies, k=arguments.k,
+                      run_size=arguments.run_size)
+    print_report(result)
+    if arguments.report:
+        with open(arguments.report, "w") as report_file:
+            json.dump(result.as_dict(), report_file, indent=2)
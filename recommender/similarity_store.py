@@ -0,0 +1,272 @@
+"""
+Fixed width binary storage for precomputed neighbor lists.
+
+Layout (little endian, every section 4 byte aligned):
+    header      magic "RSIM", format version (uint16), flags (uint16), rows (uint32), k (uint32)
+    ids         int32[rows], sorted ascending
+    neighbors   int32[rows * k], padded with -1
+    scores      float32[rows * k], only present if FLAG_SCORES is set
+
+The file is opened with mmap, so several processes reading the same store share its pages and
+opening it costs next to nothing. Lookups are a binary search over the id section.
+"""
+import argparse
+import bisect
+import csv
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+MAGIC = b"RSIM"
+FORMAT_VERSION = 1
+FLAG_SCORES = 1
+HEADER = struct.Struct("<4sHHII")
+PADDING = -1
+
+if sys.byteorder != "little":
+    raise ImportError("similarity_store only supports little endian machines")
+
+
+def read_csv_rows(path, value_type=int):
+    """
+    Yields (movie id, values) for every row of a neighbor CSV (`id,neighbor_1,...,neighbor_k`).
+    Rows with a non numeric key, like headers, are skipped.
+    """
+    with open(path, newline="") as file:
+        for row in csv.reader(file):
+            if not row:
+                continue
+            try:
+                movie_id = int(row[0])
+            except ValueError:
+                continue
+            yield movie_id, [value_type(value) for value in row[1:] if value != ""]
+
+
+def write_store(path, rows, k=None, scores=None):
+    """
+    Writes `rows` (movie id -> neighbor ids) to `path`. `scores` optionally maps the same ids to
+    a score per neighbor. Rows are truncated or padded to `k` (default: longest row).
+    The file is written next to `path` and moved into place.
+    """
+    ids = sorted(rows)
+    if k is None:
+        k = max((len(neighbors) for neighbors in rows.values()), default=0)
+    flags = FLAG_SCORES if scores is not None else 0
+
+    temporary_path = "{}.tmp".format(path)
+    with open(temporary_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, flags, len(ids), k))
+        array("i", ids).tofile(file)
+        for movie_id in ids:
+            neighbors = list(rows[movie_id][:k])
+            array("i", neighbors + [PADDING] * (k - len(neighbors))).tofile(file)
+        if scores is not None:
+            for movie_id in ids:
+                row_scores = list(scores.get(movie_id, [])[:k])
+                array("f", row_scores + [0.0] * (k - len(row_scores))).tofile(file)
+    os.replace(temporary_path, path)
+    return len(ids)
+
+
+def write_arrays(path, ids, neighbors, scores=None):
+    """
+    Writes numpy arrays (sorted ids, neighbors[rows, k] padded with -1, optional scores[rows, k])
+    to `path` without going through python lists.
+    """
+    import numpy as np
+
+    rows, k = neighbors.shape
+    temporary_path = "{}.tmp".format(path)
+    with open(temporary_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, FLAG_SCORES if scores is not None else 0, rows, k))
+        np.ascontiguousarray(ids, dtype="<i4").tofile(file)
+        np.ascontiguousarray(neighbors, dtype="<i4").tofile(file)
+        if scores is not None:
+            np.ascontiguousarray(scores, dtype="<f4").tofile(file)
+    os.replace(temporary_path, path)
+    return rows
+
+
+def convert_csv(csv_path, out_path, scores_path=None, k=None):
+    """
+    Converts a neighbor CSV (and optionally a CSV with the matching scores) to the binary format.
+    The first row of a duplicated id wins.
+    """
+    rows = {}
+    for movie_id, neighbors in read_csv_rows(csv_path):
+        rows.setdefault(movie_id, neighbors)
+    scores = None
+    if scores_path is not None:
+        scores = {}
+        for movie_id, values in read_csv_rows(scores_path, value_type=float):
+            scores.setdefault(movie_id, values)
+    return write_store(out_path, rows, k=k, scores=scores)
+
+
+class SimilarityStore:
+    """
+    Read only, memory mapped view of a store written by `write_store`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, self.rows, self.k = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError("{} is not a similarity store".format(path))
+
+        self._ids_offset = HEADER.size
+        self._neighbors_offset = self._ids_offset + 4 * self.rows
+        self._scores_offset = self._neighbors_offset + 4 * self.rows * self.k if flags & FLAG_SCORES else None
+
+        self._view = view = memoryview(self._mmap)
+        self.ids = view[self._ids_offset:self._neighbors_offset].cast("i")
+        self._neighbors = view[self._neighbors_offset:self._neighbors_offset + 4 * self.rows * self.k].cast("i")
+        self._scores = None
+        if self._scores_offset is not None:
+            self._scores = view[self._scores_offset:self._scores_offset + 4 * self.rows * self.k].cast("f")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.rows
+
+    def __contains__(self, movie_id):
+        return self.row_of(movie_id) is not None
+
+    @property
+    def has_scores(self):
+        return self._scores is not None
+
+    def close(self):
+        self.ids.release()
+        self._neighbors.release()
+        if self._scores is not None:
+            self._scores.release()
+        self._view.release()
+        self._mmap.close()
+
+    def row_of(self, movie_id):
+        row = bisect.bisect_left(self.ids, movie_id)
+        if row < self.rows and self.ids[row] == movie_id:
+            return row
+        return None
+
+    def _row_slice(self, movie_id):
+        row = self.row_of(movie_id)
+        if row is None:
+            raise KeyError(movie_id)
+        return slice(row * self.k, (row + 1) * self.k)
+
+    def neighbors(self, movie_id):
+        """
+        Neighbor ids of a movie in ranking order, raises KeyError for unknown movies.
+        """
+        return [neighbor for neighbor in self._neighbors[self._row_slice(movie_id)].tolist() if neighbor != PADDING]
+
+    def scores(self, movie_id):
+        if self._scores is None:
+            raise ValueError("{} has no scores".format(self.path))
+        row_slice = self._row_slice(movie_id)
+        length = len(self.neighbors(movie_id))
+        return self._scores[row_slice].tolist()[:length]
+
+    def as_arrays(self):
+        """
+        Zero copy numpy views (ids, neighbors[rows, k], scores or None) on the mapped file.
+        The store can not be closed while these arrays are alive.
+        """
+        import numpy as np
+
+        ids = np.frombuffer(self._mmap, dtype="<i4", count=self.rows, offset=self._ids_offset)
+        neighbors = np.frombuffer(self._mmap, dtype="<i4", count=self.rows * self.k,
+                                  offset=self._neighbors_offset).reshape(self.rows, self.k)
+        scores = None
+        if self._scores_offset is not None:
+            scores = np.frombuffer(self._mmap, dtype="<f4", count=self.rows * self.k,
+                                   offset=self._scores_offset).reshape(self.rows, self.k)
+        return ids, neighbors, scores
+
+
+class NeighborMatrix:
+    """
+    In memory neighbor lists (sorted numpy ids plus a padded matrix) with the lookup interface of
+    SimilarityStore, e.g. for lists that were post processed after reading a store.
+    """
+
+    def __init__(self, ids, neighbors):
+        self.ids = ids
+        self._neighbors = neighbors
+        self.rows, self.k = neighbors.shape
+
+    def __len__(self):
+        return self.rows
+
+    def __contains__(self, movie_id):
+        return self.row_of(movie_id) is not None
+
+    def row_of(self, movie_id):
+        row = int(self.ids.searchsorted(movie_id))
+        if row < self.rows and self.ids[row] == movie_id:
+            return row
+        return None
+
+    def neighbors(self, movie_id):
+        row = self.row_of(movie_id)
+        if row is None:
+            raise KeyError(movie_id)
+        return [neighbor for neighbor in self._neighbors[row].tolist() if neighbor != PADDING]
+
+    def as_arrays(self):
+        return self.ids, self._neighbors, None
+
+
+def store_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + ".sim"
+
+
+def open_store(path):
+    """
+    Opens a similarity store. A CSV path is converted to a `.sim` file next to it first,
+    unless an up to date conversion already exists.
+    """
+    if path.endswith(".csv"):
+        csv_path = path
+        path = store_path_for(csv_path)
+        if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(csv_path):
+            convert_csv(csv_path, path)
+    return SimilarityStore(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert and inspect binary similarity stores")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert_parser = subparsers.add_parser("convert", help="Convert a neighbor CSV")
+    convert_parser.add_argument("csv_path")
+    convert_parser.add_argument("out_path", nargs="?")
+    convert_parser.add_argument("--scores", help="CSV with the scores of the neighbors")
+    convert_parser.add_argument("-k", type=int, help="Number of neighbors to keep per movie")
+    show_parser = subparsers.add_parser("show", help="Print the neighbors of a movie")
+    show_parser.add_argument("path")
+    show_parser.add_argument("movie_id", type=int)
+    arguments = parser.parse_args()
+
+    if arguments.command == "convert":
+        out_path = arguments.out_path or store_path_for(arguments.csv_path)
+        count = convert_csv(arguments.csv_path, out_path, scores_path=arguments.scores, k=arguments.k)
+        print("Wrote {} movies to {}".format(count, out_path))
+    else:
+        with SimilarityStore(arguments.path) as store:
+            try:
+                print(store.neighbors(arguments.movie_id))
+            except KeyError:
+                print("Movie not found")
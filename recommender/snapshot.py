@@ -0,0 +1,291 @@
+"""
+Snapshots of the built data, to bootstrap a replica without flyway, the MovieLens json files and
+fill_database.py.
+
+A snapshot is a zip holding:
+
+    manifest.json                   format version, data build version, rows and columns per table
+    <table>/<column>.npy            int and float columns, plus <column>.nulls.npy if it has NULLs
+    <table>/<column>.codes.npy      text columns with few distinct values (mpaa, algorithm), the
+                                    values are listed in the manifest
+    <table>/<column>.json           all other text and json columns as one json list
+    data/<file>                     the neighbor and description index and the evaluation report of
+                                    the build, restored as the files of the snapshot's build
+
+of movie_infos and movie_recommendation. `manage.py import_snapshot` replaces both tables (COPY into
+a copy of the table that is swapped in on postgres, one transaction on sqlite), restores the data
+files and publishes the snapshot's data build, so workers pick it up without a restart.
+"""
+import io
+import json
+import os
+import zipfile
+from datetime import datetime, timezone
+
+import numpy as np
+from django.db import connection, transaction
+
+from recommender import data_build, evaluation, neighbor_index
+from recommender.similarity import ann
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+# Tables in load order with the columns they are sorted and keyed by
+TABLES = {
+    "movie_infos": ("id",),
+    "movie_recommendation": ("source_id", "algorithm", "rank"),
+}
+DATA_FILES = (neighbor_index.INDEX_FILE_NAME, ann.INDEX_FILE_NAME, evaluation.REPORT_FILE_NAME)
+# Text columns with at most this many distinct values are stored as uint8 codes
+MAX_CATEGORIES = 255
+FETCH_SIZE = 10000
+# The columns compress almost as well at the fastest level, the float arrays of the indexes hardly at all
+COMPRESS_LEVEL = 1
+
+SQLITE_RECOMMENDATION_TABLE = """
+CREATE TABLE IF NOT EXISTS movie_recommendation (
+    source_id int not null,
+    algorithm text not null,
+    rank smallint not null,
+    target_id int not null,
+    score real,
+    primary key (source_id, algorithm, rank)
+)
+"""
+
+
+def qualified(table):
+    # The flyway migrations create the tables in the data schema
+    return "data.{}".format(table) if connection.vendor == "postgresql" else table
+
+
+def table_exists(table):
+    with connection.cursor() as cursor:
+        return table in connection.introspection.table_names(cursor)
+
+
+def table_columns(table):
+    with connection.cursor() as cursor:
+        return [column.name for column in connection.introspection.get_table_description(cursor, table)]
+
+
+def read_table(table):
+    """
+    Column names and a list of values per column of a whole table, sorted by its key.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT * FROM {} ORDER BY {}".format(qualified(table), ", ".join(TABLES[table])))
+        columns = [column[0] for column in cursor.description]
+        values = [[] for _ in columns]
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            for column_values, chunk in zip(values, zip(*rows)):
+                column_values.extend(chunk)
+    return columns, values
+
+
+def column_kind(values):
+    types = {type(value) for value in values if value is not None}
+    if types and types <= {int}:
+        return "int"
+    if types and types <= {int, float}:
+        return "float"
+    if types & {dict, list}:
+        # jsonb on postgres, sqlite returns json columns as text
+        return "json"
+    if len(set(values)) <= MAX_CATEGORIES:
+        return "category"
+    return "text"
+
+
+def _write_array(bundle, name, array):
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    bundle.writestr(name, buffer.getvalue())
+
+
+def _read_array(bundle, name):
+    return np.load(io.BytesIO(bundle.read(name)), allow_pickle=False)
+
+
+def write_column(bundle, prefix, values):
+    """
+    Writes one column to the zip, returns its manifest entry.
+    """
+    kind = column_kind(values)
+    entry = {"kind": kind}
+    if kind in ("int", "float"):
+        nulls = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+        array = np.array([0 if value is None else value for value in values],
+                         dtype=np.int64 if kind == "int" else np.float64)
+        int32 = np.iinfo(np.int32)
+        if kind == "int" and len(array) and int32.min <= array.min() and array.max() <= int32.max:
+            array = array.astype(np.int32)
+        entry["file"] = prefix + ".npy"
+        _write_array(bundle, entry["file"], array)
+        if nulls.any():
+            entry["nulls"] = prefix + ".nulls.npy"
+            _write_array(bundle, entry["nulls"], nulls)
+    elif kind == "category":
+        # NULL stays a json null, dates and other types are stored as their str()
+        entry["values"] = sorted({None if value is None else str(value) for value in values},
+                                 key=lambda value: (value is not None, value or ""))
+        code_of = {value: code for code, value in enumerate(entry["values"])}
+        entry["file"] = prefix + ".codes.npy"
+        _write_array(bundle, entry["file"], np.array(
+            [code_of[None if value is None else str(value)] for value in values], dtype=np.uint8))
+    else:
+        entry["file"] = prefix + ".json"
+        if kind == "text":
+            values = [None if value is None else str(value) for value in values]
+        bundle.writestr(entry["file"], json.dumps(values, ensure_ascii=False, separators=(",", ":")))
+    return entry
+
+
+def read_column(bundle, entry):
+    """
+    The values of a column as a list, json columns as json text.
+    """
+    kind = entry["kind"]
+    if kind in ("int", "float"):
+        values = _read_array(bundle, entry["file"]).tolist()
+        if "nulls" in entry:
+            nulls = _read_array(bundle, entry["nulls"])
+            values = [None if null else value for value, null in zip(values, nulls.tolist())]
+        return values
+    if kind == "category":
+        return [entry["values"][code] for code in _read_array(bundle, entry["file"]).tolist()]
+    values = json.loads(bundle.read(entry["file"]))
+    if kind == "json":
+        return [None if value is None else json.dumps(value) for value in values]
+    return values
+
+
+def export_snapshot(path, data_files=True, log=print):
+    """
+    Writes the tables and the data files of the published build to a snapshot zip at `path`.
+    Returns the manifest.
+    """
+    version = data_build.current_version()
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "version": version,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "vendor": connection.vendor,
+        "tables": {},
+        "files": [],
+    }
+    temporary_path = "{}.tmp".format(path)
+    compression = {"compression": zipfile.ZIP_DEFLATED, "compresslevel": COMPRESS_LEVEL}
+    with zipfile.ZipFile(temporary_path, "w", **compression) as bundle:
+        for table in TABLES:
+            if not table_exists(table):
+                log("Skipping {}, the table does not exist".format(table))
+                continue
+            columns, values = read_table(table)
+            manifest["tables"][table] = {
+                "rows": len(values[0]) if values else 0,
+                "columns": {
+                    column: write_column(bundle, "{}/{}".format(table, column), column_values)
+                    for column, column_values in zip(columns, values)
+                },
+            }
+            log("Exported {} rows of {}".format(manifest["tables"][table]["rows"], table))
+        if data_files and version is not None:
+            for name in DATA_FILES:
+                file_path = data_build.build_file(name, version)
+                if file_path.exists():
+                    bundle.write(file_path, "data/" + name)
+                    manifest["files"].append(name)
+        bundle.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+    os.replace(temporary_path, path)
+    return manifest
+
+
+def read_manifest(bundle):
+    try:
+        manifest = json.loads(bundle.read(MANIFEST_NAME))
+    except KeyError:
+        raise ValueError("Not a snapshot, {} is missing".format(MANIFEST_NAME))
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError("Unsupported snapshot format {}".format(manifest.get("format_version")))
+    return manifest
+
+
+def load_table(table, columns, rows, chunk_size=10000):
+    """
+    Replaces the content of `table` with `rows`.
+    """
+    if connection.vendor == "postgresql":
+        from recommender.bulk_load import load_rows
+
+        connection.ensure_connection()
+        return load_rows(connection.connection, qualified(table), columns, rows, key=TABLES[table],
+                         method="copy", mode="swap", chunk_size=chunk_size, progress=None).rows
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("DELETE FROM {}".format(table))
+        cursor.executemany(
+            "INSERT INTO {} ({}) VALUES ({})".format(table, ", ".join(columns), ", ".join(["%s"] * len(columns))),
+            rows,
+        )
+    return len(rows)
+
+
+def create_sqlite_table(table):
+    from recommender.benchmark import SQLITE_MOVIE_TABLE
+
+    with connection.cursor() as cursor:
+        cursor.execute(SQLITE_MOVIE_TABLE if table == "movie_infos" else SQLITE_RECOMMENDATION_TABLE)
+
+
+def restore_data_files(bundle, names, version):
+    """
+    Writes the data files as the files of the build `version`, the published build is not touched.
+    """
+    directory = data_build.data_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        path = data_build.build_file(name, version, directory)
+        temporary_path = path.with_name(path.name + ".tmp")
+        with bundle.open("data/" + name) as source, open(temporary_path, "wb") as target:
+            while True:
+                block = source.read(1024 * 1024)
+                if not block:
+                    break
+                target.write(block)
+        os.replace(temporary_path, path)
+
+
+def import_snapshot(path, data_files=True, publish=True, chunk_size=10000, log=print):
+    """
+    Replaces the tables (and data files) with the content of a snapshot and publishes its data build.
+    Columns the target tables do not have are left out. Returns the published version (or None).
+    """
+    with zipfile.ZipFile(path) as bundle:
+        manifest = read_manifest(bundle)
+        for table, entry in manifest["tables"].items():
+            if table not in TABLES:
+                continue
+            if not table_exists(table):
+                if connection.vendor != "sqlite":
+                    raise ValueError("Table {} does not exist, run the flyway migrations first".format(table))
+                create_sqlite_table(table)
+            existing = set(table_columns(table))
+            columns = [column for column in entry["columns"] if column in existing]
+            skipped = [column for column in entry["columns"] if column not in existing]
+            if skipped:
+                log("Leaving out the columns {} of {}".format(", ".join(skipped), table))
+            rows = list(zip(*(read_column(bundle, entry["columns"][column]) for column in columns)))
+            log("Loaded {} rows into {}".format(load_table(table, columns, rows, chunk_size), table))
+        files = manifest["files"] if data_files and manifest["version"] else []
+        if files:
+            restore_data_files(bundle, files, manifest["version"])
+
+    if not publish:
+        return None
+    # The restored index files belong to the snapshot's build, without them a new build starts. The
+    # files of the local build belong to the old tables, so none of them are carried over.
+    version = manifest["version"] if files else None
+    return data_build.publish(version=version, carry_over=False)
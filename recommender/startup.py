@@ -0,0 +1,98 @@
+"""
+Cold start measurement of `manage.py import_report`.
+
+A fresh interpreter (`python -X importtime`) loads the settings and apps, builds the WSGI
+application and serves one request, exactly like a new gunicorn worker. The phases are timed in
+the child and the import log on its stderr tells which modules the time went to.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+# Runs in the child interpreter, prints the phase durations as json on the last line of stdout
+COLD_START_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+loaded = time.perf_counter()
+from wsgiref.util import setup_testing_defaults
+environ = {"PATH_INFO": sys.argv[1], "QUERY_STRING": sys.argv[2]}
+setup_testing_defaults(environ)
+statuses = []
+response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+b"".join(response)
+finished = time.perf_counter()
+print(json.dumps({
+    "setup": setup - started,
+    "application": loaded - setup,
+    "first_request": finished - loaded,
+    "total": finished - started,
+    "status": statuses[0],
+}))
+"""
+
+
+def parse_importtime(lines):
+    """
+    Parses the `-X importtime` log into (module, self seconds, cumulative seconds, depth) tuples,
+    depth 0 are the imports the program started itself.
+    """
+    imports = []
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            # The header line
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, depth))
+    return imports
+
+
+def by_package(imports):
+    """
+    Import time per top level package (numpy, django, ...), sorted by time.
+    """
+    totals = defaultdict(float)
+    for name, self_seconds, _, _ in imports:
+        totals[name.split(".")[0]] += self_seconds
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def cold_start(url="/", settings_module=None):
+    """
+    Starts one fresh interpreter. Returns the phase durations and the parsed import log.
+    """
+    path, _, query = url.partition("?")
+    environment = dict(os.environ)
+    if settings_module:
+        environment["DJANGO_SETTINGS_MODULE"] = settings_module
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", COLD_START_SCRIPT, path, query],
+        capture_output=True, text=True, env=environment,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError("Cold start failed:\n{}".format(completed.stderr[-2000:]))
+    phases = json.loads(completed.stdout.strip().splitlines()[-1])
+    return phases, parse_importtime(completed.stderr.splitlines())
+
+
+def measure(url="/", settings_module=None, runs=3):
+    """
+    Median phase durations of `runs` cold starts and the import log of the last one.
+    """
+    results = [cold_start(url, settings_module) for _ in range(runs)]
+    phases = {
+        phase: statistics.median(result[0][phase] for result in results)
+        for phase in ("setup", "application", "first_request", "total")
+    }
+    phases["status"] = results[-1][0]["status"]
+    return phases, results[-1][1]
@@ -0,0 +1,49 @@
+import datetime
+import tempfile
+from pathlib import Path
+
+from django.test import override_settings
+
+from recommender import data_build, neighbor_index
+from recommender.models import Movie
+from recommender.neighbor_index import NeighborIndex
+
+
+def create_movie(movie_id, title, movielens_rating=3.0, **fields):
+    values = {
+        "tmdb_id": movie_id * 10,
+        "duration": 90,
+        "mpaa": "PG",
+        "description": "",
+        "release_date": datetime.date(2000, 1, 1),
+        "trailer_url": "",
+        "recommendations": {},
+        "ratings": {"movielens": movielens_rating, "tmdb": 0},
+    }
+    values.update(fields)
+    return Movie.objects.create(id=movie_id, title=title, **values)
+
+
+def use_data_dir(test_case, **settings):
+    """
+    Runs a test against an empty temporary RECOMMENDER_DATA_DIR whose build stamp is read on
+    every request.
+    """
+    directory = tempfile.TemporaryDirectory()
+    test_case.addCleanup(directory.cleanup)
+    overridden = override_settings(RECOMMENDER_DATA_DIR=directory.name, RECOMMENDER_BUILD_CHECK_INTERVAL=0,
+                                   **settings)
+    overridden.enable()
+    test_case.addCleanup(overridden.disable)
+    return Path(directory.name)
+
+
+def publish_index(movies=None):
+    """
+    Builds the neighbor index of `movies` (all movies by default) and publishes it as a new build.
+    """
+    version = data_build.new_version()
+    path = neighbor_index.index_path(version)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    NeighborIndex.from_movies(Movie.objects.all() if movies is None else movies, version=version).save(path)
+    return data_build.publish(version=version)
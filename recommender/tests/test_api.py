@@ -0,0 +1,61 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from recommender import neighbor_index
+from recommender.tests import create_movie, publish_index, use_data_dir
+
+
+def recommended_ids(result, algorithm):
+    return [movie["id"] for movie in result["recommendations"][algorithm]]
+
+
+class RecommendationApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_movie(1, "One", recommendations={"cosine": [2, 3, 99], "tmdb": [30]})
+        create_movie(2, "Two", recommendations={"cosine": [1]})
+        create_movie(3, "Three", movielens_rating=4.5, recommendations={"cosine": [2, 1]})
+
+    def setUp(self):
+        use_data_dir(self, RECOMMENDER_RECOMMENDATION_TABLE=False)
+        neighbor_index._index = neighbor_index._index_version = None
+
+    def test_recommendations(self):
+        for indexed in (False, True):
+            with self.subTest(indexed=indexed):
+                if indexed:
+                    publish_index()
+                response = self.client.get(reverse("recommendations", args=[1]), {"algo": "cosine,tmdb", "k": 1})
+                self.assertEqual(response.status_code, 200)
+                result = response.json()
+                self.assertEqual(result["movie"], {"id": 1, "title": "One"})
+                self.assertEqual(recommended_ids(result, "cosine"), [2])
+                self.assertEqual(recommended_ids(result, "tmdb"), [3])
+                self.assertEqual(self.client.get(reverse("recommendations", args=[4])).status_code, 404)
+
+    def test_batch(self):
+        response = self.client.get(reverse("batch_recommendations"), {"ids": "3,4,1,3", "algo": "cosine"})
+        result = response.json()
+        self.assertEqual([movie["movie"]["id"] for movie in result["results"]], [3, 1])
+        self.assertEqual(result["missing"], [4])
+        self.assertEqual(recommended_ids(result["results"][0], "cosine"), [2, 1])
+
+    def test_invalid_queries(self):
+        url = reverse("recommendations", args=[1])
+        for query in ({"k": "many"}, {"k": 51}, {"algo": "cosine,unknown"}):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(url, query).status_code, 400)
+        self.assertEqual(self.client.get(url, {"k": 50}).status_code, 200)
+        self.assertEqual(self.client.get(reverse("batch_recommendations"), {"k": 1000}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("batch_recommendations")).status_code, 400)
+        with override_settings(RECOMMENDER_BATCH_LIMIT=2):
+            response = self.client.get(reverse("batch_recommendations"), {"ids": "1,2,3"})
+            self.assertEqual(response.status_code, 400)
+
+    def test_neighbors_needs_the_index(self):
+        url = reverse("neighbors", args=[1])
+        self.assertEqual(self.client.get(url).status_code, 503)
+        publish_index()
+        response = self.client.get(url, {"algo": "cosine", "k": 5})
+        self.assertEqual([movie["id"] for movie in response.json()["recommendations"]], [2, 3])
+        self.assertEqual(self.client.get(url, {"k": 51}).status_code, 400)
@@ -0,0 +1,27 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from recommender import blend
+
+
+class BlendTests(SimpleTestCase):
+    @staticmethod
+    def no_ratings(ids):
+        return np.zeros(len(ids))
+
+    def test_fuse(self):
+        ranked = {"a": np.array([1, 2, 3]), "b": np.array([2, 4]), "c": np.array([9])}
+        fused = blend.fuse(ranked, {"a": 1.0, "b": 1.0, "c": 0.0}, self.no_ratings)
+        np.testing.assert_array_equal(fused, [2, 1, 4, 3])
+        np.testing.assert_array_equal(blend.fuse(ranked, {"a": 1.0, "b": 1.0}, self.no_ratings, k=2), [2, 1])
+
+    def test_ties(self):
+        ids = np.array([5, 3])
+        contributions = np.array([1.0, 1.0])
+        np.testing.assert_array_equal(blend.accumulate(ids, contributions, self.no_ratings), [3, 5])
+        ratings = {3: 0.0, 5: 5.0}
+        boosted = blend.accumulate(ids, contributions, lambda ids: [ratings[id] for id in ids])
+        np.testing.assert_array_equal(boosted, [5, 3])
+
+    def test_nothing_to_fuse(self):
+        self.assertEqual(len(blend.fuse({"a": np.array([1])}, {"a": 0.0}, self.no_ratings)), 0)
@@ -0,0 +1,73 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+
+from recommender.bulk_load import _csv_field, _deduplicate, chunked, load_rows
+
+TABLE = "bulk_load_test"
+COLUMNS = ("id", "name")
+
+
+class HelperTests(SimpleTestCase):
+    def test_chunked(self):
+        self.assertEqual(list(chunked(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(chunked([], 2)), [])
+
+    def test_csv_field(self):
+        self.assertEqual(_csv_field(None), "")
+        self.assertEqual(_csv_field(""), '""')
+        self.assertEqual(_csv_field('say "hi"'), '"say ""hi"""')
+
+    def test_last_row_of_a_key_wins(self):
+        chunk = [(1, "a"), (2, "b"), (1, "c")]
+        self.assertEqual(sorted(_deduplicate(chunk, list(COLUMNS), ["id"])), [(1, "c"), (2, "b")])
+
+
+@skipUnless(connection.vendor == "postgresql", "COPY and the table swap need postgres")
+class LoadRowsTests(TransactionTestCase):
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE TABLE {} (id int PRIMARY KEY, name text)".format(TABLE))
+        self.addCleanup(self.drop_table)
+        connection.ensure_connection()
+        self.conn = connection.connection
+
+    @staticmethod
+    def drop_table():
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS {}".format(TABLE))
+
+    def rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT id, name FROM {} ORDER BY id".format(TABLE))
+            return cursor.fetchall()
+
+    def load(self, rows, **options):
+        return load_rows(self.conn, TABLE, COLUMNS, rows, progress=None, **options)
+
+    def test_upsert_keeps_the_last_row_of_a_key(self):
+        for method in ("copy", "values"):
+            with self.subTest(method=method):
+                with connection.cursor() as cursor:
+                    cursor.execute("TRUNCATE {}".format(TABLE))
+                self.load([(1, "a"), (2, "b"), (1, "c"), (3, None), (2, "d")], method=method, chunk_size=10)
+                self.assertEqual(self.rows(), [(1, "c"), (2, "d"), (3, None)])
+                self.load([(3, "e")], method=method)
+                self.assertEqual(self.rows(), [(1, "c"), (2, "d"), (3, "e")])
+
+    def test_chunks_of_one_transaction(self):
+        stats = self.load([(1, "a"), (2, "b"), (1, "c")], chunk_size=1, atomic=True)
+        self.assertEqual(stats.rows, 3)
+        self.assertEqual(self.rows(), [(1, "c"), (2, "b")])
+
+    def test_swap_replaces_the_table(self):
+        self.load([(1, "a"), (2, "b")])
+        self.load([(3, "c")], mode="swap")
+        self.assertEqual(self.rows(), [(3, "c")])
+
+    def test_failed_atomic_load_keeps_the_old_rows(self):
+        self.load([(1, "a")])
+        with self.assertRaises(Exception):
+            self.load([(2, "b"), ("not a number", "c")], chunk_size=1, atomic=True)
+        self.assertEqual(self.rows(), [(1, "a")])
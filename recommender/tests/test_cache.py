@@ -0,0 +1,72 @@
+import tempfile
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from recommender import data_build
+from recommender.cache import BuildCache, LRUCache
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_bytes=30)
+        cache.set("a", "A", size=10)
+        cache.set("b", "B", size=10)
+        cache.set("c", "C", size=10)
+        self.assertEqual(cache.get("a"), "A")
+        cache.set("d", "D", size=10)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual([cache.get(key) for key in "acd"], ["A", "C", "D"])
+        self.assertEqual((cache.size, cache.hits, cache.misses), (30, 4, 1))
+
+    def test_replacing_and_oversized_values(self):
+        cache = LRUCache(max_bytes=30)
+        cache.set("a", "A", size=10)
+        cache.set("a", "AA", size=20)
+        self.assertEqual((len(cache), cache.size), (1, 20))
+        cache.set("b", "B", size=31)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "AA")
+        cache.clear()
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+    def test_size_of_pages(self):
+        cache = LRUCache(max_bytes=1000)
+        cache.set("page", "x" * 500)
+        self.assertGreaterEqual(cache.size, 500)
+
+
+class BuildCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(RECOMMENDER_DATA_DIR=directory.name, RECOMMENDER_BUILD_CHECK_INTERVAL=0,
+                                     RECOMMENDER_SHARED_CACHE=None)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.cache = BuildCache("test", 1024)
+
+    def test_nothing_is_cached_without_a_build(self):
+        self.assertEqual(self.cache.get_or_set(1, lambda: "page"), "page")
+        self.assertIsNone(self.cache.get(1))
+
+    def test_new_build_invalidates(self):
+        data_build.publish()
+        self.cache.set(1, "old page")
+        self.assertEqual(self.cache.get_or_set(1, lambda: "new page"), "old page")
+        data_build.publish()
+        self.assertIsNone(self.cache.get(1))
+        self.assertEqual(len(self.cache.local), 0)
+        self.assertEqual(self.cache.get_or_set(1, lambda: "new page"), "new page")
+
+    @override_settings(RECOMMENDER_SHARED_CACHE="default")
+    def test_shared_tier(self):
+        caches["default"].clear()
+        data_build.publish()
+        self.cache.set(1, "page")
+        # Another worker process only has the shared tier
+        other = BuildCache("test", 1024)
+        self.assertEqual(other.get(1), "page")
+        self.assertEqual(other.local.hits, 0)
+        self.assertEqual(other.get(1), "page")
+        self.assertEqual(other.local.hits, 1)
@@ -0,0 +1,85 @@
+import numpy as np
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+
+from recommender import evaluation
+from recommender.neighbor_index import NeighborIndex, PackedStrings, _pack_strings
+from recommender.tests import use_data_dir
+
+MOVIES_CSV = """movieId,title,genres
+1,One (2000),Action|Comedy
+2,Two (2000),Action
+3,Three (2000),Drama
+4,Four (2000),Action
+"""
+# 4 is rated most often, then 1 and 2
+RATINGS_CSV = "userId,movieId,rating,timestamp\n" + "".join(
+    "{},{},4.0,0\n".format(user, movie_id) for movie_id, users in ((1, 3), (2, 1), (4, 5)) for user in range(users)
+)
+
+
+def make_index(neighbors):
+    ids = np.array([1, 2, 3, 4], dtype=np.int32)
+    strings = PackedStrings(*_pack_strings(["", "", "", ""]))
+    matrices = {algorithm: np.array(rows, dtype=np.int32) for algorithm, rows in neighbors.items()}
+    ratings = np.zeros(4, dtype=np.float32)
+    return NeighborIndex(ids, ids * 10, matrices, strings, strings, strings, ratings, ratings,
+                         version="20240101000000000000")
+
+
+class EvaluationTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = use_data_dir(self)
+        self.movies = self.directory / "movies.csv"
+        self.movies.write_text(MOVIES_CSV)
+        self.ratings = self.directory / "ratings.csv"
+        self.ratings.write_text(RATINGS_CSV)
+        # Neighbor rows, -1 pads
+        self.index = make_index({
+            "a": [[1, 2], [0, -1], [-1, -1], [0, 1]],
+            "b": [[1, 3], [0, 3], [3, 0], [0, 1]],
+        })
+
+    def test_metrics(self):
+        report = evaluation.evaluate(self.index, movies_path=self.movies, ratings_path=self.ratings, k=2)
+        metrics = report["algorithms"]["a"]
+        self.assertEqual(metrics["list_coverage"], 0.75)
+        self.assertEqual(metrics["catalog_coverage"], 0.75)
+        self.assertEqual(metrics["mean_length"], 1.67)
+        # Exposure 2, 2, 1
+        self.assertAlmostEqual(metrics["exposure_gini"], 0.1333)
+        # Lists 2/3 (distance 1) and 1/2 (distance 0.5)
+        self.assertEqual(metrics["diversity"], 0.75)
+        # Percentiles 2: 0.25, 1: 0.5, 4: 0.75, none of 4 movies is in the most rated fifth
+        self.assertAlmostEqual(report["algorithms"]["b"]["popularity_percentile"], 4.25 / 8, places=3)
+        self.assertEqual(report["algorithms"]["b"]["long_tail_share"], 1.0)
+        # The empty list of a leaves out the third row
+        self.assertEqual(report["overlap"]["a/b"], round((1 / 3 + 1 / 2 + 1) / 3, 4))
+
+    def test_chunks_and_workers_give_the_same_report(self):
+        report = evaluation.evaluate(self.index, movies_path=self.movies, ratings_path=self.ratings, k=2)
+        chunked = evaluation.evaluate(self.index, movies_path=self.movies, ratings_path=self.ratings, k=2,
+                                      chunk_size=1, workers=2)
+        self.assertEqual(chunked, report)
+
+    def test_regressions(self):
+        baseline = evaluation.evaluate(self.index, movies_path=self.movies, k=2)
+        self.assertEqual(evaluation.regressions(baseline, baseline, 0.0), [])
+        worse = make_index({"a": [[1, -1], [-1, -1], [-1, -1], [0, -1]]})
+        report = evaluation.evaluate(worse, movies_path=self.movies, k=2)
+        found = evaluation.regressions(report, baseline, 0.02)
+        self.assertIn("a list_coverage: 0.75 -> 0.5", found)
+        # b is missing from the new report and not compared
+        self.assertFalse([message for message in found if message.startswith("b ")])
+        self.assertEqual(evaluation.regressions(report, baseline, 1.0), [])
+
+    def test_gate(self):
+        index_path = self.directory / "index.npz"
+        self.index.save(index_path)
+        baseline = self.directory / "baseline.json"
+        call_command("evaluate", index=str(index_path), movies=str(self.movies), k=2, output=str(baseline),
+                     stdout=open("/dev/null", "w"))
+        make_index({"a": [[-1, -1]] * 4, "b": [[-1, -1]] * 4}).save(index_path)
+        with self.assertRaises(CommandError):
+            call_command("evaluate", index=str(index_path), movies=str(self.movies), k=2, baseline=str(baseline),
+                         gate=True, stdout=open("/dev/null", "w"))
@@ -0,0 +1,66 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from recommender.similarity.incremental import NeighborTable, update_movie
+
+IDS = [1, 2, 3, 4, 5]
+# Symmetric similarities of the catalog before and after movie 5 changed
+BEFORE = {(1, 2): .9, (1, 3): .7, (1, 4): .65, (1, 5): .8, (2, 3): .6, (2, 4): .3, (2, 5): .2,
+          (3, 4): .5, (3, 5): .1, (4, 5): .4}
+AFTER = {**BEFORE, (1, 5): .5, (2, 5): .95}
+
+
+def similarity_matrix(ids, pairs):
+    position = {movie_id: row for row, movie_id in enumerate(ids)}
+    matrix = np.zeros((len(ids), len(ids)), dtype=np.float32)
+    for (first, second), score in pairs.items():
+        matrix[position[first], position[second]] = matrix[position[second], position[first]] = score
+    return matrix
+
+
+class MatrixScorer:
+    """
+    Scorer of a dense similarity matrix, with the interface of incremental.Scorer.
+    """
+
+    def __init__(self, ids, pairs):
+        self.ids = np.array(ids, dtype=np.int32)
+        self.similarities = similarity_matrix(ids, pairs)
+
+    def top_k(self, movie_id, k):
+        rows = np.nonzero(self.ids == movie_id)[0]
+        if not len(rows):
+            raise KeyError(movie_id)
+        scores = self.similarities[rows[0]].copy()
+        scores[rows[0]] = -np.inf
+        order = np.argsort(-scores, kind="stable")[:k]
+        return self.ids[order], scores[order], scores
+
+
+def full_table(scorer, k):
+    lists = [scorer.top_k(movie_id, k) for movie_id in scorer.ids.tolist()]
+    return NeighborTable(scorer.ids, [neighbors for neighbors, _, _ in lists], [scores for _, scores, _ in lists])
+
+
+class UpdateMovieTests(SimpleTestCase):
+    def assertTablesEqual(self, table, expected):
+        np.testing.assert_array_equal(table.ids, expected.ids)
+        np.testing.assert_array_equal(table.neighbors, expected.neighbors)
+        np.testing.assert_allclose(table.scores, expected.scores)
+
+    def test_edited_movie_drops_in_a_list(self):
+        table = full_table(MatrixScorer(IDS, BEFORE), k=3)
+        self.assertEqual(table.neighbors[0].tolist(), [2, 5, 3])
+        scorer = MatrixScorer(IDS, AFTER)
+        changed = update_movie(table, scorer, 5)
+        # 4 was the unstored 4th neighbor of 1 and has to replace the edited movie
+        self.assertEqual(table.neighbors[0].tolist(), [2, 3, 4])
+        self.assertTablesEqual(table, full_table(scorer, k=3))
+        self.assertEqual(changed, {1, 2, 4, 5})
+
+    def test_added_movie(self):
+        pairs = {**BEFORE, (1, 6): .3, (2, 6): .1, (3, 6): .8, (4, 6): .55, (5, 6): .05}
+        table = full_table(MatrixScorer(IDS, BEFORE), k=3)
+        scorer = MatrixScorer(IDS + [6], pairs)
+        update_movie(table, scorer, 6)
+        self.assertTablesEqual(table, full_table(scorer, k=3))
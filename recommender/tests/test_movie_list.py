@@ -0,0 +1,62 @@
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from recommender import data_build, search
+from recommender.tests import create_movie
+
+TITLES = ["Alien", "Brazil", "Casablanca", "Dune", "Eraserhead", "Fargo", "Gattaca", "Heat", "Inception",
+          "Jaws", "Kids", "Laura"]
+
+
+class MovieListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for movie_id, title in enumerate(TITLES, 1):
+            create_movie(movie_id, title)
+        # Same title, the id breaks the tie
+        create_movie(len(TITLES) + 1, "Heat")
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(RECOMMENDER_DATA_DIR=directory.name, RECOMMENDER_BUILD_CHECK_INTERVAL=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        search._title_index = None
+
+    def test_cursor_pages(self):
+        url = reverse("movies")
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            self.assertLessEqual(len(page["results"]), 10)
+            seen.extend((movie["title"], movie["id"]) for movie in page["results"])
+            url = page["next"]
+        self.assertEqual(seen, sorted(((title, movie_id) for movie_id, title in enumerate(TITLES + ["Heat"], 1)),
+                                      reverse=True))
+
+    def test_title_search_is_one_page(self):
+        page = self.client.get(reverse("movies"), {"title": "heat"}).json()
+        self.assertIsNone(page["next"])
+        self.assertEqual(sorted(movie["id"] for movie in page["results"]), [8, len(TITLES) + 1])
+
+    def test_not_modified(self):
+        url = reverse("movies")
+        # Without a published build nothing can be validated
+        self.assertNotIn("ETag", self.client.get(url))
+
+        data_build.publish()
+        response = self.client.get(url)
+        self.assertIn("max-age", response["Cache-Control"])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 304)
+        # Another page has another ETag
+        other = self.client.get(url, {"title": "heat"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(other.status_code, 200)
+
+        data_build.publish()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
@@ -0,0 +1,46 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from recommender import mpaa
+
+# Id -> MPAA rating, 4 is unrated and 7 has no movie
+MPAA_BY_ID = {1: "PG", 2: "G", 3: "R", 4: None, 5: "PG-13", 6: "pg"}
+
+
+class MpaaTests(SimpleTestCase):
+    def setUp(self):
+        self.table = mpaa.rank_table(MPAA_BY_ID)
+
+    def test_ranks(self):
+        self.assertEqual(mpaa.mpaa_rank(" pg-13 "), mpaa.MPAA_RANKS["PG-13"])
+        self.assertEqual(mpaa.mpaa_rank("GP"), mpaa.mpaa_rank("PG"))
+        self.assertEqual(mpaa.mpaa_rank(None), mpaa.UNRATED)
+        np.testing.assert_array_equal(mpaa.lookup_ranks(self.table, [1, 4, 7, -1]),
+                                      [2, mpaa.UNRATED, mpaa.MISSING, mpaa.MISSING])
+
+    def test_allowed(self):
+        sources = np.array([2, 2, 2, 2, mpaa.UNRATED])
+        candidates = np.array([1, 4, mpaa.UNRATED, mpaa.MISSING, 1])
+        np.testing.assert_array_equal(mpaa.allowed(sources, candidates), [False, True, True, False, True])
+
+    def test_filter_neighbors(self):
+        # 2 is rated lower than the PG source, 1 is the source itself, 3 is repeated and 7 unknown
+        candidates = [[2, 3, 1, 4, 3, 7, 5, 6]]
+        np.testing.assert_array_equal(mpaa.filter_neighbors([1], candidates, self.table, 4), [[3, 4, 5, 6]])
+        np.testing.assert_array_equal(mpaa.filter_neighbors([1], candidates, self.table, 6),
+                                      [[3, 4, 5, 6, -1, -1]])
+
+    def test_unrated_source_and_empty_rows(self):
+        filtered = mpaa.filter_neighbors([4, 3], [[2, 7, 3, -1], [1, 5, 6, 3]], self.table, 3)
+        np.testing.assert_array_equal(filtered, [[2, 3, -1], [-1, -1, -1]])
+
+    def test_backfill_from_other_algorithms(self):
+        sources = {
+            "a": (np.array([1, 5]), np.array([[2, 3], [6, 3]])),
+            "b": (np.array([1]), np.array([[5, 6]])),
+        }
+        filtered = mpaa.filter_algorithms(sources, self.table, np.array([1, 5]), 3)
+        np.testing.assert_array_equal(filtered["a"][0], [[3, 5, 6], [3, -1, -1]])
+        np.testing.assert_array_equal(filtered["b"][0], [[5, 6, 3], [3, -1, -1]])
+        np.testing.assert_array_equal(filtered["b"][1], [True, False])
+
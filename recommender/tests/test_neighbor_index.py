@@ -0,0 +1,95 @@
+import tempfile
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase, override_settings
+
+from recommender import data_build, neighbor_index
+from recommender.neighbor_index import NeighborIndex, get_index, index_path
+
+
+def movie(movie_id, recommendations, mpaa="PG"):
+    return SimpleNamespace(
+        id=movie_id, tmdb_id=movie_id * 10, title="Movie {}".format(movie_id), description="", trailer_url="",
+        ratings={"movielens": 3.5}, mpaa=mpaa, recommendations=recommendations,
+    )
+
+
+MOVIES = [
+    movie(3, {"cosine": [1, 2]}),
+    movie(1, {"cosine": [2, 3, 99], "tmdb": [30]}),
+    movie(2, {"cosine": [1]}, mpaa="R"),
+]
+
+
+class NeighborIndexTests(SimpleTestCase):
+    def test_from_movies(self):
+        index = NeighborIndex.from_movies(MOVIES)
+        self.assertEqual(index.ids.tolist(), [1, 2, 3])
+        # Unknown ids are dropped, tmdb lists are resolved by tmdb id
+        self.assertEqual(index.neighbor_ids(1, "cosine"), [2, 3])
+        self.assertEqual(index.neighbor_ids(1, "tmdb"), [3])
+        self.assertEqual(index.neighbor_ids(3, "cosine", k=1), [1])
+        self.assertEqual(index.neighbor_ids(4, "cosine"), [])
+        self.assertNotIn(4, index)
+        self.assertEqual(index.tile(1).title, "Movie 2")
+
+    def test_save_and_load(self):
+        index = NeighborIndex.from_movies(MOVIES, version="20240101000000000000")
+        with tempfile.TemporaryDirectory() as directory:
+            path = "{}/index.npz".format(directory)
+            index.save(path)
+            loaded = NeighborIndex.load(path)
+        self.assertEqual(loaded.version, index.version)
+        self.assertEqual(loaded.recommendations(1), index.recommendations(1))
+        self.assertEqual(loaded.mpaa_ranks.tolist(), index.mpaa_ranks.tolist())
+
+
+class PublishedIndexTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(RECOMMENDER_DATA_DIR=directory.name, RECOMMENDER_BUILD_CHECK_INTERVAL=0,
+                                     RECOMMENDER_INDEX_ENABLED=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(self.forget_index)
+        self.forget_index()
+
+    @staticmethod
+    def forget_index():
+        neighbor_index._index = None
+        neighbor_index._index_version = None
+
+    def write_build(self, version, movies):
+        path = index_path(version)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        NeighborIndex.from_movies(movies, version=version).save(path)
+
+    def test_only_published_builds_are_served(self):
+        self.assertIsNone(get_index())
+        self.write_build("20240101000000000000", MOVIES)
+        data_build.publish(version="20240101000000000000")
+        self.assertEqual(len(get_index()), 3)
+
+        # A build that is not published yet is not picked up, not even by a fresh worker
+        self.write_build("20240102000000000000", MOVIES[:1])
+        self.forget_index()
+        self.assertEqual(get_index().version, "20240101000000000000")
+
+        data_build.publish(version="20240102000000000000")
+        self.assertEqual(len(get_index()), 1)
+
+    def test_publish_carries_over_and_prunes_files(self):
+        first, second, third = "20240101000000000000", "20240102000000000000", "20240103000000000000"
+        self.write_build(first, MOVIES)
+        data_build.publish(version=first)
+        # A build without a neighbor index (e.g. only the description index was rebuilt)
+        data_build.publish(version=second)
+        self.assertEqual(get_index().version, first)
+        self.assertTrue(index_path(first).exists())
+
+        data_build.publish(version=third, carry_over=False)
+        self.assertIsNone(get_index())
+        # The files of the previous build stay for workers that did not notice the new one yet
+        self.assertTrue(index_path(second).exists())
+        self.assertFalse(index_path(first).exists())
@@ -0,0 +1,58 @@
+from PIL import Image
+from django.test import SimpleTestCase
+
+from recommender import data_build, posters
+from recommender.tests import use_data_dir
+from recommender.thumbnails import build_thumbnails
+
+
+class PosterTests(SimpleTestCase):
+    def setUp(self):
+        directory = use_data_dir(self)
+        self.source = directory / "source"
+        self.source.mkdir()
+        self.output = directory / "posters"
+        poster_settings = self.settings(RECOMMENDER_POSTER_DIR=self.output)
+        poster_settings.enable()
+        self.addCleanup(poster_settings.disable)
+        posters._manifest = None
+        posters._checked_at = 0.0
+
+    def write_poster(self, movie_id, color):
+        Image.new("RGB", (600, 900), color).save(self.source / "{}.jpg".format(movie_id))
+
+    def build(self):
+        return build_thumbnails(self.source, self.output, workers=1, log=lambda message: None)
+
+    def test_thumbnails_without_a_new_build(self):
+        self.assertIsNone(posters.manifest_version())
+        self.assertIsNone(posters.poster(1)["webp"])
+        self.write_poster(1, "red")
+        self.write_poster(2, "blue")
+        version = data_build.publish()
+
+        self.assertEqual(self.build(), (2, 0, 0))
+        tile = posters.poster(1)
+        self.assertTrue(posters.is_hashed(None, tile["webp"]))
+        self.assertEqual((tile["width"], tile["height"]), posters.SIZES[posters.TILE])
+        stamp = posters.manifest_version()
+        self.assertIsNotNone(stamp)
+
+        # Unchanged posters leave the manifest alone
+        self.assertEqual(self.build(), (0, 2, 0))
+        self.assertEqual(posters.manifest_version(), stamp)
+
+        self.write_poster(1, "green")
+        self.assertEqual(self.build(), (1, 1, 0))
+        self.assertNotEqual(posters.manifest_version(), stamp)
+        self.assertNotEqual(posters.poster(1)["webp"], tile["webp"])
+        self.assertEqual(data_build.current_version(), version)
+
+    def test_served_as_immutable(self):
+        self.write_poster(1, "red")
+        self.build()
+        url = posters.poster(1, posters.DETAIL)["webp"]
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(self.client.get(url.replace("-detail.", "-unknown.")).status_code, 404)
@@ -0,0 +1,57 @@
+import json
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from recommender.dataGenerator.fill_database import recommendation_rows
+from recommender.models import Movie
+from recommender.recommendations import recommendation_ids, resolve_recommendations, table_recommendations
+from recommender.tests import create_movie
+
+RECOMMENDATIONS = {
+    1: {"cosine": [2, 99, 3], "tmdb": [30, 990]},
+    2: {"cosine": [1], "jaccard": []},
+    3: {"cosine": [2, 1], "tmdb": [10]},
+}
+
+
+def lists():
+    return [(movie_id, movie_id * 10, json.dumps(recommendations))
+            for movie_id, recommendations in RECOMMENDATIONS.items()]
+
+
+def ids_of(resolved):
+    return {algorithm: [movie.id for movie in movies] for algorithm, movies in resolved.items()}
+
+
+class RecommendationRowsTests(SimpleTestCase):
+    def test_rows(self):
+        rows = sorted(recommendation_rows(lists()))
+        # tmdb ids are translated, unknown ids are left out without a gap in the ranks
+        self.assertEqual(rows, [
+            (1, "cosine", 1, 2, None), (1, "cosine", 2, 3, None), (1, "tmdb", 1, 3, None),
+            (2, "cosine", 1, 1, None),
+            (3, "cosine", 1, 2, None), (3, "cosine", 2, 1, None), (3, "tmdb", 1, 1, None),
+        ])
+
+
+class TableRecommendationsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for movie_id, recommendations in RECOMMENDATIONS.items():
+            create_movie(movie_id, "Movie {}".format(movie_id), recommendations=recommendations)
+        with connection.cursor() as cursor:
+            # The table is created by the V4 flyway migration, not by django
+            cursor.execute("CREATE TABLE movie_recommendation (source_id int NOT NULL, algorithm text NOT NULL, "
+                           "rank smallint NOT NULL, target_id int NOT NULL, score real, "
+                           "PRIMARY KEY (source_id, algorithm, rank))")
+            cursor.executemany("INSERT INTO movie_recommendation VALUES (%s, %s, %s, %s, %s)",
+                               list(recommendation_rows(lists())))
+
+    def test_same_lists_as_the_json(self):
+        for movie in Movie.objects.all():
+            for limit in (1, 5):
+                with self.subTest(movie=movie.id, limit=limit):
+                    from_json = resolve_recommendations(recommendation_ids(movie, limit=limit))
+                    from_table = table_recommendations(movie.id, limit=limit)
+                    self.assertEqual(ids_of(from_table), ids_of(from_json))
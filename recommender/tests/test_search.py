@@ -0,0 +1,49 @@
+from django.test import SimpleTestCase, TestCase
+
+from recommender import search
+from recommender.search import TitleIndex, search_movies
+from recommender.tests import create_movie
+
+MOVIES = [
+    (1, "Godfather, The", 4.4),
+    (2, "Godfather: Part II, The", 4.3),
+    (3, "Part of the Godfather", 2.0),
+    (4, "Up", 3.9),
+    (5, "Toy Story", 3.9),
+    (6, "Upside Down", 3.0),
+]
+
+
+class TitleIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = TitleIndex(MOVIES)
+
+    def test_every_word_has_to_match(self):
+        self.assertEqual(self.index.search("godfather part", 10), [2, 3])
+        self.assertEqual(self.index.search("part  GODFATHER ", 10), [3, 2])
+        self.assertEqual(self.index.search("godfather toy", 10), [])
+
+    def test_prefix_matches_first_then_popularity(self):
+        self.assertEqual(self.index.search("godfather", 10), [1, 2, 3])
+        self.assertEqual(self.index.search("godfather", 2), [1, 2])
+
+    def test_short_terms_match_title_prefixes(self):
+        self.assertEqual(self.index.search("up", 10), [4, 6])
+        self.assertEqual(self.index.search("up do", 10), [6])
+        self.assertEqual(self.index.search(" ", 10), [])
+
+
+class SearchMoviesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for movie_id, title, rating in MOVIES:
+            create_movie(movie_id, title, movielens_rating=rating)
+
+    def setUp(self):
+        search._title_index = None
+
+    def test_search_movies(self):
+        self.assertEqual([movie.id for movie in search_movies("godfather part")], [2, 3])
+        self.assertEqual([movie.id for movie in search_movies("story toy")], [5])
+        self.assertEqual([movie.id for movie in search_movies("up", limit=1)], [4])
+        self.assertFalse(search_movies(""))
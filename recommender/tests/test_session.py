@@ -0,0 +1,65 @@
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from recommender import cache, neighbor_index, session
+from recommender.neighbor_index import get_index
+from recommender.tests import create_movie, publish_index, use_data_dir
+
+
+class SessionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_movie(1, "One", recommendations={"cosine": [2, 3]})
+        create_movie(2, "Two", recommendations={"cosine": [1]})
+        create_movie(3, "Three", recommendations={"cosine": [2, 1]})
+        create_movie(4, "Four", recommendations={"cosine": [3]})
+
+    def setUp(self):
+        use_data_dir(self, RECOMMENDER_RECOMMENDATION_TABLE=False)
+        neighbor_index._index = neighbor_index._index_version = None
+        cache.pages.local.clear()
+        caches["default"].clear()
+        publish_index()
+        self.index = get_index()
+
+    def session_ids(self, movie_ids, k=10):
+        return [self.index.tile(row).id for row in session.session_rows(self.index, movie_ids, k=k).tolist()]
+
+    def test_seed_rows(self):
+        self.assertEqual(session.seed_rows(self.index, [3, 99, 1]).tolist(), [2, 0])
+        self.assertEqual(session.seed_rows(self.index, []).tolist(), [])
+
+    def test_session_rows(self):
+        # Seeds are never recommended
+        self.assertEqual(self.session_ids([1, 2]), [3])
+        # 1 and 4 both lead to 3
+        self.assertEqual(self.session_ids([1, 4]), [3, 2])
+        self.assertEqual(self.session_ids([1, 4], k=1), [3])
+        self.assertEqual(self.session_ids([99]), [])
+
+    def test_detail_pages_are_remembered(self):
+        for movie_id in (1, 4, 1, 99):
+            self.assertEqual(self.client.get(reverse("results", args=[movie_id])).status_code, 200)
+        # Cached pages are remembered as well
+        self.client.get(reverse("results", args=[4]))
+        response = self.client.get(reverse("session_recommendations"))
+        self.assertEqual(response.json()["seeds"], [1, 4])
+        # The unknown movie is not in the history
+        self.assertEqual(response.json()["missing"], [])
+        self.assertIn("Cookie", response["Vary"])
+
+    def test_history_is_capped(self):
+        with override_settings(RECOMMENDER_SESSION_HISTORY=2):
+            for movie_id in (1, 2, 3):
+                self.client.get(reverse("results", args=[movie_id]))
+        self.assertEqual(self.client.get(reverse("session_recommendations")).json()["seeds"], [2, 3])
+
+    def test_session_api(self):
+        response = self.client.get(reverse("session_recommendations"), {"ids": "1,99,4"})
+        result = response.json()
+        self.assertEqual(result["seeds"], [1, 4])
+        self.assertEqual(result["missing"], [99])
+        self.assertEqual([movie["id"] for movie in result["recommendations"]], [3, 2])
+        self.assertEqual(self.client.get(reverse("session_recommendations"), {"ids": "1,x"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("session_recommendations"), {"k": 51}).status_code, 400)
@@ -0,0 +1,81 @@
+import io
+import json
+import zipfile
+
+from django.test import SimpleTestCase, TestCase
+
+from recommender import data_build, neighbor_index, snapshot
+from recommender.models import Movie
+from recommender.neighbor_index import get_index
+from recommender.tests import create_movie, publish_index, use_data_dir
+
+
+def round_trip(values):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as bundle:
+        entry = snapshot.write_column(bundle, "table/column", values)
+    with zipfile.ZipFile(buffer) as bundle:
+        return entry, snapshot.read_column(bundle, entry)
+
+
+class ColumnTests(SimpleTestCase):
+    def test_round_trip(self):
+        columns = {
+            "int": [3, None, -1],
+            "float": [1.5, 2, None],
+            "category": ["PG", None, "R", "PG"],
+            "text": ["title {}".format(number) for number in range(snapshot.MAX_CATEGORIES + 1)],
+        }
+        for kind, values in columns.items():
+            with self.subTest(kind=kind):
+                entry, read = round_trip(values)
+                self.assertEqual(entry["kind"], kind)
+                self.assertEqual(read, values)
+
+    def test_int_width(self):
+        entry, read = round_trip([1, 2 ** 40])
+        self.assertEqual(read, [1, 2 ** 40])
+        self.assertNotIn("nulls", entry)
+
+    def test_json_is_read_as_text(self):
+        values = [{"cosine": [1, 2]}, None, [3]]
+        entry, read = round_trip(values)
+        self.assertEqual(entry["kind"], "json")
+        self.assertEqual(read, [json.dumps(values[0]), None, json.dumps(values[2])])
+
+    def test_not_a_snapshot(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as bundle:
+            bundle.writestr("other.txt", "")
+        with zipfile.ZipFile(buffer) as bundle, self.assertRaises(ValueError):
+            snapshot.read_manifest(bundle)
+
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        self.directory = use_data_dir(self)
+        neighbor_index._index = neighbor_index._index_version = None
+        create_movie(1, "One", recommendations={"cosine": [2]})
+        create_movie(2, "Two", mpaa="R", recommendations={"cosine": [1]})
+
+    def test_export_and_import(self):
+        version = publish_index()
+        path = self.directory / "snapshot.zip"
+        manifest = snapshot.export_snapshot(path, log=lambda message: None)
+        self.assertEqual(manifest["version"], version)
+        self.assertEqual(manifest["tables"]["movie_infos"]["rows"], 2)
+        self.assertEqual(manifest["files"], [neighbor_index.INDEX_FILE_NAME])
+
+        Movie.objects.filter(id=2).delete()
+        Movie.objects.filter(id=1).update(title="Changed")
+        # A later local build is replaced, its index belongs to the old tables
+        publish_index()
+        imported = snapshot.import_snapshot(path, log=lambda message: None)
+
+        self.assertEqual(imported, version)
+        self.assertEqual(data_build.current_version(), version)
+        self.assertEqual(list(Movie.objects.order_by("id").values_list("id", "title", "mpaa")),
+                         [(1, "One", "PG"), (2, "Two", "R")])
+        self.assertEqual(Movie.objects.get(id=1).recommendations, {"cosine": [2]})
+        self.assertEqual(get_index().version, version)
+        self.assertEqual(get_index().neighbor_ids(1, "cosine"), [2])
@@ -0,0 +1,81 @@
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from recommender.similarity.validate import IdSet, validate
+
+MOVIES_CSV = """movieId,title,genres
+1,One (2000),Drama
+2,Two (2000),Drama
+3,Three (2000),Drama
+4,Four (2000),Drama
+12,Twelve (2000),Drama
+"""
+NEIGHBORS_CSV = """id,n1,n2,n3
+0,0,1,2
+4,1,2,3
+1,2,3,12
+2,1,1,x,3
+3,3,99,1,2,4,12
+1,2,3,12
+7,1,2,3
+1,3,2,4
+"""
+
+
+class IdSetTests(SimpleTestCase):
+    def test_membership(self):
+        ids = IdSet([1, 8, 12])
+        self.assertEqual([movie_id for movie_id in range(-1, 20) if movie_id in ids], [1, 8, 12])
+        self.assertNotIn(0, IdSet([]))
+
+
+class ValidateTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.movies = self.directory / "movies.csv"
+        self.movies.write_text(MOVIES_CSV)
+        self.input = self.directory / "neighbors.csv"
+        self.input.write_text(NEIGHBORS_CSV)
+
+    def run_validate(self, **options):
+        output = self.directory / "clean.csv"
+        report = validate(self.input, output, self.movies, k=3, **options)
+        return report, output.read_text().splitlines()
+
+    def test_clean_file_and_report(self):
+        report, lines = self.run_validate()
+        self.assertEqual(lines, ["1,2,3,12", "2,1,3", "3,1,2,4", "4,1,2,3"])
+        self.assertEqual(report.summary["rows_read"], 9)
+        self.assertEqual(report.summary["rows_written"], 4)
+        counts = {issue: entry["count"] for issue, entry in report.issues.items() if entry["count"]}
+        self.assertEqual(counts, {
+            "invalid_key": 2, "unknown_key": 1, "duplicate_key": 1, "conflicting_key": 1, "invalid_value": 1,
+            "self_reference": 1, "unknown_id": 1, "repeated_id": 1, "long_row": 1, "short_row": 1,
+        })
+        self.assertEqual(report.issues["invalid_key"]["lines"], [1, 2])
+        self.assertEqual(report.issues["unknown_key"]["lines"], [8])
+        self.assertEqual(report.issues["duplicate_key"]["lines"], [7])
+        self.assertEqual(report.issues["conflicting_key"]["lines"], [9])
+        self.assertEqual(report.issues["invalid_value"]["lines"], [5])
+        self.assertEqual(report.issues["repeated_id"]["lines"], [5])
+        self.assertEqual(report.issues["self_reference"]["lines"], [6])
+        self.assertEqual(report.issues["unknown_id"]["lines"], [6])
+        self.assertEqual(report.issues["long_row"]["lines"], [6])
+        self.assertEqual(report.issues["short_row"]["lines"], [5])
+        self.assertFalse(report.clean)
+
+    def test_runs_on_disk_give_the_same_result(self):
+        report, lines = self.run_validate()
+        spilled, spilled_lines = self.run_validate(run_size=2)
+        self.assertEqual(spilled_lines, lines)
+        self.assertEqual(spilled.as_dict(), report.as_dict())
+
+    def test_clean_output_is_clean(self):
+        _, lines = self.run_validate()
+        self.input.write_text("\n".join(lines) + "\n")
+        report = validate(self.input, movies_path=self.movies, k=3)
+        self.assertEqual([issue for issue, entry in report.issues.items() if entry["count"]], ["short_row"])
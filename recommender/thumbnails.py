@@ -0,0 +1,119 @@
+"""
+Builds the poster thumbnails described in posters.py from the full size posters (`<movie id>.jpg`,
+`.png` or `.webp` in RECOMMENDER_POSTER_SOURCE_DIR), in a pool of worker processes.
+
+Posters whose source file did not change since the last run (same size and modification time)
+are skipped, so the command is cheap to run again after adding a few posters.
+"""
+import hashlib
+import io
+import os
+
+from PIL import Image, ImageOps
+
+from recommender.parallel import Progress, imap_bounded
+from recommender.posters import FORMAT_VERSION, SIZES, hashed_name, is_hashed, manifest_path, read_manifest, \
+    write_manifest
+
+SOURCE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+# extension -> Pillow format and encoder options
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def source_posters(source_dir):
+    """
+    Yields (movie id, path, signature) of the posters in `source_dir`.
+    """
+    with os.scandir(source_dir) as entries:
+        for entry in entries:
+            stem, extension = os.path.splitext(entry.name)
+            if stem.isdigit() and extension.lower() in SOURCE_EXTENSIONS and entry.is_file():
+                stat = entry.stat()
+                yield int(stem), entry.path, [stat.st_size, stat.st_mtime_ns]
+
+
+def write_once(path, content):
+    # Content hashed names never change their content, an existing file is already right
+    if os.path.exists(path):
+        return
+    temporary_path = "{}.tmp".format(path)
+    with open(temporary_path, "wb") as file:
+        file.write(content)
+    os.replace(temporary_path, path)
+
+
+def render_poster(job):
+    """
+    Writes the thumbnails of one poster. Returns (movie id, manifest entry, error).
+    """
+    movie_id, path, signature, output_dir = job
+    entry = {"source": signature}
+    try:
+        with Image.open(path) as image:
+            # JPEGs are decoded at the smallest scale still larger than every thumbnail
+            image.draft("RGB", (max(width for width, _ in SIZES.values()), max(height for _, height in SIZES.values())))
+            image = ImageOps.exif_transpose(image).convert("RGB")
+        for size, box in SIZES.items():
+            thumbnail = image.copy()
+            thumbnail.thumbnail(box, Image.Resampling.LANCZOS)
+            variant = {"width": thumbnail.width, "height": thumbnail.height}
+            for extension, (image_format, options) in FORMATS.items():
+                buffer = io.BytesIO()
+                thumbnail.save(buffer, image_format, **options)
+                content = buffer.getvalue()
+                name = hashed_name(movie_id, size, extension, hashlib.md5(content).hexdigest())
+                write_once(os.path.join(output_dir, name), content)
+                variant[extension] = name
+            entry[size] = variant
+    except (OSError, ValueError, Image.DecompressionBombError) as error:
+        return movie_id, None, "{}: {}".format(path, error)
+    return movie_id, entry, None
+
+
+def build_thumbnails(source_dir, output_dir, workers=None, force=False, prune=False, log=print):
+    """
+    Renders the thumbnails of all changed posters and writes the manifest.
+    Returns the number of rendered, skipped and failed posters.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    path = manifest_path(output_dir)
+    previous = read_manifest(path)["posters"]
+    posters = {}
+    jobs = []
+    for movie_id, source_path, signature in source_posters(source_dir):
+        entry = previous.get(str(movie_id))
+        if not force and entry is not None and entry["source"] == signature and set(SIZES) <= set(entry):
+            posters[str(movie_id)] = entry
+        else:
+            jobs.append((movie_id, source_path, signature, str(output_dir)))
+    skipped = len(posters)
+    log("{} posters to render, {} unchanged".format(len(jobs), skipped))
+
+    failed = 0
+    progress = Progress("Rendered", unit="posters", output=log)
+    for movie_id, entry, error in imap_bounded(render_poster, jobs, workers=workers):
+        if error is not None:
+            failed += 1
+            log("Skipped {}".format(error))
+            continue
+        posters[str(movie_id)] = entry
+        progress.add()
+    progress.report()
+
+    # An unchanged manifest keeps its stamp, workers keep their cached pages
+    if posters != previous or not os.path.exists(path):
+        write_manifest({"format_version": FORMAT_VERSION, "sizes": SIZES, "posters": posters}, path)
+    if prune:
+        referenced = {name for entry in posters.values() for size in SIZES for name in entry[size].values()
+                      if isinstance(name, str)}
+        removed = 0
+        with os.scandir(output_dir) as entries:
+            for file in entries:
+                if is_hashed(file.path, file.name) and file.name not in referenced:
+                    os.remove(file.path)
+                    removed += 1
+        log("Removed {} unreferenced thumbnails".format(removed))
+    return progress.count, skipped, failed
@@ -9,6 +9,7 @@ from . import views
 urlpatterns = [
     # path("", views.index, name="index"),
     path('<int:movie_id>/', views.results, name='results'),
+    path('api/', include('recommender.api_urls')),
     # path('', include(router.urls)),
     path('movies/', views.MovieNamesViewSet.as_view(), name='movies'),
     path("select2/", include("django_select2.urls")),
@@ -1,14 +1,21 @@
+from django.conf import settings
 from django.shortcuts import render
 
 # Create your views here.
 from django.http import HttpResponse, HttpResponseRedirect
 from django.template import loader
+from django.utils.decorators import method_decorator
 from django.views import generic
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
-from recommender import models, forms
+from recommender import blend, cache, data_build, metrics, models, forms, posters, session
 from recommender.Serializers import MovieSerializer
 from recommender.models import Movie
-from rest_framework import viewsets, generics
+from recommender.neighbor_index import get_index
+from recommender.recommendations import recommendation_ids, resolve_recommendations, table_recommendations
+from recommender.search import search_movies
+from rest_framework import viewsets, generics, pagination
 
 
 def index(request):
@@ -16,54 +23,93 @@ def index(request):
 
 
 def results(request, movie_id):
-    template = loader.get_template('recommender/movie_info.html')
-
+    # Pages link to the thumbnails of the current poster manifest
+    key = "{}:{}".format(movie_id, posters.manifest_version())
+    page = cache.pages.get(key)
+    if page is None:
+        with metrics.timer('context'):
+            context = movie_context(movie_id)
+        with metrics.timer('render'):
+            page = loader.get_template('recommender/movie_info.html').render(context, request)
+        if not context:
+            # Unknown movie, neither cached nor remembered, so a cached page is always of a movie
+            return HttpResponse(page)
+        cache.pages.set(key, page)
+    return session.remember(request, HttpResponse(page), movie_id)
+
+
+def movie_context(movie_id):
+    """
+    Template context of the detail page, only built when the rendered page is not cached.
+    """
+    index = get_index()
+    in_index = index is not None and movie_id in index
+    use_table = settings.RECOMMENDER_RECOMMENDATION_TABLE
+    # The json lists are only decoded when neither the index nor the table can answer
+    movies = Movie.objects.defer('recommendations') if in_index or use_table else Movie.objects.all()
     try:
-        movie = Movie.objects.get(id=movie_id)
+        movie = movies.get(id=movie_id)
     except Movie.DoesNotExist:
-        context = {}
-        return HttpResponse(template.render(context, request))
-
-    tmdb_recommendations = list(Movie.objects.filter(tmdb_id__in=movie.recommendations['tmdb'][:5]))
-    cosine_recommendations = list(Movie.objects.filter(id__in=movie.recommendations['cosine'][:5]))
-    cosine_reduced_recommendations = list(Movie.objects.filter(id__in=movie.recommendations['cosine_reduced'][:5]))
-    jaccard_recommendations = list(Movie.objects.filter(id__in=movie.recommendations['jaccard'][:5]))
-    jaccard_tag_recommendations = list(Movie.objects.filter(id__in=movie.recommendations['jaccard_tag'][:5]))
-    print(cosine_recommendations)
-    context = {
-        'movie': prepare_movie(movie),
+        return {}
+
+    if in_index:
+        resolved = index.recommendations(movie.id, k=5)
+        resolved[blend.BLENDED] = blend.blend_index(index, movie.id, k=5)
+    else:
+        if use_table:
+            ranked = table_recommendations(movie.id, limit=blend.BLEND_DEPTH)
+        else:
+            ranked = resolve_recommendations(recommendation_ids(movie, limit=blend.BLEND_DEPTH))
+        resolved = {algorithm: recommendations[:5] for algorithm, recommendations in ranked.items()}
+        resolved[blend.BLENDED] = blend.blend_movies(ranked, k=5)
+    return {
+        'movie': prepare_movie(movie, posters.DETAIL),
         'recommendations': {
-            "tmdb": [prepare_movie(recom) for recom in tmdb_recommendations],
-            "cosine": [prepare_movie(recom) for recom in cosine_recommendations],
-            "cosine_reduced": [prepare_movie(recom) for recom in cosine_reduced_recommendations],
-            "jaccard": [prepare_movie(recom) for recom in jaccard_recommendations],
-            "jaccard_tag": [prepare_movie(recom) for recom in jaccard_tag_recommendations],
+            algorithm: [prepare_movie(recom) for recom in recommendations]
+            for algorithm, recommendations in resolved.items()
         }
     }
 
-    return HttpResponse(template.render(context, request))
-
 
-def prepare_movie(movie):
+def prepare_movie(movie, size=posters.TILE):
     return {
         'data': movie,
-        'poster': "posters/{}.jpg".format(movie.id)
+        'poster': posters.poster(movie.id, size)
     }
 
 
+class MovieCursorPagination(pagination.CursorPagination):
+    """
+    Keyset pagination on the title, pages stay fast no matter how deep a client pages (served by
+    the (title, id) index of V5__Movie_list_paging_index.sql).
+    Title searches are already ranked and capped, they are returned as a single page.
+    """
+    ordering = ('-title', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get('title') is not None:
+            self.has_next = False
+            self.has_previous = False
+            self.page = list(queryset)
+            return self.page
+        return super().paginate_queryset(queryset, request, view)
+
+
+@method_decorator(cache_control(public=True, max_age=settings.RECOMMENDER_API_MAX_AGE), name='dispatch')
+@method_decorator(condition(etag_func=data_build.etag, last_modified_func=data_build.last_modified), name='dispatch')
 class MovieNamesViewSet(generics.ListAPIView):
     """
     API endpoint that allows to query movies
     """
 
     serializer_class = MovieSerializer
+    pagination_class = MovieCursorPagination
 
     def get_queryset(self):
-        queryset = Movie.objects.all().order_by('-title')
         title = self.request.query_params.get('title')
-        if title is not None and queryset is not None:
-            queryset = queryset.filter(title__icontains=title)
-        return queryset
+        if title is not None:
+            return search_movies(title)
+        return Movie.objects.only('id', 'title')
 
 
 class MovieSelectView(generic.FormView):
@@ -74,15 +120,10 @@ class MovieSelectView(generic.FormView):
     template_name = "recommender/movie_form.html"
 
     def form_valid(self, form):
-        print("Got form: ")
-        print(form.data["title"])
         url = "{}".format(form.data["title"])
-        print("URL to return: {}".format(url))
         return HttpResponseRedirect(url)
 
     def get_success_url(self):
-        print("Success URL")
-        print(self.title)
         if 'id' in self.kwargs:
             return "/{}".format(self.kwargs['id'])
         return "/"